@@ -0,0 +1,156 @@
+"""Annonces de montée de niveau regroupées par salon.
+
+Une montée de niveau n'envoie pas de message tout de suite : elle est mise en
+attente dans la file de son salon, et toutes celles qui arrivent pendant la
+fenêtre `window` partent ensemble dans un seul message. Un membre qui monte
+plusieurs fois dans la même fenêtre n'apparaît qu'une fois, avec son dernier
+niveau.
+
+Contre-pression : un salon n'a jamais plus d'un envoi en cours. Si Discord le
+limite (envoi lent, le client HTTP attend la fin du rate limit, ou
+`discord.RateLimited` remis en file par l'ordonnanceur), les montées
+suivantes s'accumulent et sont fusionnées pendant l'attente, et la fenêtre du
+salon double (jusqu'à `max_window`) avant de redescendre quand les envois
+redeviennent rapides.
+"""
+
+import asyncio
+import time
+
+import discord
+
+from outbound import ANNOUNCEMENT
+
+# Limite de Discord sur la longueur d'un message
+MAX_MESSAGE_LENGTH = 2000
+
+
+class _PendingLevelUp:
+    __slots__ = ('mention', 'level', 'gained')
+
+    def __init__(self, mention, level, gained):
+        self.mention = mention
+        self.level = level
+        self.gained = gained
+
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'pending', 'task', 'window')
+
+    def __init__(self, channel, window):
+        self.channel = channel
+        self.pending = {}
+        self.task = None
+        self.window = window
+
+
+class LevelUpAnnouncer:
+    """Files d'annonces par salon, avec regroupement et fenêtre adaptative"""
+
+    def __init__(self, window=2.0, max_window=30.0, slow_send=1.0, clock=time.monotonic, scheduler=None):
+        self.window = window
+        self.max_window = max_window
+        # Un envoi plus long que `slow_send` secondes est traité comme limité par Discord
+        self.slow_send = slow_send
+        self._clock = clock
+        # Ordonnanceur des appels sortants : les envois passent après les réponses aux interactions
+        self.scheduler = scheduler
+        self._queues = {}
+
+    def announce(self, channel, user_id, mention, level, gained):
+        """Met en attente l'annonce d'un membre qui a gagné `gained` niveaux et atteint `level`"""
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel, self.window)
+
+        pending = queue.pending.get(user_id)
+        if pending is None:
+            queue.pending[user_id] = _PendingLevelUp(mention, level, gained)
+        else:
+            pending.level = max(pending.level, level)
+            pending.gained += gained
+
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(queue))
+
+    async def flush(self):
+        """Envoie immédiatement toutes les annonces en attente"""
+        for queue in list(self._queues.values()):
+            if queue.task is not None:
+                queue.task.cancel()
+                queue.task = None
+            pending, queue.pending = queue.pending, {}
+            await self._send(queue, pending)
+        self._queues.clear()
+
+    def stop(self):
+        """Abandonne les annonces en attente (arrêt du bot)"""
+        for queue in self._queues.values():
+            if queue.task is not None:
+                queue.task.cancel()
+        self._queues.clear()
+
+    async def _drain(self, queue):
+        try:
+            while queue.pending:
+                await asyncio.sleep(queue.window)
+                pending, queue.pending = queue.pending, {}
+                await self._send(queue, pending)
+        finally:
+            if self._queues.get(queue.channel.id) is queue and not queue.pending:
+                del self._queues[queue.channel.id]
+            queue.task = None
+
+    async def _send(self, queue, pending):
+        for content in render_level_ups(list(pending.values())):
+            # Seul l'appel à Discord est chronométré : l'attente dans l'ordonnanceur ne compte pas
+            limited = []
+
+            async def send(content=content, limited=limited):
+                start = self._clock()
+                try:
+                    return await queue.channel.send(content)
+                except discord.RateLimited:
+                    limited.append(True)  # Remis en file par l'ordonnanceur
+                    raise
+                finally:
+                    if self._clock() - start > self.slow_send:
+                        limited.append(True)
+
+            try:
+                if self.scheduler is None:
+                    await send()
+                else:
+                    await self.scheduler.run(ANNOUNCEMENT, ('channel', queue.channel.id), send)
+            except discord.Forbidden:
+                return  # Le bot ne peut pas écrire dans ce salon : inutile d'insister
+            except discord.HTTPException as e:
+                print(f"❌ Annonce de montée de niveau non envoyée: {e}")
+                continue
+            if limited:
+                queue.window = min(max(queue.window, self.window, 0.5) * 2, self.max_window)
+            else:
+                queue.window = max(queue.window / 2, self.window)
+
+
+def render_level_ups(level_ups):
+    """Messages d'annonce pour une liste de montées de niveau (découpés à 2000 caractères)"""
+    if len(level_ups) == 1:
+        level_up = level_ups[0]
+        if level_up.gained == 1:
+            return [f"🎉 {level_up.mention} a atteint le niveau **{level_up.level}** !"]
+        return [f"🚀 {level_up.mention} a gagné **{level_up.gained} niveaux** et atteint le niveau **{level_up.level}** !"]
+
+    messages = []
+    current = "🎉 Montées de niveau !"
+    for level_up in level_ups:
+        line = f"\n• {level_up.mention} → niveau **{level_up.level}**"
+        if level_up.gained > 1:
+            line += f" (+{level_up.gained})"
+        if len(current) + len(line) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = line.lstrip("\n")
+        else:
+            current += line
+    messages.append(current)
+    return messages
@@ -0,0 +1,179 @@
+"""Import de l'historique des salons pour initialiser l'XP d'un serveur.
+
+Les salons sont parcourus en parallèle (au plus `concurrency` à la fois), du
+plus ancien au plus récent message, avec les mêmes règles que on_message :
+gain aléatoire par message et délai minimal entre deux gains d'un membre
+(appliqué salon par salon). Les compteurs sont agrégés en mémoire puis écrits
+tous les `batch_size` messages lus, dans la même transaction que le point de
+reprise du salon : après une interruption, le parcours reprend au dernier
+message validé sans jamais compter deux fois un message. Les lots des
+différents salons sont écrits l'un après l'autre, sans écriture d'XP en
+direct entre-temps (verrou d'écriture de l'accumulateur) : aucun n'écrase en
+base l'XP importée par un autre. Un salon en échec n'arrête pas les autres.
+
+Seuls les messages antérieurs à l'arrivée du bot sur le serveur sont lus :
+les suivants ont déjà été comptés en direct.
+"""
+
+import asyncio
+import time
+
+import discord
+
+from repository import UserRecord
+from thresholds import LEVEL_THRESHOLDS
+
+
+class _Tally:
+    __slots__ = ('username', 'messages', 'exp', 'last_time')
+
+    def __init__(self, username):
+        self.username = username
+        self.messages = 0
+        self.exp = 0
+        self.last_time = 0
+
+
+class HistoryBackfill:
+    """Parcours reprenable de l'historique d'un serveur"""
+
+    def __init__(self, guild, repo, xp_buffer, roll_exp, cooldown, concurrency=3, batch_size=1000,
+                 on_batch=None):
+        self.guild = guild
+        self.repo = repo
+        self.xp_buffer = xp_buffer
+        self.roll_exp = roll_exp
+        self.cooldown = cooldown
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        # Rappel on_batch(guild_id) après chaque lot écrit (invalidation des caches)
+        self.on_batch = on_batch
+
+        self.channels_total = 0
+        self.channels_done = 0
+        self.messages_read = 0
+        self.messages_counted = 0
+        self.failed_channels = []
+        self.started_at = None
+        self.finished_at = None
+
+    async def run(self):
+        self.started_at = time.time()
+        checkpoints = {checkpoint.channel_id: checkpoint
+                       for checkpoint in await self.repo.backfill_checkpoints(self.guild.id)}
+
+        # Instantané partagé par tous les salons, conservé d'une reprise à l'autre
+        if checkpoints:
+            before_id = next(iter(checkpoints.values())).before_id
+        else:
+            joined_at = self.guild.me.joined_at or discord.utils.utcnow()
+            before_id = discord.utils.time_snowflake(joined_at)
+
+        me = self.guild.me
+        channels = [channel for channel in self.guild.text_channels
+                    if channel.permissions_for(me).read_message_history]
+        await self.repo.add_backfill_channels(self.guild.id, before_id,
+                                              [channel.id for channel in channels
+                                               if channel.id not in checkpoints])
+
+        self.channels_total = len(channels)
+        pending = []
+        for channel in channels:
+            checkpoint = checkpoints.get(channel.id)
+            if checkpoint is not None and checkpoint.done:
+                self.channels_done += 1
+            else:
+                pending.append((channel, checkpoint.last_message_id if checkpoint else 0))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            results = await asyncio.gather(*(self._walk(semaphore, channel, before_id, after_id)
+                                             for channel, after_id in pending), return_exceptions=True)
+        finally:
+            self.finished_at = time.time()
+        # Salon en échec (écriture refusée...) : il reprendra à son dernier lot validé
+        for (channel, _), result in zip(pending, results):
+            if isinstance(result, BaseException):
+                print(f"❌ Import de l'historique du salon #{channel.name} interrompu: {result!r}")
+                self.failed_channels.append((channel.id, str(result) or type(result).__name__))
+
+    async def _walk(self, semaphore, channel, before_id, after_id):
+        async with semaphore:
+            tallies = {}
+            last_awarded = {}
+            last_id = after_id
+            read = 0
+            counted = 0
+            try:
+                async for message in channel.history(limit=None, oldest_first=True,
+                                                     after=discord.Object(after_id) if after_id else None,
+                                                     before=discord.Object(before_id)):
+                    last_id = message.id
+                    read += 1
+                    if not message.author.bot:
+                        timestamp = message.created_at.timestamp()
+                        user_id = message.author.id
+                        tally = tallies.get(user_id)
+                        if tally is None:
+                            tally = tallies[user_id] = _Tally(str(message.author))
+                        # Comme en direct : tout message est compté, seuls ceux hors délai rapportent de l'XP
+                        tally.messages += 1
+                        tally.last_time = timestamp
+                        if timestamp - last_awarded.get(user_id, float('-inf')) >= self.cooldown:
+                            last_awarded[user_id] = timestamp
+                            tally.exp += self.roll_exp()
+                            counted += 1
+
+                    if read >= self.batch_size:
+                        await self._commit(channel, tallies, last_id, read, counted, done=False)
+                        tallies, read, counted = {}, 0, 0
+            except discord.HTTPException as e:
+                # Salon illisible (permissions retirées...) : il reste à reprendre plus tard
+                await self._commit(channel, tallies, last_id, read, counted, done=False)
+                self.failed_channels.append((channel.id, str(e)))
+                return
+
+            await self._commit(channel, tallies, last_id, read, counted, done=True)
+            self.channels_done += 1
+
+    async def _commit(self, channel, tallies, last_id, read, counted, done):
+        # Aucune écriture d'XP ni aucun autre lot pendant celui-ci : les lignes écrites ne peuvent pas
+        # être écrasées par des valeurs sans l'XP importée (perdue en cas d'arrêt avant la suivante)
+        async with self.xp_buffer.write_lock:
+            # Copies détachées : les entrées partagées avec on_message ne changent qu'une fois le lot
+            # validé (sinon un échec laisserait l'XP importée en mémoire, écrite par le prochain lot
+            # d'XP sans que le point de reprise n'avance)
+            users = []
+            entries = []
+            created = []
+            for user_id, tally in tallies.items():
+                entry = await self.xp_buffer.get(self.guild.id, user_id)
+                if entry is None:
+                    entry = await self.xp_buffer.get_or_create(self.guild.id, user_id, tally.username, tally.last_time)
+                    created.append(entry)
+                level, exp = LEVEL_THRESHOLDS.resolve(entry.level, entry.exp + tally.exp)
+                users.append(UserRecord(self.guild.id, user_id, entry.username, level, exp,
+                                        entry.total_messages + tally.messages,
+                                        max(entry.last_message_time, tally.last_time)))
+                entries.append((entry, tally))
+
+            try:
+                await self.repo.save_backfill_batch(users, self.guild.id, channel.id, last_id, read, done)
+            except Exception:
+                for entry in created:
+                    if entry.total_messages == 0:  # Profil vide créé pour ce lot, pas encore utilisé en direct
+                        self.xp_buffer.forget(entry.guild_id, entry.user_id)
+                raise
+
+            for entry, tally in entries:
+                # Appliqué en écart : l'entrée a pu gagner de l'XP en direct pendant l'écriture
+                # (elle est alors déjà en attente d'écriture et le sera avec l'XP importée)
+                entry.level, entry.exp = LEVEL_THRESHOLDS.resolve(entry.level, entry.exp + tally.exp)
+                entry.total_messages += tally.messages
+                entry.last_message_time = max(entry.last_message_time, tally.last_time)
+                self.xp_buffer.mark_saved(entry)
+
+        self.messages_read += read
+        self.messages_counted += counted
+        if users and self.on_batch is not None:
+            self.on_batch(self.guild.id)
@@ -0,0 +1,149 @@
+"""Objets Discord factices pour exécuter les gestionnaires du bot hors ligne.
+
+Ils n'implémentent que ce que les gestionnaires utilisent réellement et
+enregistrent chaque effet de bord (messages envoyés, réponses d'interaction,
+modifications de rôles) pour que le banc de test puisse les compter.
+"""
+
+import itertools
+from types import SimpleNamespace
+
+_ids = itertools.count(10_000)
+
+
+class Recorder:
+    """Compteurs partagés de tous les appels « REST » simulés"""
+
+    def __init__(self):
+        self.channel_sends = 0
+        self.interaction_responses = 0
+        self.role_edits = 0
+
+
+class FakeRole:
+    def __init__(self, name, role_id=None, default=False):
+        self.id = role_id or next(_ids)
+        self.name = name
+        self._default = default
+
+    def is_default(self):
+        return self._default
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, role_names=()):
+        self.id = guild_id
+        self.name = f"serveur-{guild_id}"
+        self.shard_id = 0
+        self.default_role = FakeRole('@everyone', role_id=guild_id, default=True)
+        self.roles = [self.default_role] + [FakeRole(name) for name in role_names]
+        self._roles_by_id = {role.id: role for role in self.roles}
+        self.members = {}
+
+    def get_role(self, role_id):
+        return self._roles_by_id.get(role_id)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+
+class FakeMember:
+    def __init__(self, user_id, guild, recorder, administrator=False):
+        self.id = user_id
+        self.guild = guild
+        self.bot = False
+        self.name = f"membre{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.display_avatar = SimpleNamespace(url="https://cdn.invalid/avatar.png")
+        self.guild_permissions = SimpleNamespace(administrator=administrator)
+        self.roles = [guild.default_role]
+        self._recorder = recorder
+        guild.members[user_id] = self
+
+    def __str__(self):
+        return self.name
+
+    async def edit(self, *, roles=None, reason=None, **_):
+        self._recorder.role_edits += 1
+        if roles is not None:
+            self.roles = [self.guild.default_role] + [self.guild.get_role(role.id) for role in roles]
+
+    async def add_roles(self, *roles, reason=None, atomic=True):
+        self._recorder.role_edits += 1
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles, reason=None, atomic=True):
+        self._recorder.role_edits += 1
+        self.roles = [role for role in self.roles if role not in roles]
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, recorder):
+        self.id = channel_id
+        self.guild = guild
+        self._recorder = recorder
+
+    async def send(self, content=None, **kwargs):
+        self._recorder.channel_sends += 1
+        return SimpleNamespace(id=next(_ids), channel=self, content=content)
+
+
+class FakeMessage:
+    def __init__(self, author, channel, content="bonjour"):
+        self.id = next(_ids)
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+
+
+class FakeResponse:
+    def __init__(self, recorder):
+        self._recorder = recorder
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self):
+        self._recorder.interaction_responses += 1
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+
+class FakeFollowup:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    async def send(self, content=None, **kwargs):
+        self._recorder.interaction_responses += 1
+
+
+class FakeInteraction:
+    def __init__(self, user, channel, recorder):
+        self.id = next(_ids)
+        self.user = user
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.channel = channel
+        self.message = None
+        self.response = FakeResponse(recorder)
+        self.followup = FakeFollowup(recorder)
@@ -0,0 +1,213 @@
+"""Banc de charge hors ligne du bot : XP des messages et commandes slash.
+
+Rejoue un trafic synthétique (messages et appels à /niveau, /classement,
+/entrainer) contre les vrais gestionnaires du bot, branchés sur des objets
+Discord factices et une base SQLite temporaire (ou le stockage en mémoire avec
+`--storage memory`, pour mesurer les gestionnaires sans disque). Aucun accès
+réseau.
+
+Exemple :
+    python benchmarks/load_test.py --users 5000 --events 50000 --rate 2000
+    python benchmarks/load_test.py --storage memory
+
+Rapport : débit, latences p50/p95/p99 par type d'événement, nombre d'écritures
+en base (instructions, lignes, transactions) et d'appels Discord simulés.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_discord import FakeChannel, FakeGuild, FakeInteraction, FakeMember, FakeMessage, Recorder  # noqa: E402
+from repository import STATS, Repository, UserRecord  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc de charge hors ligne du bot")
+    parser.add_argument('--users', type=int, default=2000, help="nombre de membres simulés")
+    parser.add_argument('--guilds', type=int, default=1, help="nombre de serveurs simulés")
+    parser.add_argument('--channels', type=int, default=10, help="salons par serveur")
+    parser.add_argument('--events', type=int, default=20000, help="nombre total d'événements rejoués")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="événements par seconde visés (0 = aussi vite que possible)")
+    parser.add_argument('--mix', default='message=90,niveau=4,classement=3,entrainer=3',
+                        help="répartition des événements (poids)")
+    parser.add_argument('--cooldown', type=float, default=0,
+                        help="XP_COOLDOWN_SECONDS utilisé pendant le test (0 = chaque message compte)")
+    parser.add_argument('--characters', type=float, default=0.5,
+                        help="proportion de membres possédant un personnage")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="base à utiliser (par défaut : fichier temporaire)")
+    parser.add_argument('--storage', choices=('sqlite', 'memory'), default='sqlite', help="stockage du bot")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def count_writes(database, counters):
+    """Compte les écritures faites via la couche d'accès aux données"""
+    execute, executemany, transaction = database.execute, database.executemany, database.transaction
+
+    async def counted_execute(sql, params=()):
+        counters['instructions'] += 1
+        counters['rows'] += 1
+        counters['transactions'] += 1
+        return await execute(sql, params)
+
+    async def counted_executemany(sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        counters['instructions'] += 1
+        counters['rows'] += len(seq_of_params)
+        counters['transactions'] += 1
+        return await executemany(sql, seq_of_params)
+
+    def counted_transaction():
+        counters['transactions'] += 1
+        return transaction()
+
+    database.execute = counted_execute
+    database.executemany = counted_executemany
+    database.transaction = counted_transaction
+
+
+async def seed(bot_module, guilds, members, rng, character_share):
+    """Crée les profils (niveaux variés) et une partie des personnages"""
+    users = []
+    character_rows = []
+    for member in members:
+        level = rng.randint(1, 30)
+        exp = rng.randint(0, bot_module.calc_level_exp(level + 1) - 1)
+        users.append(UserRecord(member.guild.id, member.id, str(member), level, exp))
+        if rng.random() < character_share:
+            character_rows.append((member.guild.id, member.id, f"perso{member.id}", rng.choice(bot_module.SPECIALTIES)))
+
+    repo = bot_module.repo
+    await repo.upsert_users(users)
+    if isinstance(repo, Repository):
+        await repo.db.executemany(
+            "INSERT INTO characters (guild_id, user_id, character_name, specialty) VALUES (?, ?, ?, ?)",
+            character_rows)
+    else:
+        for guild_id, user_id, name, specialty in character_rows:
+            await repo.create_character(guild_id, user_id, name, specialty, {})
+    return {(guild_id, user_id): name for guild_id, user_id, name, _ in character_rows}
+
+
+async def run(args):
+    os.environ['XP_COOLDOWN_SECONDS'] = str(args.cooldown)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='bot-bench-'), 'bench.db')
+    os.environ['BOT_DATABASE_PATH'] = db_path
+    os.environ['STORAGE_BACKEND'] = args.storage
+
+    import bot_discord_roleplay_complet as bot_module
+
+    # Les commandes préfixées ne sont pas mesurées ici
+    async def no_prefix_commands(message):
+        return None
+    bot_module.bot.process_commands = no_prefix_commands
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    tier_names = [decorated for _, _, decorated in bot_module.SENIORITY_TIERS]
+
+    guilds = [FakeGuild(guild_id, tier_names) for guild_id in range(1, args.guilds + 1)]
+    channels = [FakeChannel(guild.id * 1000 + i, guild, recorder) for guild in guilds for i in range(args.channels)]
+    members = [FakeMember(100_000 + i, guilds[i % len(guilds)], recorder) for i in range(args.users)]
+    channels_by_guild = defaultdict(list)
+    for channel in channels:
+        channels_by_guild[channel.guild.id].append(channel)
+
+    await bot_module.init_db()
+    characters = await seed(bot_module, guilds, members, rng, args.characters)
+    with_character = [member for member in members if (member.guild.id, member.id) in characters]
+
+    writes = defaultdict(int)
+    if args.storage == 'sqlite':
+        count_writes(bot_module.repo.db, writes)
+    bot_module.xp_buffer.start()
+    bot_module.scheduler.start()
+
+    kinds, weights = [], []
+    for part in args.mix.split(','):
+        name, weight = part.split('=')
+        kinds.append(name.strip())
+        weights.append(float(weight))
+
+    def make_event(kind):
+        member = rng.choice(with_character if kind == 'entrainer' and with_character else members)
+        channel = rng.choice(channels_by_guild[member.guild.id])
+        if kind == 'message':
+            return bot_module.on_message(FakeMessage(member, channel))
+        interaction = FakeInteraction(member, channel, recorder)
+        if kind == 'niveau':
+            return bot_module.check_level.callback(interaction)
+        if kind == 'classement':
+            return bot_module.leaderboard.callback(interaction)
+        if kind == 'entrainer':
+            name = characters[(member.guild.id, member.id)]
+            return bot_module.train_character.callback(interaction, name, rng.choice(STATS))
+        raise ValueError(f"Type d'événement inconnu : {kind}")
+
+    latencies = defaultdict(list)
+
+    async def timed(kind, coro):
+        start = time.perf_counter()
+        await coro
+        latencies[kind].append(time.perf_counter() - start)
+
+    pending = set()
+    started = time.perf_counter()
+    for i, kind in enumerate(rng.choices(kinds, weights, k=args.events)):
+        if args.rate > 0:
+            # Trafic en boucle ouverte : les événements arrivent à heure fixe
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(timed(kind, make_event(kind)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        else:
+            await timed(kind, make_event(kind))
+    if pending:
+        await asyncio.gather(*pending)
+    await bot_module.announcer.flush()
+    await bot_module.scheduler.drain()
+    await bot_module.scheduler.stop()
+    await bot_module.xp_buffer.stop()
+    elapsed = time.perf_counter() - started
+    await bot_module.repo.close()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n📊 {total} événements en {elapsed:.2f} s → {total / elapsed:,.0f} événements/s")
+    print(f"   base : {db_path if args.storage == 'sqlite' else 'stockage en mémoire'}\n")
+    print(f"{'événement':<12}{'nombre':>9}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'max (ms)':>11}")
+    for kind in kinds:
+        values = sorted(latencies.get(kind, []))
+        if not values:
+            continue
+        print(f"{kind:<12}{len(values):>9}"
+              f"{percentile(values, 0.50) * 1000:>11.3f}{percentile(values, 0.95) * 1000:>11.3f}"
+              f"{percentile(values, 0.99) * 1000:>11.3f}{values[-1] * 1000:>11.3f}")
+
+    if args.storage == 'sqlite':
+        print("\n✍️  Écritures en base : "
+              f"{writes['instructions']} instructions, {writes['rows']} lignes, {writes['transactions']} transactions")
+    print("🌐 Appels Discord simulés : "
+          f"{recorder.channel_sends} messages, {recorder.interaction_responses} réponses d'interaction, "
+          f"{recorder.role_edits} modifications de rôles")
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,198 @@
+"""Simulateur hors ligne de la progression, pour régler les formules d'XP.
+
+Modélise une population de membres (XP des messages) ou de personnages (XP
+d'entraînement) par pas de `--step` jours avec des tirages vectorisés NumPy
+(tous les pas d'un bloc de membres à la fois, puis sommes cumulées), puis affiche
+le temps nécessaire pour atteindre chaque niveau et la population de chaque
+palier d'ancienneté. Plusieurs valeurs séparées par des virgules balaient une
+grille de paramètres (toutes les combinaisons sont simulées).
+
+Exemples :
+    python benchmarks/simulate_progression.py --users 1000000 --days 365
+    python benchmarks/simulate_progression.py --level-growth 1.3,1.35,1.4 --messages-per-day 10,30
+    python benchmarks/simulate_progression.py --mode stats --trainings-per-day 1,3
+
+Modèle : chaque membre a une activité propre (loi log-normale autour de
+`--messages-per-day`, qui compte les messages ayant passé le délai anti-spam),
+un nombre de messages par jour tiré selon une loi de Poisson, et la somme des
+gains quotidiens approchée par une loi normale de même moyenne et variance
+que la somme exacte des tirages uniformes.
+
+Débit : le coût est celui des tirages aléatoires (~170 ns par individu et par
+pas, dont ~100 ns pour la loi de Poisson). Mesuré : 1 000 000 de membres sur
+365 jours en ~8 s au pas hebdomadaire (par défaut), ~1 min au pas quotidien
+(`--step 1`, jalons datés au jour près).
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("❌ Ce simulateur nécessite NumPy : pip install numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thresholds import ThresholdTable  # noqa: E402
+from tiers import SENIORITY_TIERS  # noqa: E402
+
+# Paliers d'ancienneté du bot : (niveau minimum, palier)
+TIERS = [(min_level, tier) for min_level, tier, _ in SENIORITY_TIERS]
+
+# Cases (membre × pas) tirées à la fois : borne la mémoire (~8 tableaux de 8 octets par case)
+CHUNK_CELLS = 2_000_000
+
+# Spécialités et bonus d'entraînement : (part des personnages, multiplicateur)
+SPECIALTY_MIX = [(0.70, 1.0), (0.20, 1.1), (0.10, 1.05)]  # autres, étudiants, professeurs de la statistique
+
+
+def floats(text):
+    return [float(value) for value in text.split(',')]
+
+
+def ints(text):
+    return [int(value) for value in text.split(',')]
+
+
+def gain_range(text):
+    """« 3-5,4-6 » → [(3, 5), (4, 6)]"""
+    ranges = []
+    for part in text.split(','):
+        low, high = part.split('-')
+        ranges.append((int(low), int(high)))
+    return ranges
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulateur vectorisé de la progression (NumPy)")
+    parser.add_argument('--mode', choices=('levels', 'stats'), default='levels',
+                        help="niveaux d'ancienneté (messages) ou statistiques de personnage (entraînements)")
+    parser.add_argument('--users', type=int, default=200_000, help="membres ou personnages simulés")
+    parser.add_argument('--days', type=int, default=365, help="durée simulée en jours")
+    parser.add_argument('--step', type=int, default=7,
+                        help="pas de simulation en jours (1 = jalons datés au jour près, ~7× plus lent)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--activity-sigma', type=float, default=1.0,
+                        help="dispersion (log-normale) de l'activité entre membres")
+    parser.add_argument('--milestones', default='5,10,15,20,25,30,40,50',
+                        help="niveaux dont on mesure le temps d'accès")
+
+    levels = parser.add_argument_group("niveaux d'ancienneté")
+    levels.add_argument('--level-first', type=ints, default=[200], help="p(1)")
+    levels.add_argument('--level-growth', type=floats, default=[1.4], help="p(n+1) = p(n) × croissance")
+    levels.add_argument('--message-xp', type=gain_range, default=[(3, 5)], help="gain par message (min-max)")
+    levels.add_argument('--messages-per-day', type=floats, default=[20.0],
+                        help="messages comptés par jour (médiane de la population)")
+
+    stats = parser.add_argument_group("statistiques de personnage")
+    stats.add_argument('--stat-first', type=ints, default=[5000], help="e(1)")
+    stats.add_argument('--stat-increment', type=ints, default=[120], help="e(n+1) = e(n) + incrément × (n+1)")
+    stats.add_argument('--training-xp', type=gain_range, default=[(750, 1250)], help="gain par entraînement (min-max)")
+    stats.add_argument('--trainings-per-day', type=floats, default=[2.0],
+                       help="entraînements d'une même statistique par jour (médiane)")
+    return parser.parse_args()
+
+
+def cumulative_table(table, max_total=1e15):
+    """XP totale pour atteindre chaque niveau (indice = niveau - 1), tant qu'elle reste raisonnable"""
+    totals = []
+    level = 1
+    while table.total_for(level) < max_total:
+        totals.append(table.total_for(level))
+        level += 1
+    return np.array(totals, dtype=np.float64)
+
+
+def daily_gains(rng, counts, low, high, multipliers=None):
+    """Somme de `counts` gains uniformes entiers dans [low, high], pour chaque individu"""
+    mean = (low + high) / 2
+    variance = ((high - low + 1) ** 2 - 1) / 12
+    gains = counts * mean + np.sqrt(counts * variance) * rng.standard_normal(counts.shape)
+    gains = np.clip(gains, counts * low, counts * high)
+    if multipliers is not None:
+        gains *= multipliers
+    return np.floor(gains)
+
+
+def simulate(rng, cumulative, users, days, rate, sigma, low, high, milestones, multipliers=None, step=1):
+    """Retourne (jour d'atteinte de chaque jalon, -1 si jamais ; niveaux finaux)"""
+    rates = rate * rng.lognormal(0.0, sigma, users) / np.exp(sigma ** 2 / 2)
+    # Fin de chaque pas de simulation (le dernier pas peut être plus court)
+    ends = np.minimum(np.arange(step, days + step, step), days)
+    lengths = np.diff(ends, prepend=0)
+    # Un jalon est atteint dès que l'XP cumulée atteint son seuil (jamais s'il dépasse la table)
+    thresholds = [cumulative[milestone - 1] if milestone <= len(cumulative) else np.inf for milestone in milestones]
+
+    reached = np.full((len(milestones), users), -1, dtype=np.int32)
+    level = np.empty(users, dtype=np.int64)
+    chunk = max(1, CHUNK_CELLS // len(ends))
+    for start in range(0, users, chunk):
+        part = slice(start, min(start + chunk, users))
+        # Tous les jours d'un bloc de membres en un tirage : la somme de lois de Poisson
+        # indépendantes est une loi de Poisson, d'où un tirage par pas
+        counts = rng.poisson(rates[part, None] * lengths)
+        gains = daily_gains(rng, counts, low, high, None if multipliers is None else multipliers[part, None])
+        totals = np.cumsum(gains, axis=1)
+        for index, threshold in enumerate(thresholds):
+            # XP cumulée croissante : nombre de pas sous le seuil = indice du pas qui le franchit
+            steps = np.count_nonzero(totals < threshold, axis=1)
+            reached[index, part] = np.where(steps < len(ends), ends[np.minimum(steps, len(ends) - 1)], -1)
+        level[part] = np.searchsorted(cumulative, totals[:, -1], side='right')
+    return reached, level
+
+
+def report(reached, level, milestones, days, tiers):
+    print(f"{'niveau':>8}{'atteint':>10}{'p10 (j)':>10}{'p50 (j)':>10}{'p90 (j)':>10}")
+    for milestone, days_to in zip(milestones, reached):
+        done = days_to[days_to >= 0]
+        share = len(done) / len(days_to) * 100
+        if len(done):
+            p10, p50, p90 = np.percentile(done, [10, 50, 90])
+            print(f"{milestone:>8}{share:>9.1f}%{p10:>10.0f}{p50:>10.0f}{p90:>10.0f}")
+        else:
+            print(f"{milestone:>8}{share:>9.1f}%{'-':>10}{'-':>10}{'-':>10}")
+
+    if tiers:
+        bounds = [min_level for min_level, _ in tiers[1:]]
+        population = np.bincount(np.searchsorted(bounds, level, side='right'), minlength=len(tiers))
+        parts = [f"{name} {count / len(level) * 100:.1f}%" for (_, name), count in zip(tiers, population)]
+        print(f"paliers après {days} j : " + " • ".join(parts))
+    print(f"niveau final : p50 {np.percentile(level, 50):.0f} • p90 {np.percentile(level, 90):.0f} "
+          f"• max {level.max()}")
+
+
+def main():
+    args = parse_args()
+    milestones = [int(value) for value in args.milestones.split(',')]
+
+    if args.mode == 'levels':
+        grid = itertools.product(args.level_first, args.level_growth, args.message_xp, args.messages_per_day)
+    else:
+        grid = itertools.product(args.stat_first, args.stat_increment, args.training_xp, args.trainings_per_day)
+
+    for first, shape, (low, high), rate in grid:
+        rng = np.random.default_rng(args.seed)
+        start = time.perf_counter()
+        if args.mode == 'levels':
+            table = ThresholdTable(first, lambda previous, level, growth=shape: int(previous * growth))
+            title = f"p(1)={first} • ×{shape} • {low}-{high} XP/message • {rate:g} messages/jour"
+            multipliers, tiers = None, TIERS
+        else:
+            table = ThresholdTable(first, lambda previous, level, increment=shape: previous + increment * level)
+            title = f"e(1)={first} • +{shape}·n • {low}-{high} XP/entraînement • {rate:g} entraînements/jour"
+            shares, values = zip(*SPECIALTY_MIX)
+            multipliers, tiers = rng.choice(values, size=args.users, p=shares), None
+
+        reached, level = simulate(rng, cumulative_table(table), args.users, args.days, rate,
+                                  args.activity_sigma, low, high, milestones, multipliers, args.step)
+        print(f"\n📈 {title}")
+        print(f"   {args.users} individus sur {args.days} jours, simulés en {time.perf_counter() - start:.2f} s\n")
+        report(reached, level, milestones, args.days, tiers)
+
+
+if __name__ == '__main__':
+    main()
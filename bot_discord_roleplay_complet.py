@@ -2,215 +2,431 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import sqlite3
 import random
+import unicodedata
 import asyncio
+import hashlib
+import json
 import os
+import signal
 from datetime import datetime
 from typing import Optional
 
+from announcements import LevelUpAnnouncer
+from backfill import HistoryBackfill
+from character_index import CharacterNameIndex
+from cooldown import XPCooldown
+from database import Database
+from db_writer import RemoteWriteDatabase, writer_channel
+from leaderboard_cache import LeaderboardCache
+from maintenance import DatabaseMaintenance
+from memory_repository import MemoryRepository
+from metrics import metrics
+from outbound import ROLE_EDIT, OutboundScheduler
+from repository import Repository, STATS
+from role_cache import SeniorityRoleCache
+from role_sweep import RoleReconciliation
+from thresholds import LEVEL_THRESHOLDS, STAT_THRESHOLDS
+from tiers import SENIORITY_TIERS, get_seniority_role, get_seniority_tier
+from xp_buffer import XPAccumulator
+
 # Configuration du bot
 TOKEN = os.environ.get('DISCORD_TOKEN')  # Remplacez par votre token
+DB_PATH = os.environ.get('BOT_DATABASE_PATH', 'bot_database.db')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sqlite')  # "sqlite" ou "memory" (données en mémoire)
+MEMORY_SNAPSHOT_PATH = os.environ.get('MEMORY_SNAPSHOT_PATH')  # instantané du stockage en mémoire (vide = aucun)
+MEMORY_SNAPSHOT_INTERVAL = float(os.environ.get('MEMORY_SNAPSHOT_INTERVAL', '300'))  # secondes entre deux instantanés
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')  # sauvegardes à chaud de la base (vide = désactivées)
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '7'))  # nombre de sauvegardes conservées
+BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', '24'))  # heures entre deux sauvegardes
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get('MAINTENANCE_INTERVAL_HOURS', '6'))  # heures entre deux entretiens
+XP_FLUSH_INTERVAL = float(os.environ.get('XP_FLUSH_INTERVAL', '10'))  # secondes entre deux écritures d'XP
+XP_FLUSH_MAX_USERS = int(os.environ.get('XP_FLUSH_MAX_USERS', '500'))  # écriture anticipée au-delà de N membres en attente
+XP_COOLDOWN_SECONDS = float(os.environ.get('XP_COOLDOWN_SECONDS', '10'))  # délai minimal entre deux gains d'XP
+LEADERBOARD_CACHE_TTL = float(os.environ.get('LEADERBOARD_CACHE_TTL', '60'))  # durée de vie du classement en cache
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))  # port local de l'export Prometheus (0 = désactivé)
+SHARD_COUNT = os.environ.get('SHARD_COUNT')  # "auto" ou nombre de shards ; vide = une seule connexion
+SHARD_IDS = os.environ.get('SHARD_IDS')  # shards gérés par ce processus (renseigné par cluster.py)
+# Sous cluster.py, seul le processus du shard 0 synchronise les commandes et entretient la base
+PRIMARY_PROCESS = not SHARD_IDS or '0' in SHARD_IDS.split(',')
+LEGACY_GUILD_ID = int(os.environ.get('LEGACY_GUILD_ID', '0'))  # serveur des données d'avant le partitionnement
+FORCE_COMMAND_SYNC = os.environ.get('FORCE_COMMAND_SYNC', '0') == '1'  # resynchroniser les commandes au démarrage
+LEVEL_UP_ANNOUNCE_WINDOW = float(os.environ.get('LEVEL_UP_ANNOUNCE_WINDOW', '2'))  # regroupement des annonces par salon
+BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', '3'))  # salons lus en parallèle par /admin_historique
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', '4'))  # appels Discord secondaires simultanés (annonces, rôles)
+ROLE_SWEEP_AT_STARTUP = os.environ.get('ROLE_SWEEP_AT_STARTUP', '1') == '1'  # corriger les rôles d'ancienneté au démarrage
+ROLE_SWEEP_CONCURRENCY = int(os.environ.get('ROLE_SWEEP_CONCURRENCY', '5'))  # corrections de rôles en attente par serveur
+# Au-delà de cette attente (secondes, minimum 30 imposé par discord.py), un appel limité lève discord.RateLimited
+# et l'ordonnanceur met sa route en pause au lieu de bloquer un worker ; 0 = toujours attendre
+DISCORD_MAX_RATELIMIT_WAIT = float(os.environ.get('DISCORD_MAX_RATELIMIT_WAIT', '30'))
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
+max_ratelimit_timeout = DISCORD_MAX_RATELIMIT_WAIT or None
+
+if SHARD_COUNT:
+    # Plusieurs connexions gateway gérées par discord.py (obligatoire au-delà de 2500 serveurs)
+    shard_count = None if SHARD_COUNT == 'auto' else int(SHARD_COUNT)
+    shard_ids = [int(shard_id) for shard_id in SHARD_IDS.split(',')] if SHARD_IDS else None
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=shard_count, shard_ids=shard_ids,
+                                     max_ratelimit_timeout=max_ratelimit_timeout)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, max_ratelimit_timeout=max_ratelimit_timeout)
+
+# Stockage : requêtes typées sur la base (aucun SQL dans les gestionnaires) ou tables en mémoire
+if STORAGE_BACKEND == 'memory':
+    repo = MemoryRepository(snapshot_path=MEMORY_SNAPSHOT_PATH, snapshot_interval=MEMORY_SNAPSHOT_INTERVAL)
+elif STORAGE_BACKEND == 'sqlite':
+    # Connexion unique à la base, ouverte au démarrage et partagée par tous les gestionnaires
+    # (lancé par cluster.py, le processus confie ses écritures au processus d'écriture)
+    if writer_channel() is None:
+        db = Database(DB_PATH, on_query=metrics.observe_sql)
+    else:
+        db = RemoteWriteDatabase(DB_PATH, writer_channel(), on_query=metrics.observe_sql)
+    repo = Repository(db)
+else:
+    raise SystemExit(f"❌ STORAGE_BACKEND inconnu : {STORAGE_BACKEND} (valeurs possibles : sqlite, memory)")
+
+# Sauvegardes à chaud et entretien de la base SQLite, sur une connexion séparée
+# (sous cluster.py, les écritures de l'entretien passent par le processus d'écriture)
+maintenance = None
+if STORAGE_BACKEND == 'sqlite' and PRIMARY_PROCESS:
+    maintenance = DatabaseMaintenance(DB_PATH, BACKUP_DIR, keep=BACKUP_KEEP,
+                                      backup_interval=BACKUP_INTERVAL_HOURS * 3600,
+                                      maintenance_interval=MAINTENANCE_INTERVAL_HOURS * 3600,
+                                      db=db if writer_channel() is not None else None)
+
+# Comptage des appels REST envoyés à Discord
+metrics.instrument_http(bot.http)
+metrics_runner = None
+
+# XP des messages accumulée en mémoire et écrite par lots
+xp_buffer = XPAccumulator(repo, flush_interval=XP_FLUSH_INTERVAL, max_dirty=XP_FLUSH_MAX_USERS)
+
+# Anti-spam : les messages trop rapprochés ne coûtent qu'une recherche en mémoire
+xp_cooldown = XPCooldown(XP_COOLDOWN_SECONDS)
+
+# Rendu du top 15 par serveur, servi sans SQL tant qu'aucune montée de niveau ne le modifie
+LEADERBOARD_SIZE = 15
+leaderboard_cache = LeaderboardCache(size=LEADERBOARD_SIZE, ttl=LEADERBOARD_CACHE_TTL)
+
+# Noms de personnages par membre, pour l'autocomplétion sans requête SQL à chaque frappe
+character_index = CharacterNameIndex(repo)
+
+# Appels Discord secondaires, servis après les réponses aux interactions
+scheduler = OutboundScheduler(workers=OUTBOUND_WORKERS)
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Annonces de montée de niveau regroupées par salon (un message par fenêtre)
+announcer = LevelUpAnnouncer(window=LEVEL_UP_ANNOUNCE_WINDOW, scheduler=scheduler)
+
+# Imports de l'historique en cours ou terminés depuis le démarrage : guild_id -> (job, tâche)
+backfill_jobs = {}
+
+# Réconciliations des rôles d'ancienneté depuis le démarrage : guild_id -> (job, tâche)
+role_sweep_jobs = {}
+startup_sweep = None
 
 # === FONCTIONS UTILITAIRES ===
 
-def init_db():
-    """Initialise la base de données SQLite"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    # Table pour les niveaux d'ancienneté des membres
-    cursor.execute("""CREATE TABLE IF NOT EXISTS user_levels (
-        user_id INTEGER PRIMARY KEY,
-        username TEXT,
-        level INTEGER DEFAULT 1,
-        exp INTEGER DEFAULT 0,
-        total_messages INTEGER DEFAULT 0,
-        last_message_time REAL DEFAULT 0
-    )""")
-
-    # Table pour les personnages de jeu de rôle
-    cursor.execute("""CREATE TABLE IF NOT EXISTS characters (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        character_name TEXT UNIQUE,
-        specialty TEXT,
-        chant INTEGER DEFAULT 1,
-        danse INTEGER DEFAULT 1,
-        eloquence INTEGER DEFAULT 1,
-        acting INTEGER DEFAULT 1,
-        fitness INTEGER DEFAULT 1,
-        esthetique INTEGER DEFAULT 1,
-        reputation INTEGER DEFAULT 500,
-        chant_exp INTEGER DEFAULT 0,
-        danse_exp INTEGER DEFAULT 0,
-        eloquence_exp INTEGER DEFAULT 0,
-        acting_exp INTEGER DEFAULT 0,
-        fitness_exp INTEGER DEFAULT 0,
-        esthetique_exp INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES user_levels (user_id)
-    )""")
-
-    conn.commit()
-    conn.close()
+async def adopt_legacy_rows():
+    """Rattache les données d'avant le partitionnement si le bot n'a qu'un serveur"""
+    # Un processus de cluster.py ne voit que les serveurs de ses shards
+    if LEGACY_GUILD_ID != 0 or SHARD_IDS or len(bot.guilds) != 1:
+        return
+    if not await repo.has_legacy_rows():
+        return
+
+    await repo.adopt_legacy_rows(bot.guilds[0].id)
+    xp_buffer.ranking.invalidate(bot.guilds[0].id)
+    print(f"🔧 Anciennes données rattachées au serveur {bot.guilds[0].name}")
+
+async def init_db():
+    """Ouvre le stockage (base SQLite migrée, ou dernier instantané en mémoire)"""
+    await repo.open(legacy_guild_id=LEGACY_GUILD_ID)
+
+def command_tree_fingerprint():
+    """Empreinte des commandes slash telles qu'elles seraient envoyées à Discord"""
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands()), key=lambda command: command['name'])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+async def sync_command_tree(force=False):
+    """Synchronise les commandes slash si elles ont changé depuis la dernière synchronisation.
+
+    Retourne la liste des commandes synchronisées, ou None si rien n'a changé.
+    """
+    key = f"command_tree:{bot.application_id}"
+    fingerprint = command_tree_fingerprint()
+    if not force and await repo.get_state(key) == fingerprint:
+        return None
+
+    synced = await bot.tree.sync()
+    await repo.set_state(key, fingerprint)
+    return synced
+
+def roll_message_exp():
+    """XP gagnée pour un message (hors délai anti-spam)"""
+    return random.randint(3, 5)
 
 def calc_level_exp(level):
     """Calcule l'XP nécessaire pour atteindre un niveau donné"""
-    if level == 1:
-        return 200
-    base = 200
-    for i in range(2, level + 1):
-        base = int(base * 1.4)
-    return base
+    return LEVEL_THRESHOLDS.required(level)
 
 def calc_stat_exp(level):
     """Calcule l'XP nécessaire pour les statistiques de personnage"""
-    if level == 1:
-        return 5000
-    base = 5000
-    for i in range(2, level + 1):
-        base += 120 * i
-    return base
-
-def get_seniority_role(level):
-    """Retourne le rôle d'ancienneté basé sur le niveau"""
-    if 1 <= level <= 9:
-        return "๑📧﹕newcomer﹗‧₊˚﹒ᶻz"
-    elif 10 <= level <= 19:
-        return "๑🫙﹕rising ﹗‧₊˚﹒ᶻz"
-    elif 20 <= level <= 29:
-        return "๑🧴﹕yapper﹗‧₊˚﹒ᶻz"
-    else:
-        return "๑🌿﹕go outisde touch some grass﹗‧₊˚﹒ᶻz"
+    return STAT_THRESHOLDS.required(level)
 
-def get_character_limit(seniority_role):
-    """Retourne la limite de personnages basée sur l'ancienneté"""
+def get_character_limit(seniority_tier):
+    """Retourne la limite de personnages basée sur le palier d'ancienneté"""
     limits = {
         "newcomer": 3,
         "rising": 4,
         "yapper": 5,
         "go outside touch some grass": float('inf')
     }
-    return limits.get(seniority_role, 3)
+    return limits.get(seniority_tier, 3)
+
+# Un rôle de palier peut porter le nom décoré ou le nom court du guide d'installation
+role_cache = SeniorityRoleCache({tier: (tier, decorated) for _, tier, decorated in SENIORITY_TIERS})
 
 # === ÉVÉNEMENTS DU BOT ===
 
 @bot.event
-async def on_ready():
-    """Événement déclenché quand le bot se connecte"""
-    print(f'🤖 {bot.user} est connecté et prêt!')
-    init_db()
+async def setup_hook():
+    """Démarrage unique, après la connexion HTTP et avant le gateway (jamais rejoué lors d'une reconnexion)"""
+    await init_db()
+    xp_buffer.start()
+    scheduler.start()
+    if maintenance is not None:
+        maintenance.start()
+
+    # Export Prometheus local
+    global metrics_runner
+    if METRICS_PORT:
+        metrics_runner = await metrics.start_http_server(METRICS_PORT)
+        print(f"📈 Mesures exposées sur http://127.0.0.1:{METRICS_PORT}/metrics")
+
+    if not PRIMARY_PROCESS:
+        return
 
-    # Synchroniser les commandes slash
+    # Synchroniser les commandes slash, seulement si elles ont changé
     try:
-        synced = await bot.tree.sync()
-        print(f"⚡ Synchronisé {len(synced)} slash command(s)")
+        synced = await sync_command_tree(force=FORCE_COMMAND_SYNC)
+        if synced is None:
+            print("⚡ Commandes slash inchangées, synchronisation ignorée")
+        else:
+            print(f"⚡ Synchronisé {len(synced)} slash command(s)")
     except Exception as e:
         print(f"❌ Erreur lors de la synchronisation: {e}")
 
 @bot.event
+async def on_ready():
+    """Événement déclenché quand le bot se connecte (et après chaque reconnexion complète)"""
+    print(f'🤖 {bot.user} est connecté et prêt! ({len(bot.guilds)} serveur(s), {bot.shard_count or 1} shard(s))')
+    # Nécessite la liste des serveurs : impossible dans setup_hook
+    await adopt_legacy_rows()
+
+    # Rôles d'ancienneté faussés pendant l'arrêt du bot : une seule fois par démarrage, pas à chaque reconnexion
+    global startup_sweep
+    if ROLE_SWEEP_AT_STARTUP and startup_sweep is None:
+        startup_sweep = asyncio.create_task(sweep_roles_at_startup())
+
+@bot.event
+async def on_shard_ready(shard_id):
+    """Événement déclenché quand un shard (mode AutoShardedBot) est prêt"""
+    guild_count = sum(1 for guild in bot.guilds if guild.shard_id == shard_id)
+    print(f"🧩 Shard {shard_id} prêt ({guild_count} serveur(s))")
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    """Un shard a repris sa session après une coupure"""
+    print(f"🔁 Shard {shard_id} reconnecté")
+
+@bot.event
+async def on_interaction(interaction):
+    """Suspend les appels secondaires tant que l'interaction attend sa réponse"""
+    scheduler.track_interaction(interaction)
+
+@bot.event
+async def on_guild_role_create(role):
+    """Invalide le cache des rôles d'ancienneté du serveur"""
+    role_cache.invalidate(role.guild.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Invalide le cache des rôles d'ancienneté du serveur"""
+    role_cache.invalidate(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    """Invalide le cache des rôles d'ancienneté du serveur"""
+    role_cache.invalidate(role.guild.id)
+
+@bot.event
+@metrics.timed("on_message")
 async def on_message(message):
     """Gère le système d'XP pour chaque message"""
-    if message.author.bot:
+    if message.author.bot or not message.guild:
         return
 
-    # Cooldown pour éviter le spam (optionnel)
     current_time = datetime.now().timestamp()
 
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
     user_id = message.author.id
     username = str(message.author)
 
-    # Récupérer ou créer l'utilisateur
-    cursor.execute("SELECT * FROM user_levels WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
+    # Cooldown pour éviter le spam, avant tout accès à la base : le message ne rapporte pas d'XP.
+    # Il n'est compté que si le profil est déjà en mémoire (jamais lu ni écrit depuis ce chemin)
+    if not xp_cooldown.try_acquire((message.guild.id, user_id)):
+        user = xp_buffer.peek(message.guild.id, user_id)
+        if user is not None:
+            user.total_messages += 1
+            xp_buffer.mark_dirty_later(user)
+        await bot.process_commands(message)
+        return
 
-    if not user:
-        cursor.execute("""INSERT INTO user_levels 
-                         (user_id, username, last_message_time) 
-                         VALUES (?, ?, ?)""", (user_id, username, current_time))
-        user = (user_id, username, 1, 0, 0, current_time)
+    # Récupérer ou créer l'utilisateur (en mémoire, écrit en base par lots)
+    user = await xp_buffer.get_or_create(message.guild.id, user_id, username, current_time)
 
     # Ajouter de l'XP aléatoire (3-5 points)
-    exp_gain = random.randint(3, 5)
-    new_exp = user[3] + exp_gain
-    new_total_messages = user[4] + 1
-    current_level = user[2]
-
-    # Vérifier les montées de niveau
-    new_level = current_level
-    level_ups = 0
-
-    while True:
-        exp_needed = calc_level_exp(new_level + 1)
-        if new_exp >= exp_needed:
-            new_level += 1
-            new_exp -= exp_needed
-            level_ups += 1
-        else:
-            break
+    exp_gain = roll_message_exp()
+    new_total_messages = user.total_messages + 1
+    current_level = user.level
+
+    # Vérifier les montées de niveau (plusieurs niveaux d'un coup si besoin)
+    new_level, new_exp = LEVEL_THRESHOLDS.resolve(current_level, user.exp + exp_gain)
+    level_ups = new_level - current_level
+
+    # Mettre à jour l'entrée avant tout appel réseau ; l'écriture en base est différée
+    user.level = new_level
+    user.exp = new_exp
+    user.total_messages = new_total_messages
+    user.username = username
+    user.last_message_time = current_time
+    await xp_buffer.mark_dirty(user)
 
     # Si montée de niveau
     if level_ups > 0:
-        # Message de montée de niveau
-        if level_ups == 1:
-            await message.channel.send(f"🎉 {message.author.mention} a atteint le niveau **{new_level}** !")
-        else:
-            await message.channel.send(f"🚀 {message.author.mention} a gagné **{level_ups} niveaux** et atteint le niveau **{new_level}** !")
+        metrics.count_level_ups(level_ups)
 
-        # Gérer les rôles d'ancienneté
-        await update_seniority_roles(message.author, new_level, message.guild)
+        # Le classement en cache n'est invalidé que si cette montée le modifie
+        leaderboard_cache.on_level_change(message.guild.id, user_id, new_level, new_exp)
 
-    # Mettre à jour la base de données
-    cursor.execute("""UPDATE user_levels 
-                     SET level = ?, exp = ?, total_messages = ?, username = ?, last_message_time = ? 
-                     WHERE user_id = ?""",
-                   (new_level, new_exp, new_total_messages, username, current_time, user_id))
+        # Message de montée de niveau, regroupé avec les autres montées du salon
+        announcer.announce(message.channel, user_id, message.author.mention, new_level, level_ups)
 
-    conn.commit()
-    conn.close()
+        # Gérer les rôles d'ancienneté (en arrière-plan, seul le dernier palier demandé est envoyé)
+        schedule_seniority_roles(message.author, new_level, message.guild)
 
     await bot.process_commands(message)
 
+def schedule_seniority_roles(member, level, guild):
+    """Planifie la mise à jour des rôles d'ancienneté ; remplace une mise à jour encore en attente"""
+    async def update():
+        # Membre relu au moment de l'envoi : ses rôles ont pu changer entre-temps
+        try:
+            return await update_seniority_roles(guild.get_member(member.id) or member, level, guild)
+        except discord.HTTPException as e:
+            print(f"❌ Erreur lors de la mise à jour des rôles de {member}: {e}")
+            return False  # Résultat lu par une réconciliation dont la tâche a été remplacée
+
+    scheduler.submit(ROLE_EDIT, ('guild-members', guild.id), update, key=('roles', guild.id, member.id))
+
+def planned_seniority_roles(member, target_id, tier_role_ids):
+    """Rôles du membre avec le seul palier `target_id` (aucun si None) ; None si rien ne change"""
+    # Rôles à conserver : tout sauf les paliers d'ancienneté (et @everyone, implicite)
+    stale_ids = set(tier_role_ids.values()) - {target_id}
+    current_ids = {role.id for role in member.roles}
+    if (target_id is None or target_id in current_ids) and not current_ids & stale_ids:
+        return None  # Le membre a déjà le bon palier
+
+    new_roles = [role for role in member.roles if role.id not in stale_ids and not role.is_default()]
+    if target_id is not None and target_id not in current_ids:
+        new_roles.append(discord.Object(id=target_id))
+    return new_roles
+
 async def update_seniority_roles(member, level, guild):
-    """Met à jour les rôles d'ancienneté d'un membre"""
+    """Met à jour les rôles d'ancienneté d'un membre ; retourne False si Discord l'a refusé"""
     if not guild:
-        return
+        return True
 
     new_role_name = get_seniority_role(level)
-    old_roles = ["newcomer", "rising", "yapper", "go outside touch some grass"]
+    tier_role_ids = role_cache.tier_roles(guild)
+    target_id = tier_role_ids.get(get_seniority_tier(level))
+    if target_id is None:
+        print(f"⚠️ Rôle '{new_role_name}' non trouvé sur le serveur")
 
-    # Supprimer les anciens rôles d'ancienneté
-    for role_name in old_roles:
-        role = discord.utils.get(guild.roles, name=role_name)
-        if role and role in member.roles:
-            try:
-                await member.remove_roles(role)
-            except discord.Forbidden:
-                print(f"❌ Pas de permission pour supprimer le rôle {role_name}")
+    new_roles = planned_seniority_roles(member, target_id, tier_role_ids)
+    if new_roles is None:
+        return True
 
-    # Ajouter le nouveau rôle
-    new_role = discord.utils.get(guild.roles, name=new_role_name)
-    if new_role:
-        try:
-            await member.add_roles(new_role)
+    # Un seul appel : retrait des anciens paliers et ajout du nouveau
+    try:
+        await member.edit(roles=new_roles, reason="Rôle d'ancienneté")
+        if target_id is not None:
             print(f"✅ Rôle '{new_role_name}' attribué à {member}")
-        except discord.Forbidden:
-            print(f"❌ Pas de permission pour attribuer le rôle {new_role_name}")
-    else:
-        print(f"⚠️ Rôle '{new_role_name}' non trouvé sur le serveur")
+    except discord.Forbidden:
+        print(f"❌ Pas de permission pour attribuer le rôle {new_role_name}")
+        return False
+    return True
+
+async def remove_seniority_roles(member, guild):
+    """Retire tous les rôles d'ancienneté d'un membre en un seul appel"""
+    new_roles = planned_seniority_roles(member, None, role_cache.tier_roles(guild))
+    if new_roles is None:
+        return
+    await member.edit(roles=new_roles, reason="Remise à zéro de l'ancienneté")
+
+def seniority_roles_outdated(member, level):
+    """Indique si les rôles en cache du membre diffèrent de son palier (sans profil : rien à corriger)"""
+    if level is None:
+        return False
+    tier_role_ids = role_cache.tier_roles(member.guild)
+    target_id = tier_role_ids.get(get_seniority_tier(level))
+    return planned_seniority_roles(member, target_id, tier_role_ids) is not None
+
+async def reconcile_seniority_roles(member):
+    """Corrige les rôles d'un membre d'après son niveau relu au moment de l'envoi ; False en cas d'échec"""
+    guild = member.guild
+    member = guild.get_member(member.id) or member
+    try:
+        user = await xp_buffer.get(guild.id, member.id)
+        if user is None:
+            return True
+        return await update_seniority_roles(member, user.level, guild)
+    except discord.HTTPException as e:
+        print(f"❌ Erreur lors de la mise à jour des rôles de {member}: {e}")
+        return False
+
+def start_role_sweep(guild):
+    """Lance la réconciliation des rôles d'un serveur ; retourne (job, tâche)"""
+    job = RoleReconciliation(guild, repo, xp_buffer, scheduler, seniority_roles_outdated, reconcile_seniority_roles,
+                             concurrency=ROLE_SWEEP_CONCURRENCY)
+    task = asyncio.create_task(job.run())
+    task.add_done_callback(report_role_sweep_failure)
+    role_sweep_jobs[guild.id] = (job, task)
+    return job, task
+
+def report_role_sweep_failure(task):
+    """Journalise l'erreur qui a arrêté une réconciliation des rôles"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Réconciliation des rôles interrompue: {task.exception()}")
+
+async def sweep_roles_at_startup():
+    """Réconcilie les rôles des serveurs de ce processus, un serveur après l'autre"""
+    for guild in list(bot.guilds):
+        _, task = role_sweep_jobs.get(guild.id, (None, None))
+        if task is not None and not task.done():
+            continue  # Déjà lancée par /admin_roles
+        job, task = start_role_sweep(guild)
+        # Une interruption par /admin_roles ou une erreur (déjà journalisée) passe au serveur suivant
+        await asyncio.wait([task])
+        if not task.cancelled() and task.exception() is None and job.changed:
+            print(f"🎭 Rôles d'ancienneté corrigés sur {guild.name}: {job.changed}/{job.checked} membre(s)")
 
 # === COMMANDE D'AIDE ===
 
 @bot.tree.command(name="aide", description="Affiche la liste de toutes les commandes disponibles")
+@app_commands.guild_only()
+@metrics.timed("/aide")
 async def help_command(interaction: discord.Interaction):
     """Affiche la liste complète des commandes du bot"""
     embed = discord.Embed(
@@ -226,6 +442,9 @@ async def help_command(interaction: discord.Interaction):
 
 **`/classement`** - Classement des membres du serveur
 • Top 15 des membres les plus actifs avec leurs niveaux
+
+**`/rang [membre]`** - Position dans le classement
+• Votre rang (ou celui d'un membre) et vos voisins directs
     """
     embed.add_field(name="📊 Système de Niveaux", value=niveau_commands, inline=False)
 
@@ -244,6 +463,9 @@ async def help_command(interaction: discord.Interaction):
 • Améliorer une statistique (chant, danse, éloquence, acting, fitness, esthétique)
 • Gain de 750-1250 XP + bonus de spécialité
 
+**`/entrainer_multiple <statistiques> [personnages]`** - Entraînement groupé
+• Plusieurs statistiques (ou « toutes ») sur jusqu'à 10 personnages en une fois
+
 **`/supprimer_personnage <nom>`** - Supprimer un personnage
 • Suppression sécurisée avec confirmation obligatoire
     """
@@ -265,8 +487,8 @@ async def help_command(interaction: discord.Interaction):
     embed.add_field(name="🎯 Spécialités Disponibles", value=specialties_info, inline=False)
 
     # Système automatique
-    auto_system = """
-• **+3 à 5 XP** par message envoyé automatiquement
+    auto_system = f"""
+• **+3 à 5 XP** par message envoyé automatiquement (au plus un gain toutes les {XP_COOLDOWN_SECONDS:g} s)
 • **Montée de niveau** automatique avec notifications
 • **Attribution des rôles** d'ancienneté automatique :
   └ Niveaux 1-9 : **newcomer**
@@ -282,6 +504,18 @@ async def help_command(interaction: discord.Interaction):
         admin_commands = """
 **`/admin_reset_user <utilisateur>`** - Reset complet d'un utilisateur
 • Supprime niveau, XP, personnages et rôles (Admin seulement)
+
+**`/admin_stats`** - Résumé des performances du bot
+• Latences par commande, requêtes SQL, montées de niveau, appels Discord
+
+**`/admin_sync`** - Resynchroniser les commandes slash
+• Force l'envoi des commandes de ce serveur à Discord (tous les serveurs pour le propriétaire du bot)
+
+**`/admin_historique <action>`** - Importer l'XP des anciens messages
+• Parcourt l'historique des salons (reprise automatique après interruption)
+
+**`/admin_roles <action>`** - Corriger les rôles d'ancienneté de tous les membres
+• Compare chaque membre à son niveau et ne modifie que les rôles faux
         """
         embed.add_field(name="🛡️ Commandes d'Administration", value=admin_commands, inline=False)
 
@@ -304,22 +538,19 @@ async def help_command(interaction: discord.Interaction):
 # === COMMANDES POUR LE SYSTÈME DE NIVEAUX ===
 
 @bot.tree.command(name="niveau", description="Vérifiez votre niveau et votre XP")
+@app_commands.guild_only()
+@metrics.timed("/niveau")
 async def check_level(interaction: discord.Interaction):
     """Affiche le niveau et l'XP de l'utilisateur"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM user_levels WHERE user_id = ?", (interaction.user.id,))
-    user = cursor.fetchone()
+    user = await xp_buffer.get(interaction.guild_id, interaction.user.id)
 
     if not user:
         await interaction.response.send_message("❌ Vous n'avez pas encore envoyé de messages!", ephemeral=True)
-        conn.close()
         return
 
-    level = user[2]
-    exp = user[3]
-    total_messages = user[4]
+    level = user.level
+    exp = user.exp
+    total_messages = user.total_messages
     exp_needed_next = calc_level_exp(level + 1) - exp
     exp_for_current = calc_level_exp(level)
     seniority_role = get_seniority_role(level)
@@ -344,23 +575,24 @@ async def check_level(interaction: discord.Interaction):
     embed.timestamp = datetime.now()
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
-    conn.close()
 
 @bot.tree.command(name="classement", description="Affiche le classement des membres du serveur")
+@app_commands.guild_only()
+@metrics.timed("/classement")
 async def leaderboard(interaction: discord.Interaction):
     """Affiche le classement des utilisateurs"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
+    embed = leaderboard_cache.get(interaction.guild_id)
+    if embed is not None:
+        await interaction.response.send_message(embed=embed)
+        return
 
-    cursor.execute("""SELECT username, level, exp, total_messages 
-                     FROM user_levels 
-                     ORDER BY level DESC, exp DESC 
-                     LIMIT 15""")
-    users = cursor.fetchall()
+    # Classement en mémoire (XP en attente d'écriture comprises), noms et messages en une requête
+    top = await xp_buffer.ranking.top(interaction.guild_id, LEADERBOARD_SIZE)
+    profiles = await xp_buffer.get_many(interaction.guild_id, [user_id for user_id, _, _ in top])
+    users = [(profiles[user_id], level, exp) for user_id, level, exp in top if user_id in profiles]
 
     if not users:
         await interaction.response.send_message("❌ Aucun utilisateur trouvé dans le classement!", ephemeral=True)
-        conn.close()
         return
 
     embed = discord.Embed(
@@ -371,21 +603,59 @@ async def leaderboard(interaction: discord.Interaction):
 
     medals = ["🥇", "🥈", "🥉"]
 
-    for i, (username, level, exp, messages) in enumerate(users, 1):
+    for i, (user, level, exp) in enumerate(users, 1):
         medal = medals[i-1] if i <= 3 else f"**{i}.**"
         seniority = get_seniority_role(level)
 
         embed.add_field(
-            name=f"{medal} {username}",
-            value=f"🏆 Niveau **{level}** • ⚡ **{exp}** XP\n📨 **{messages}** messages • 🎭 **{seniority}**",
+            name=f"{medal} {user.username}",
+            value=f"🏆 Niveau **{level}** • ⚡ **{exp}** XP\n📨 **{user.total_messages}** messages • 🎭 **{seniority}**",
             inline=False
         )
 
     embed.set_footer(text=f"Classement mis à jour • {len(users)} membres actifs")
     embed.timestamp = datetime.now()
 
+    leaderboard_cache.store(interaction.guild_id, embed, [(user.user_id, level, exp) for user, level, exp in users])
     await interaction.response.send_message(embed=embed)
-    conn.close()
+
+@bot.tree.command(name="rang", description="Affiche votre position dans le classement")
+@app_commands.guild_only()
+@app_commands.describe(membre="Le membre dont afficher le rang (vous par défaut)")
+@metrics.timed("/rang")
+async def rank(interaction: discord.Interaction, membre: Optional[discord.Member] = None):
+    """Affiche le rang d'un membre et ses voisins dans le classement"""
+    target = membre or interaction.user
+
+    # Rang exact et voisins : classement en mémoire (XP en attente d'écriture comprises), sans SQL
+    around = await xp_buffer.ranking.around(interaction.guild_id, target.id, 2)
+    if around is None:
+        await interaction.response.send_message(f"❌ {target.display_name} n'a pas encore envoyé de messages!", ephemeral=True)
+        return
+    position, window = around
+    # Noms des membres affichés : cache, puis une seule requête pour les autres
+    profiles = await xp_buffer.get_many(interaction.guild_id, [user_id for _, user_id, _, _ in window])
+    _, _, level, exp = next(line for line in window if line[0] == position)
+
+    embed = discord.Embed(
+        title=f"🏅 Rang de {target.display_name}",
+        description=f"**#{position}** du classement • 🏆 Niveau **{level}** • ⚡ **{exp}** XP",
+        color=0xffd700
+    )
+
+    lines = []
+    for rank_position, user_id, level, exp in window:
+        # Membre supprimé entre la lecture du classement et celle des noms
+        if user_id not in profiles:
+            continue
+        line = f"**#{rank_position}** {profiles[user_id].username} • Niveau {level} • {exp} XP"
+        lines.append(f"➡️ {line}" if rank_position == position else line)
+    embed.add_field(name="👥 Voisins", value="\n".join(lines), inline=False)
+
+    embed.set_thumbnail(url=target.display_avatar.url)
+    embed.timestamp = datetime.now()
+
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # === SYSTÈME DE PERSONNAGES ===
 
@@ -395,186 +665,137 @@ SPECIALTIES = [
     "Etudiant", "Professeur", "Influenceur", "Autre"
 ]
 
+# Noms affichés des statistiques entraînables (même ordre que repository.STATS)
+STAT_NAMES = {
+    'chant': '🎵 Chant',
+    'danse': '💃 Danse',
+    'eloquence': '🗣️ Éloquence',
+    'acting': '🎭 Acting',
+    'fitness': '💪 Fitness',
+    'esthetique': '✨ Esthétique'
+}
+
 # Types de professeurs
 PROFESSOR_TYPES = [
     "Professeur de chant", "Professeur de danse", "Professeur de théâtre",
     "Professeur de journalisme", "Educateur physique", "Professeur d'art"
 ]
 
-@bot.tree.command(name="creer_personnage", description="Créer un nouveau personnage de jeu de rôle")
-@app_commands.describe(nom="Le nom complet du personnage")
-async def create_character(interaction: discord.Interaction, nom: str):
-    """Créer un nouveau personnage"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    # Vérifier le nombre de personnages existants
-    cursor.execute("SELECT COUNT(*) FROM characters WHERE user_id = ?", (interaction.user.id,))
-    character_count = cursor.fetchone()[0]
+# Longueur maximale d'un nom : il est transporté dans le custom_id (100 caractères) des menus de création
+MAX_CHARACTER_NAME_LENGTH = 60
+
+def get_specialty_description(specialty):
+    """Retourne une description pour chaque spécialité"""
+    descriptions = {
+        "Chanteur": "Chant niveau 3",
+        "Danseur": "Danse niveau 3", 
+        "Acteur": "Acting niveau 3",
+        "Reporter": "Éloquence niveau 3",
+        "Coach": "Fitness niveau 3",
+        "Mannequin": "Esthétique niveau 3",
+        "Etudiant": "+10% XP entraînement",
+        "Professeur": "Voir sous-spécialités",
+        "Influenceur": "Réputation 1000",
+        "Autre": "Spécialité personnalisée"
+    }
+    return descriptions.get(specialty, "")
 
+async def check_character_creation(guild_id: int, user_id: int, char_name: str):
+    """Retourne (message d'erreur ou None, résumé des emplacements de personnages du membre)"""
     # Vérifier le niveau d'ancienneté de l'utilisateur
-    cursor.execute("SELECT level FROM user_levels WHERE user_id = ?", (interaction.user.id,))
-    user_data = cursor.fetchone()
+    user_data = await xp_buffer.get(guild_id, user_id)
 
     if not user_data:
-        await interaction.response.send_message("❌ Vous devez d'abord envoyer des messages pour obtenir un niveau!", ephemeral=True)
-        conn.close()
-        return
+        return "❌ Vous devez d'abord envoyer des messages pour obtenir un niveau!", None
+
+    # Vérifier le nombre de personnages existants
+    character_count = await repo.count_characters(guild_id, user_id)
 
-    user_level = user_data[0]
+    user_level = user_data.level
     seniority_role = get_seniority_role(user_level)
-    character_limit = get_character_limit(seniority_role)
+    character_limit = get_character_limit(get_seniority_tier(user_level))
+
+    summary = f"• Vous avez **{character_count}/{character_limit}** personnages\n• Rang d'ancienneté: **{seniority_role}**"
 
     if character_count >= character_limit:
-        await interaction.response.send_message(
-            f"❌ Vous avez atteint la limite de **{character_limit}** personnages pour votre rang d'ancienneté (**{seniority_role}**)!\n"
-            f"💡 Montez de niveau pour débloquer plus de personnages!",
-            ephemeral=True
-        )
-        conn.close()
-        return
+        return (f"❌ Vous avez atteint la limite de **{character_limit}** personnages pour votre rang d'ancienneté (**{seniority_role}**)!\n"
+                f"💡 Montez de niveau pour débloquer plus de personnages!"), summary
 
     # Vérifier si le nom est déjà pris
-    cursor.execute("SELECT * FROM characters WHERE character_name = ?", (nom,))
-    if cursor.fetchone():
-        await interaction.response.send_message("❌ Ce nom de personnage est déjà pris!", ephemeral=True)
-        conn.close()
-        return
-
-    # Classes pour l'interface utilisateur
-    class SpecialtySelect(discord.ui.Select):
-        def __init__(self):
-            options = [
-                discord.SelectOption(
-                    label=spec, 
-                    value=spec,
-                    description=get_specialty_description(spec)
-                ) for spec in SPECIALTIES
-            ]
-            super().__init__(placeholder="Choisissez une spécialité...", options=options)
-
-        async def callback(self, select_interaction: discord.Interaction):
-            specialty = self.values[0]
-
-            if specialty == "Autre":
-                modal = CustomSpecialtyModal(nom)
-                await select_interaction.response.send_modal(modal)
-            elif specialty == "Professeur":
-                # Afficher un deuxième menu pour le type de professeur
-                view = ProfessorTypeView(nom)
-                await select_interaction.response.edit_message(
-                    content="Choisissez votre type de professeur:",
-                    view=view
-                )
-            else:
-                await create_character_with_specialty(select_interaction, nom, specialty)
-
-    class ProfessorTypeSelect(discord.ui.Select):
-        def __init__(self, char_name):
-            self.char_name = char_name
-            options = [
-                discord.SelectOption(label=prof_type, value=prof_type) 
-                for prof_type in PROFESSOR_TYPES
-            ]
-            super().__init__(placeholder="Choisissez votre spécialisation...", options=options)
-
-        async def callback(self, select_interaction: discord.Interaction):
-            specialty = self.values[0]
-            await create_character_with_specialty(select_interaction, self.char_name, specialty)
+    if await repo.character_name_taken(guild_id, char_name):
+        return "❌ Ce nom de personnage est déjà pris!", summary
 
-    class ProfessorTypeView(discord.ui.View):
-        def __init__(self, char_name):
-            super().__init__(timeout=300)
-            self.add_item(ProfessorTypeSelect(char_name))
-
-    class CustomSpecialtyModal(discord.ui.Modal):
-        def __init__(self, character_name):
-            super().__init__(title="Spécialité personnalisée")
-            self.character_name = character_name
-            self.specialty_input = discord.ui.TextInput(
-                label="Votre spécialité",
-                placeholder="Ex: Photographe, Écrivain, Cuisinier...",
-                max_length=50,
-                min_length=2
-            )
-            self.add_item(self.specialty_input)
+    return None, summary
 
-        async def on_submit(self, modal_interaction: discord.Interaction):
-            specialty = self.specialty_input.value
-            await create_character_with_specialty(modal_interaction, self.character_name, specialty)
-
-    async def create_character_with_specialty(inter: discord.Interaction, char_name: str, specialty: str):
-        """Créer le personnage avec la spécialité choisie"""
-        conn = sqlite3.connect('bot_database.db')
-        cursor = conn.cursor()
+async def create_character_with_specialty(inter: discord.Interaction, char_name: str, specialty: str):
+    """Créer le personnage avec la spécialité choisie"""
+    # Le menu peut être utilisé longtemps après /creer_personnage (ou après un redémarrage)
+    error, _ = await check_character_creation(inter.guild_id, inter.user.id, char_name)
+    if error:
+        await inter.response.edit_message(content=error, embed=None, view=None)
+        return
 
-        # Statistiques de base
-        stats = {
-            'chant': 1, 'danse': 1, 'eloquence': 1, 'acting': 1,
-            'fitness': 1, 'esthetique': 1, 'reputation': 500
-        }
+    # Statistiques de base
+    stats = {
+        'chant': 1, 'danse': 1, 'eloquence': 1, 'acting': 1,
+        'fitness': 1, 'esthetique': 1, 'reputation': 500
+    }
 
-        specialty_bonus = ""
-
-        # Appliquer les bonus de spécialité
-        if specialty == "Chanteur":
-            stats['chant'] = 3
-            specialty_bonus = "🎵 Chant niveau 3"
-        elif specialty == "Danseur":
-            stats['danse'] = 3
-            specialty_bonus = "💃 Danse niveau 3"
-        elif specialty == "Acteur":
-            stats['acting'] = 3
-            specialty_bonus = "🎭 Acting niveau 3"
-        elif specialty == "Reporter":
-            stats['eloquence'] = 3
-            specialty_bonus = "🗣️ Éloquence niveau 3"
-        elif specialty == "Coach":
-            stats['fitness'] = 3
-            specialty_bonus = "💪 Fitness niveau 3"
-        elif specialty == "Mannequin":
-            stats['esthetique'] = 3
-            specialty_bonus = "✨ Esthétique niveau 3"
-        elif specialty == "Influenceur":
-            stats['reputation'] = 1000
-            specialty_bonus = "⭐ Réputation 1000"
-        elif "Professeur de chant" in specialty:
-            stats['chant'] = 2
-            specialty_bonus = "🎵 Chant niveau 2 + bonus XP 5%"
-        elif "Professeur de danse" in specialty:
-            stats['danse'] = 2
-            specialty_bonus = "💃 Danse niveau 2 + bonus XP 5%"
-        elif "Professeur de théâtre" in specialty:
-            stats['acting'] = 2
-            specialty_bonus = "🎭 Acting niveau 2 + bonus XP 5%"
-        elif "Professeur de journalisme" in specialty:
-            stats['eloquence'] = 2
-            specialty_bonus = "🗣️ Éloquence niveau 2 + bonus XP 5%"
-        elif "Educateur physique" in specialty:
-            stats['fitness'] = 2
-            specialty_bonus = "💪 Fitness niveau 2 + bonus XP 5%"
-        elif "Professeur d'art" in specialty:
-            stats['esthetique'] = 2
-            specialty_bonus = "✨ Esthétique niveau 2 + bonus XP 5%"
-        elif specialty == "Etudiant":
-            specialty_bonus = "📚 Bonus XP entraînement +10%"
-
-        # Créer le personnage
-        cursor.execute("""INSERT INTO characters 
-                         (user_id, character_name, specialty, chant, danse, eloquence, acting, fitness, esthetique, reputation)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                      (inter.user.id, char_name, specialty, stats['chant'], stats['danse'],
-                       stats['eloquence'], stats['acting'], stats['fitness'], stats['esthetique'], stats['reputation']))
-
-        conn.commit()
-        conn.close()
-
-        embed = discord.Embed(title="✨ Nouveau personnage créé!", color=0x00ff00)
-        embed.add_field(name="📛 Nom", value=char_name, inline=True)
-        embed.add_field(name="🎯 Spécialité", value=specialty, inline=True)
-        embed.add_field(name="🎁 Bonus", value=specialty_bonus or "Aucun bonus", inline=False)
-
-        stats_text = f"""
+    specialty_bonus = ""
+
+    # Appliquer les bonus de spécialité
+    if specialty == "Chanteur":
+        stats['chant'] = 3
+        specialty_bonus = "🎵 Chant niveau 3"
+    elif specialty == "Danseur":
+        stats['danse'] = 3
+        specialty_bonus = "💃 Danse niveau 3"
+    elif specialty == "Acteur":
+        stats['acting'] = 3
+        specialty_bonus = "🎭 Acting niveau 3"
+    elif specialty == "Reporter":
+        stats['eloquence'] = 3
+        specialty_bonus = "🗣️ Éloquence niveau 3"
+    elif specialty == "Coach":
+        stats['fitness'] = 3
+        specialty_bonus = "💪 Fitness niveau 3"
+    elif specialty == "Mannequin":
+        stats['esthetique'] = 3
+        specialty_bonus = "✨ Esthétique niveau 3"
+    elif specialty == "Influenceur":
+        stats['reputation'] = 1000
+        specialty_bonus = "⭐ Réputation 1000"
+    elif "Professeur de chant" in specialty:
+        stats['chant'] = 2
+        specialty_bonus = "🎵 Chant niveau 2 + bonus XP 5%"
+    elif "Professeur de danse" in specialty:
+        stats['danse'] = 2
+        specialty_bonus = "💃 Danse niveau 2 + bonus XP 5%"
+    elif "Professeur de théâtre" in specialty:
+        stats['acting'] = 2
+        specialty_bonus = "🎭 Acting niveau 2 + bonus XP 5%"
+    elif "Professeur de journalisme" in specialty:
+        stats['eloquence'] = 2
+        specialty_bonus = "🗣️ Éloquence niveau 2 + bonus XP 5%"
+    elif "Educateur physique" in specialty:
+        stats['fitness'] = 2
+        specialty_bonus = "💪 Fitness niveau 2 + bonus XP 5%"
+    elif "Professeur d'art" in specialty:
+        stats['esthetique'] = 2
+        specialty_bonus = "✨ Esthétique niveau 2 + bonus XP 5%"
+    elif specialty == "Etudiant":
+        specialty_bonus = "📚 Bonus XP entraînement +10%"
+
+    # Créer le personnage
+    await repo.create_character(inter.guild_id, inter.user.id, char_name, specialty, stats)
+    character_index.add(inter.guild_id, inter.user.id, char_name)
+
+    embed = discord.Embed(title="✨ Nouveau personnage créé!", color=0x00ff00)
+    embed.add_field(name="📛 Nom", value=char_name, inline=True)
+    embed.add_field(name="🎯 Spécialité", value=specialty, inline=True)
+    embed.add_field(name="🎁 Bonus", value=specialty_bonus or "Aucun bonus", inline=False)
+
+    stats_text = f"""
 🎵 **Chant:** {stats['chant']}
 💃 **Danse:** {stats['danse']}
 🗣️ **Éloquence:** {stats['eloquence']}
@@ -582,32 +803,177 @@ async def create_character(interaction: discord.Interaction, nom: str):
 💪 **Fitness:** {stats['fitness']}
 ✨ **Esthétique:** {stats['esthetique']}
 ⭐ **Réputation:** {stats['reputation']}
-        """
-        embed.add_field(name="📊 Statistiques", value=stats_text, inline=False)
-
-        embed.set_footer(text=f"Créé par {inter.user.display_name}")
-        embed.timestamp = datetime.now()
-
-        await inter.response.edit_message(content=None, embed=embed, view=None)
-
-    def get_specialty_description(specialty):
-        """Retourne une description pour chaque spécialité"""
-        descriptions = {
-            "Chanteur": "Chant niveau 3",
-            "Danseur": "Danse niveau 3", 
-            "Acteur": "Acting niveau 3",
-            "Reporter": "Éloquence niveau 3",
-            "Coach": "Fitness niveau 3",
-            "Mannequin": "Esthétique niveau 3",
-            "Etudiant": "+10% XP entraînement",
-            "Professeur": "Voir sous-spécialités",
-            "Influenceur": "Réputation 1000",
-            "Autre": "Spécialité personnalisée"
-        }
-        return descriptions.get(specialty, "")
+    """
+    embed.add_field(name="📊 Statistiques", value=stats_text, inline=False)
 
-    view = discord.ui.View(timeout=300)
-    view.add_item(SpecialtySelect())
+    embed.set_footer(text=f"Créé par {inter.user.display_name}")
+    embed.timestamp = datetime.now()
+
+    await inter.response.edit_message(content=None, embed=embed, view=None)
+
+# === INTERFACES PERSISTANTES ===
+# Composants définis une seule fois et enregistrés auprès du bot (bot.add_dynamic_items) :
+# leur état (membre, nom ou id du personnage) est porté par le custom_id, ils survivent
+# donc à un redémarrage du bot et ne sont jamais recréés à chaque commande.
+
+class OwnedItem:
+    """Réserve un composant au membre dont l'identifiant est dans son custom_id"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+class SpecialtySelect(OwnedItem, discord.ui.DynamicItem[discord.ui.Select],
+                      template=r'perso:specialite:(?P<user_id>\d+):(?P<name>.+)'):
+    def __init__(self, user_id: int, char_name: str):
+        self.user_id = user_id
+        self.char_name = char_name
+        options = [
+            discord.SelectOption(
+                label=spec, 
+                value=spec,
+                description=get_specialty_description(spec)
+            ) for spec in SPECIALTIES
+        ]
+        super().__init__(discord.ui.Select(
+            custom_id=f"perso:specialite:{user_id}:{char_name}",
+            placeholder="Choisissez une spécialité...",
+            options=options
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(int(match['user_id']), match['name'])
+
+    async def callback(self, select_interaction: discord.Interaction):
+        specialty = self.item.values[0]
+
+        if specialty == "Autre":
+            modal = CustomSpecialtyModal(self.char_name)
+            await select_interaction.response.send_modal(modal)
+        elif specialty == "Professeur":
+            # Afficher un deuxième menu pour le type de professeur
+            view = discord.ui.View(timeout=None)
+            view.add_item(ProfessorTypeSelect(self.user_id, self.char_name))
+            await select_interaction.response.edit_message(
+                content="Choisissez votre type de professeur:",
+                view=view
+            )
+        else:
+            await create_character_with_specialty(select_interaction, self.char_name, specialty)
+
+class ProfessorTypeSelect(OwnedItem, discord.ui.DynamicItem[discord.ui.Select],
+                          template=r'perso:professeur:(?P<user_id>\d+):(?P<name>.+)'):
+    def __init__(self, user_id: int, char_name: str):
+        self.user_id = user_id
+        self.char_name = char_name
+        options = [
+            discord.SelectOption(label=prof_type, value=prof_type) 
+            for prof_type in PROFESSOR_TYPES
+        ]
+        super().__init__(discord.ui.Select(
+            custom_id=f"perso:professeur:{user_id}:{char_name}",
+            placeholder="Choisissez votre spécialisation...",
+            options=options
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(int(match['user_id']), match['name'])
+
+    async def callback(self, select_interaction: discord.Interaction):
+        specialty = self.item.values[0]
+        await create_character_with_specialty(select_interaction, self.char_name, specialty)
+
+class CustomSpecialtyModal(discord.ui.Modal):
+    def __init__(self, character_name):
+        super().__init__(title="Spécialité personnalisée")
+        self.character_name = character_name
+        self.specialty_input = discord.ui.TextInput(
+            label="Votre spécialité",
+            placeholder="Ex: Photographe, Écrivain, Cuisinier...",
+            max_length=50,
+            min_length=2
+        )
+        self.add_item(self.specialty_input)
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        specialty = self.specialty_input.value
+        await create_character_with_specialty(modal_interaction, self.character_name, specialty)
+
+class ConfirmDeleteButton(OwnedItem, discord.ui.DynamicItem[discord.ui.Button],
+                          template=r'perso:supprimer:(?P<user_id>\d+):(?P<character_id>\d+)'):
+    def __init__(self, user_id: int, character_id: int):
+        self.user_id = user_id
+        self.character_id = character_id
+        super().__init__(discord.ui.Button(
+            label="✅ Confirmer",
+            style=discord.ButtonStyle.danger,
+            custom_id=f"perso:supprimer:{user_id}:{character_id}"
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['user_id']), int(match['character_id']))
+
+    async def callback(self, button_interaction: discord.Interaction):
+        character = await repo.get_character_by_id(self.character_id, self.user_id)
+        if not character:
+            await button_interaction.response.edit_message(
+                content="❌ Ce personnage n'existe plus.", embed=None, view=None)
+            return
+
+        await repo.delete_character(character.id)
+        character_index.remove(character.guild_id, character.user_id, character.character_name)
+
+        embed = discord.Embed(
+            title="🗑️ Personnage supprimé",
+            description=f"Le personnage **{character.character_name}** a été définitivement supprimé.",
+            color=0xff0000
+        )
+        embed.set_footer(text=f"Suppression confirmée par {button_interaction.user.display_name}")
+
+        await button_interaction.response.edit_message(content=None, embed=embed, view=None)
+
+class CancelDeleteButton(OwnedItem, discord.ui.DynamicItem[discord.ui.Button],
+                         template=r'perso:annuler:(?P<user_id>\d+):(?P<character_id>\d+)'):
+    def __init__(self, user_id: int, character_id: int):
+        self.user_id = user_id
+        self.character_id = character_id
+        super().__init__(discord.ui.Button(
+            label="❌ Annuler",
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"perso:annuler:{user_id}:{character_id}"
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['user_id']), int(match['character_id']))
+
+    async def callback(self, button_interaction: discord.Interaction):
+        character = await repo.get_character_by_id(self.character_id, self.user_id)
+        name = character.character_name if character else "?"
+        embed = discord.Embed(
+            title="❌ Suppression annulée",
+            description=f"Le personnage **{name}** n'a pas été supprimé.",
+            color=0x808080
+        )
+        await button_interaction.response.edit_message(content=None, embed=embed, view=None)
+
+bot.add_dynamic_items(SpecialtySelect, ProfessorTypeSelect, ConfirmDeleteButton, CancelDeleteButton)
+
+@bot.tree.command(name="creer_personnage", description="Créer un nouveau personnage de jeu de rôle")
+@app_commands.guild_only()
+@app_commands.describe(nom="Le nom complet du personnage")
+@metrics.timed("/creer_personnage")
+async def create_character(interaction: discord.Interaction, nom: app_commands.Range[str, 1, MAX_CHARACTER_NAME_LENGTH]):
+    """Créer un nouveau personnage"""
+    error, summary = await check_character_creation(interaction.guild_id, interaction.user.id, nom)
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
+        return
+
+    view = discord.ui.View(timeout=None)
+    view.add_item(SpecialtySelect(interaction.user.id, nom))
 
     embed = discord.Embed(
         title="🎭 Création de personnage",
@@ -616,26 +982,21 @@ async def create_character(interaction: discord.Interaction, nom: str):
     )
     embed.add_field(
         name="ℹ️ Informations",
-        value=f"• Vous avez **{character_count}/{character_limit}** personnages\n• Rang d'ancienneté: **{seniority_role}**",
+        value=summary,
         inline=False
     )
 
     await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-    conn.close()
 
 @bot.tree.command(name="mes_personnages", description="Voir la liste de vos personnages")
+@app_commands.guild_only()
+@metrics.timed("/mes_personnages")
 async def list_characters(interaction: discord.Interaction):
     """Affiche la liste des personnages de l'utilisateur"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    cursor.execute("""SELECT character_name, specialty, chant, danse, eloquence, acting, fitness, esthetique, reputation
-                     FROM characters WHERE user_id = ? ORDER BY created_at""", (interaction.user.id,))
-    characters = cursor.fetchall()
+    characters = await repo.list_characters(interaction.guild_id, interaction.user.id)
 
     if not characters:
         await interaction.response.send_message("❌ Vous n'avez aucun personnage créé!", ephemeral=True)
-        conn.close()
         return
 
     embed = discord.Embed(
@@ -643,11 +1004,10 @@ async def list_characters(interaction: discord.Interaction):
         color=0x9932cc
     )
 
-    for char_name, specialty, chant, danse, eloquence, acting, fitness, esthetique, reputation in characters:
-        total_level = chant + danse + eloquence + acting + fitness + esthetique
+    for character in characters:
         embed.add_field(
-            name=f"📛 {char_name}",
-            value=f"🎯 **{specialty}**\n📊 Niveau total: **{total_level}**\n⭐ Réputation: **{reputation}**",
+            name=f"📛 {character.character_name}",
+            value=f"🎯 **{character.specialty}**\n📊 Niveau total: **{character.total_level}**\n⭐ Réputation: **{character.reputation}**",
             inline=True
         )
 
@@ -655,40 +1015,35 @@ async def list_characters(interaction: discord.Interaction):
     embed.timestamp = datetime.now()
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
-    conn.close()
+
+async def character_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggère les personnages du membre dont le nom commence par la saisie"""
+    names = await character_index.suggest(interaction.guild_id, interaction.user.id, current)
+    return [app_commands.Choice(name=name, value=name) for name in names]
 
 @bot.tree.command(name="stats_personnage", description="Voir les statistiques détaillées d'un personnage")
+@app_commands.guild_only()
 @app_commands.describe(nom="Le nom du personnage")
+@app_commands.autocomplete(nom=character_name_autocomplete)
+@metrics.timed("/stats_personnage")
 async def character_stats(interaction: discord.Interaction, nom: str):
     """Affiche les statistiques d'un personnage"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM characters WHERE character_name = ? AND user_id = ?", (nom, interaction.user.id))
-    character = cursor.fetchone()
+    character = await repo.get_character(interaction.guild_id, interaction.user.id, nom)
 
     if not character:
         await interaction.response.send_message("❌ Personnage non trouvé ou ne vous appartient pas!", ephemeral=True)
-        conn.close()
         return
 
     embed = discord.Embed(
-        title=f"📊 Statistiques de {character[2]}", 
-        description=f"🎯 **Spécialité:** {character[3]}",
+        title=f"📊 Statistiques de {character.character_name}", 
+        description=f"🎯 **Spécialité:** {character.specialty}",
         color=0x0099ff
     )
 
     # Statistiques avec barres de progression
-    stats = [
-        ("🎵 Chant", character[4], character[11]),
-        ("💃 Danse", character[5], character[12]),
-        ("🗣️ Éloquence", character[6], character[13]),
-        ("🎭 Acting", character[7], character[14]),
-        ("💪 Fitness", character[8], character[15]),
-        ("✨ Esthétique", character[9], character[16])
-    ]
-
-    for stat_name, level, exp in stats:
+    for stat, stat_name in STAT_NAMES.items():
+        level = character.stat_level(stat)
+        exp = character.stat_exp(stat)
         exp_needed = calc_stat_exp(level + 1)
         progress = (exp / exp_needed) * 100 if exp_needed > 0 else 0
         progress_bar = "█" * int(progress // 10) + "░" * (10 - int(progress // 10))
@@ -701,14 +1056,13 @@ async def character_stats(interaction: discord.Interaction, nom: str):
 
     embed.add_field(
         name="⭐ Réputation",
-        value=f"**{character[10]}** points",
+        value=f"**{character.reputation}** points",
         inline=True
     )
 
-    total_level = sum(character[4:10]) - character[10]  # Exclure la réputation du total
     embed.add_field(
         name="📈 Niveau total",
-        value=f"**{total_level}** niveaux",
+        value=f"**{character.total_level}** niveaux",
         inline=True
     )
 
@@ -716,38 +1070,11 @@ async def character_stats(interaction: discord.Interaction, nom: str):
     embed.timestamp = datetime.now()
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
-    conn.close()
 
-@bot.tree.command(name="entrainer", description="Entraîner une statistique de votre personnage")
-@app_commands.describe(
-    nom="Le nom du personnage",
-    statistique="La statistique à entraîner"
-)
-@app_commands.choices(statistique=[
-    app_commands.Choice(name="🎵 Chant", value="chant"),
-    app_commands.Choice(name="💃 Danse", value="danse"),
-    app_commands.Choice(name="🗣️ Éloquence", value="eloquence"),
-    app_commands.Choice(name="🎭 Acting", value="acting"),
-    app_commands.Choice(name="💪 Fitness", value="fitness"),
-    app_commands.Choice(name="✨ Esthétique", value="esthetique")
-])
-async def train_character(interaction: discord.Interaction, nom: str, statistique: str):
-    """Entraîner une statistique d'un personnage"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM characters WHERE character_name = ? AND user_id = ?", (nom, interaction.user.id))
-    character = cursor.fetchone()
-
-    if not character:
-        await interaction.response.send_message("❌ Personnage non trouvé ou ne vous appartient pas!", ephemeral=True)
-        conn.close()
-        return
-
-    # Calculer l'XP gagnée
+def roll_training_exp(specialty, statistique):
+    """Tire l'XP d'un entraînement ; retourne (XP gagnée, multiplicateur de spécialité)"""
     base_exp = random.randint(750, 1250)
     multiplier = 1.0
-    specialty = character[3]
 
     # Bonus pour les étudiants
     if specialty == "Etudiant":
@@ -767,52 +1094,62 @@ async def train_character(interaction: discord.Interaction, nom: str, statistiqu
         if stat_matches.get(statistique, "").lower() in specialty.lower():
             multiplier *= 1.05  # +5%
 
-    final_exp = int(base_exp * multiplier)
+    return int(base_exp * multiplier), multiplier
 
-    # Récupérer les statistiques actuelles
-    stat_indices = {
-        'chant': (4, 11), 'danse': (5, 12), 'eloquence': (6, 13),
-        'acting': (7, 14), 'fitness': (8, 15), 'esthetique': (9, 16)
-    }
+def parse_stat_list(text):
+    """Convertit « chant, danse » ou « toutes » en liste de statistiques (None si invalide)"""
+    words = [unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode().lower()
+             for word in text.replace(',', ' ').split()]
+    if words in (["toutes"], ["tout"], ["all"]):
+        return list(STATS)
+    if not words or any(word not in STATS for word in words):
+        return None
+    return [stat for stat in STATS if stat in words]
 
-    level_idx, exp_idx = stat_indices[statistique]
-    current_level = character[level_idx]
-    current_exp = character[exp_idx]
+@bot.tree.command(name="entrainer", description="Entraîner une statistique de votre personnage")
+@app_commands.guild_only()
+@app_commands.describe(
+    nom="Le nom du personnage",
+    statistique="La statistique à entraîner"
+)
+@app_commands.choices(statistique=[
+    app_commands.Choice(name="🎵 Chant", value="chant"),
+    app_commands.Choice(name="💃 Danse", value="danse"),
+    app_commands.Choice(name="🗣️ Éloquence", value="eloquence"),
+    app_commands.Choice(name="🎭 Acting", value="acting"),
+    app_commands.Choice(name="💪 Fitness", value="fitness"),
+    app_commands.Choice(name="✨ Esthétique", value="esthetique")
+])
+@app_commands.autocomplete(nom=character_name_autocomplete)
+@metrics.timed("/entrainer")
+async def train_character(interaction: discord.Interaction, nom: str, statistique: str):
+    """Entraîner une statistique d'un personnage"""
+    character = await repo.get_character_stat(interaction.guild_id, interaction.user.id, nom, statistique)
 
-    new_exp = current_exp + final_exp
-    new_level = current_level
-    levels_gained = 0
+    if not character:
+        await interaction.response.send_message("❌ Personnage non trouvé ou ne vous appartient pas!", ephemeral=True)
+        return
+
+    # Calculer l'XP gagnée
+    specialty = character.specialty
+    final_exp, multiplier = roll_training_exp(specialty, statistique)
+
+    # Récupérer les statistiques actuelles
+    current_level = character.stat_level(statistique)
+    current_exp = character.stat_exp(statistique)
 
     # Vérifier les montées de niveau
-    while True:
-        exp_needed = calc_stat_exp(new_level + 1)
-        if new_exp >= exp_needed:
-            new_level += 1
-            new_exp -= exp_needed
-            levels_gained += 1
-        else:
-            break
+    new_level, new_exp = STAT_THRESHOLDS.resolve(current_level, current_exp + final_exp)
+    levels_gained = new_level - current_level
 
     # Mettre à jour la base de données
-    cursor.execute(f"UPDATE characters SET {statistique} = ?, {statistique}_exp = ? WHERE id = ?",
-                   (new_level, new_exp, character[0]))
-
-    conn.commit()
-    conn.close()
+    await repo.update_stat(character.id, statistique, new_level, new_exp)
 
     # Créer la réponse
-    stat_names = {
-        'chant': '🎵 Chant',
-        'danse': '💃 Danse',
-        'eloquence': '🗣️ Éloquence',
-        'acting': '🎭 Acting',
-        'fitness': '💪 Fitness',
-        'esthetique': '✨ Esthétique'
-    }
 
     embed = discord.Embed(title="🏋️ Entraînement terminé!", color=0x00ff00)
-    embed.add_field(name="📛 Personnage", value=nom, inline=True)
-    embed.add_field(name="📊 Statistique", value=stat_names[statistique], inline=True)
+    embed.add_field(name="📛 Personnage", value=character.character_name, inline=True)
+    embed.add_field(name="📊 Statistique", value=STAT_NAMES[statistique], inline=True)
     embed.add_field(name="⚡ XP gagnée", value=f"**{final_exp}** XP", inline=True)
 
     if multiplier > 1.0:
@@ -831,71 +1168,123 @@ async def train_character(interaction: discord.Interaction, nom: str, statistiqu
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@bot.tree.command(name="supprimer_personnage", description="Supprimer un de vos personnages")
-@app_commands.describe(nom="Le nom du personnage à supprimer")
-async def delete_character(interaction: discord.Interaction, nom: str):
-    """Supprimer un personnage avec confirmation"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
+# Un champ d'embed par personnage : Discord refuse plus de 25 champs et 6000 caractères par embed
+MAX_TRAINING_CHARACTERS = 10
+EMBED_MAX_CHARS = 6000
 
-    cursor.execute("SELECT * FROM characters WHERE character_name = ? AND user_id = ?", (nom, interaction.user.id))
-    character = cursor.fetchone()
+@bot.tree.command(name="entrainer_multiple", description="Entraîner plusieurs statistiques de vos personnages en une fois")
+@app_commands.guild_only()
+@app_commands.describe(
+    statistiques="Statistiques à entraîner, séparées par des virgules (ex: chant, danse) ou « toutes »",
+    personnages="Noms des personnages séparés par des virgules (par défaut : tous vos personnages)"
+)
+@metrics.timed("/entrainer_multiple")
+async def train_multiple(interaction: discord.Interaction, statistiques: str, personnages: Optional[str] = None):
+    """Entraîner plusieurs statistiques de plusieurs personnages, écrit en une seule transaction"""
+    stats = parse_stat_list(statistiques)
+    if not stats:
+        await interaction.response.send_message(
+            f"❌ Statistiques invalides! Choix possibles: {', '.join(STATS)} ou « toutes ».", ephemeral=True)
+        return
 
-    if not character:
-        await interaction.response.send_message("❌ Personnage non trouvé ou ne vous appartient pas!", ephemeral=True)
-        conn.close()
+    characters = await repo.get_characters(interaction.guild_id, interaction.user.id)
+    if personnages:
+        wanted = {name.strip().casefold() for name in personnages.split(',') if name.strip()}
+        characters = [character for character in characters if character.character_name.casefold() in wanted]
+        missing = wanted - {character.character_name.casefold() for character in characters}
+        if missing:
+            await interaction.response.send_message(
+                f"❌ Personnage(s) non trouvé(s) ou ne vous appartenant pas: {', '.join(sorted(missing))}", ephemeral=True)
+            return
+
+    if not characters:
+        await interaction.response.send_message("❌ Vous n'avez aucun personnage! Utilisez `/creer_personnage` pour en créer un.", ephemeral=True)
+        return
+
+    if len(characters) > MAX_TRAINING_CHARACTERS:
+        await interaction.response.send_message(
+            f"❌ Au plus {MAX_TRAINING_CHARACTERS} personnages par entraînement groupé "
+            f"(vous en avez {len(characters)}) : précisez-les avec l'option `personnages`.", ephemeral=True)
         return
 
-    class ConfirmView(discord.ui.View):
-        def __init__(self):
-            super().__init__(timeout=60)
+    # Tous les gains et montées de niveau sont calculés en mémoire avant l'unique écriture
+    embed = discord.Embed(title="🏋️ Entraînements terminés!", color=0x00ff00)
+    total_exp = 0
+    total_levels = 0
+    for character in characters:
+        lines = []
+        for stat in stats:
+            final_exp, multiplier = roll_training_exp(character.specialty, stat)
+            current_level = character.stat_level(stat)
+            new_level, new_exp = STAT_THRESHOLDS.resolve(current_level, character.stat_exp(stat) + final_exp)
+            setattr(character, stat, new_level)
+            setattr(character, f"{stat}_exp", new_exp)
+
+            line = f"{STAT_NAMES[stat]} • **+{final_exp}** XP"
+            if multiplier > 1.0:
+                line += f" (+{(multiplier - 1.0) * 100:.0f}%)"
+            if new_level > current_level:
+                line += f" • 🎉 Niveau **{new_level}**"
+            lines.append(line)
+            total_exp += final_exp
+            total_levels += new_level - current_level
+
+        embed.add_field(name=f"📛 {character.character_name} ({character.specialty})",
+                        value="\n".join(lines), inline=False)
+
+    embed.description = (f"**{len(characters) * len(stats)}** entraînements • ⚡ **{total_exp}** XP au total"
+                         + (f" • 🚀 **{total_levels}** niveau(x) gagné(s)" if total_levels else ""))
+    if total_levels:
+        embed.color = 0xffd700
+    embed.set_footer(text=f"Entraînement par {interaction.user.display_name}")
+    embed.timestamp = datetime.now()
+
+    # Vérifié avant l'écriture : un résumé refusé par Discord laisserait un entraînement sans réponse
+    if len(embed) > EMBED_MAX_CHARS:
+        await interaction.response.send_message(
+            "❌ Résumé trop long pour Discord : entraînez moins de personnages à la fois.", ephemeral=True)
+        return
 
-        @discord.ui.button(label="✅ Confirmer", style=discord.ButtonStyle.danger)
-        async def confirm(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-            conn = sqlite3.connect('bot_database.db')
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM characters WHERE id = ?", (character[0],))
-            conn.commit()
-            conn.close()
+    await repo.update_stats(characters, stats)
 
-            embed = discord.Embed(
-                title="🗑️ Personnage supprimé",
-                description=f"Le personnage **{nom}** a été définitivement supprimé.",
-                color=0xff0000
-            )
-            embed.set_footer(text=f"Suppression confirmée par {button_interaction.user.display_name}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
-            await button_interaction.response.edit_message(content=None, embed=embed, view=None)
+@bot.tree.command(name="supprimer_personnage", description="Supprimer un de vos personnages")
+@app_commands.guild_only()
+@app_commands.describe(nom="Le nom du personnage à supprimer")
+@app_commands.autocomplete(nom=character_name_autocomplete)
+@metrics.timed("/supprimer_personnage")
+async def delete_character(interaction: discord.Interaction, nom: str):
+    """Supprimer un personnage avec confirmation"""
+    character = await repo.get_character_summary(interaction.guild_id, interaction.user.id, nom)
 
-        @discord.ui.button(label="❌ Annuler", style=discord.ButtonStyle.secondary)
-        async def cancel(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-            embed = discord.Embed(
-                title="❌ Suppression annulée",
-                description=f"Le personnage **{nom}** n'a pas été supprimé.",
-                color=0x808080
-            )
-            await button_interaction.response.edit_message(content=None, embed=embed, view=None)
+    if not character:
+        await interaction.response.send_message("❌ Personnage non trouvé ou ne vous appartient pas!", ephemeral=True)
+        return
 
-    view = ConfirmView()
+    view = discord.ui.View(timeout=None)
+    view.add_item(ConfirmDeleteButton(interaction.user.id, character.id))
+    view.add_item(CancelDeleteButton(interaction.user.id, character.id))
 
     embed = discord.Embed(
         title="⚠️ Confirmation de suppression",
-        description=f"Êtes-vous **vraiment sûr** de vouloir supprimer le personnage **{nom}** ?\n\n⚠️ **Cette action est irréversible!**",
+        description=f"Êtes-vous **vraiment sûr** de vouloir supprimer le personnage **{character.character_name}** ?\n\n⚠️ **Cette action est irréversible!**",
         color=0xffa500
     )
     embed.add_field(
         name="📊 Statistiques du personnage",
-        value=f"🎯 Spécialité: {character[3]}\n📈 Niveaux cumulés: {sum(character[4:10]) - character[10]}",
+        value=f"🎯 Spécialité: {character.specialty}\n📈 Niveaux cumulés: {character.total_level}",
         inline=False
     )
 
     await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-    conn.close()
 
 # === COMMANDES D'ADMINISTRATION (OPTIONNELLES) ===
 
 @bot.tree.command(name="admin_reset_user", description="[ADMIN] Remettre à zéro le niveau d'un utilisateur")
+@app_commands.guild_only()
 @app_commands.describe(utilisateur="L'utilisateur à remettre à zéro")
+@metrics.timed("/admin_reset_user")
 async def admin_reset_user(interaction: discord.Interaction, utilisateur: discord.Member):
     """Commande d'administration pour remettre à zéro un utilisateur"""
     # Vérifier si l'utilisateur a les permissions d'administrateur
@@ -903,25 +1292,21 @@ async def admin_reset_user(interaction: discord.Interaction, utilisateur: discor
         await interaction.response.send_message("❌ Vous n'avez pas les permissions pour utiliser cette commande!", ephemeral=True)
         return
 
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-
-    # Supprimer l'utilisateur de la base de données
-    cursor.execute("DELETE FROM user_levels WHERE user_id = ?", (utilisateur.id,))
-    cursor.execute("DELETE FROM characters WHERE user_id = ?", (utilisateur.id,))
-
-    conn.commit()
-    conn.close()
-
-    # Supprimer tous les rôles d'ancienneté
-    old_roles = ["newcomer", "rising", "yapper", "go outside touch some grass"]
-    for role_name in old_roles:
-        role = discord.utils.get(interaction.guild.roles, name=role_name)
-        if role and role in utilisateur.roles:
-            try:
-                await utilisateur.remove_roles(role)
-            except discord.Forbidden:
-                pass
+    # Supprimer l'utilisateur de la base de données (et les XP en attente d'écriture)
+    xp_buffer.forget(interaction.guild_id, utilisateur.id)
+    xp_cooldown.reset((interaction.guild_id, utilisateur.id))
+    leaderboard_cache.invalidate(interaction.guild_id)
+    await repo.reset_user(interaction.guild_id, utilisateur.id)
+    # Un classement chargé avant la suppression a pu relire la ligne
+    xp_buffer.ranking.discard(interaction.guild_id, utilisateur.id)
+    character_index.forget(interaction.guild_id, utilisateur.id)
+
+    # Supprimer tous les rôles d'ancienneté (une mise à jour encore en attente est abandonnée)
+    scheduler.cancel(('roles', interaction.guild_id, utilisateur.id))
+    try:
+        await remove_seniority_roles(utilisateur, interaction.guild)
+    except discord.Forbidden:
+        pass
 
     embed = discord.Embed(
         title="🔄 Utilisateur remis à zéro",
@@ -931,6 +1316,232 @@ async def admin_reset_user(interaction: discord.Interaction, utilisateur: discor
 
     await interaction.response.send_message(embed=embed)
 
+@bot.tree.command(name="admin_stats", description="[ADMIN] Résumé des performances du bot")
+@app_commands.guild_only()
+@metrics.timed("/admin_stats")
+async def admin_stats(interaction: discord.Interaction):
+    """Affiche un résumé des mesures : latences, requêtes SQL, montées de niveau, appels REST"""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Vous n'avez pas les permissions pour utiliser cette commande!", ephemeral=True)
+        return
+
+    uptime = int(datetime.now().timestamp() - metrics.started_at)
+    embed = discord.Embed(
+        title="📈 Statistiques du bot",
+        description=f"⏱️ En ligne depuis **{uptime // 3600} h {uptime % 3600 // 60} min**",
+        color=0x00d4ff
+    )
+
+    # Gestionnaires les plus coûteux (temps total cumulé)
+    handlers = sorted(metrics.handler_latency.items(), key=lambda item: item[1].sum, reverse=True)[:8]
+    handler_lines = [
+        f"`{name}` • {histogram.count} appels • moy. {histogram.sum / histogram.count * 1000:.2f} ms • p95 ≤ {histogram.quantile(0.95) * 1000:g} ms"
+        for name, histogram in handlers
+    ]
+    embed.add_field(name="⚡ Gestionnaires", value="\n".join(handler_lines) or "Aucune mesure", inline=False)
+
+    sql_lines = [
+        f"`{kind}` • {histogram.count} requêtes • moy. {histogram.sum / histogram.count * 1000:.2f} ms"
+        for kind, histogram in sorted(metrics.sql_latency.items())
+    ]
+    embed.add_field(name="🗄️ Base de données", value="\n".join(sql_lines) or "Aucune mesure", inline=False)
+
+    embed.add_field(name="🎉 Montées de niveau",
+                    value=f"**{metrics.level_ups_last_minute()}** sur la dernière minute • **{metrics.level_ups}** au total",
+                    inline=False)
+
+    routes = sorted(metrics.rest_requests.items(), key=lambda item: item[1], reverse=True)[:5]
+    rest_lines = [f"`{method} {route}` • {count}" for (method, route), count in routes]
+    embed.add_field(name=f"🌐 Appels REST Discord ({sum(metrics.rest_requests.values())})",
+                    value="\n".join(rest_lines) or "Aucun appel", inline=False)
+
+    embed.timestamp = datetime.now()
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="admin_sync", description="[ADMIN] Forcer la synchronisation des commandes slash")
+@app_commands.guild_only()
+@metrics.timed("/admin_sync")
+async def admin_sync(interaction: discord.Interaction):
+    """Resynchronise les commandes slash même si leur empreinte n'a pas changé.
+
+    Seul le propriétaire du bot renvoie les commandes globales (tous les
+    serveurs) ; un administrateur ne synchronise que son propre serveur.
+    """
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Vous n'avez pas les permissions pour utiliser cette commande!", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    owner = await bot.is_owner(interaction.user)
+    try:
+        if owner:
+            synced = await sync_command_tree(force=True)
+        else:
+            # Copie locale des commandes globales, envoyée pour ce serveur uniquement puis retirée de l'arbre
+            bot.tree.copy_global_to(guild=interaction.guild)
+            try:
+                synced = await bot.tree.sync(guild=interaction.guild)
+            finally:
+                bot.tree.clear_commands(guild=interaction.guild)
+    except discord.HTTPException as e:
+        await interaction.followup.send(f"❌ Erreur lors de la synchronisation: {e}", ephemeral=True)
+        return
+    scope = "sur tous les serveurs" if owner else "sur ce serveur"
+    await interaction.followup.send(f"⚡ Synchronisé {len(synced)} slash command(s) {scope}", ephemeral=True)
+
+def report_backfill_failure(task):
+    """Journalise l'erreur qui a arrêté un import de l'historique"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Import de l'historique interrompu: {task.exception()}")
+
+@bot.tree.command(name="admin_historique", description="[ADMIN] Attribuer l'XP des messages envoyés avant l'arrivée du bot")
+@app_commands.guild_only()
+@app_commands.describe(action="Démarrer (ou reprendre) l'import, voir sa progression ou l'interrompre")
+@app_commands.choices(action=[
+    app_commands.Choice(name="▶️ Démarrer / reprendre", value="demarrer"),
+    app_commands.Choice(name="📊 Progression", value="progression"),
+    app_commands.Choice(name="⏹️ Interrompre", value="interrompre")
+])
+@metrics.timed("/admin_historique")
+async def admin_backfill(interaction: discord.Interaction, action: str):
+    """Import reprenable de l'historique des salons du serveur"""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Vous n'avez pas les permissions pour utiliser cette commande!", ephemeral=True)
+        return
+
+    job, task = backfill_jobs.get(interaction.guild_id, (None, None))
+    running = task is not None and not task.done()
+
+    if action == "demarrer":
+        if running:
+            await interaction.response.send_message("⏳ Un import est déjà en cours sur ce serveur.", ephemeral=True)
+            return
+        job = HistoryBackfill(interaction.guild, repo, xp_buffer, roll_message_exp, XP_COOLDOWN_SECONDS,
+                              concurrency=BACKFILL_CONCURRENCY, on_batch=leaderboard_cache.invalidate)
+        task = asyncio.create_task(job.run())
+        task.add_done_callback(report_backfill_failure)
+        backfill_jobs[interaction.guild_id] = (job, task)
+        await interaction.response.send_message(
+            "▶️ Import de l'historique lancé. Les salons déjà terminés sont ignorés et les autres reprennent "
+            "à leur dernier point de sauvegarde. Suivez-le avec `/admin_historique progression`.", ephemeral=True)
+        return
+
+    if job is None:
+        await interaction.response.send_message("ℹ️ Aucun import de l'historique depuis le démarrage du bot.", ephemeral=True)
+        return
+
+    if action == "interrompre":
+        if running:
+            task.cancel()
+        await interaction.response.send_message(
+            "⏹️ Import interrompu. La progression est sauvegardée : relancez-le pour reprendre.", ephemeral=True)
+        return
+
+    if running:
+        state = "⏳ En cours"
+    elif task.cancelled():
+        state = "⏹️ Interrompu"
+    elif task.exception() is not None or job.failed_channels:
+        state = "⚠️ Terminé avec des erreurs (relancez pour reprendre)"
+    else:
+        state = "✅ Terminé"
+    end = job.finished_at or datetime.now().timestamp()
+    embed = discord.Embed(title="📜 Import de l'historique", description=state, color=0x00d4ff)
+    embed.add_field(name="📁 Salons", value=f"**{job.channels_done}/{job.channels_total}** terminés", inline=True)
+    embed.add_field(name="📨 Messages", value=f"**{job.messages_read}** lus • **{job.messages_counted}** comptés", inline=True)
+    embed.add_field(name="⏱️ Durée", value=f"**{int(end - job.started_at)}** s", inline=True)
+    if job.failed_channels:
+        embed.add_field(name="⚠️ Salons en échec",
+                        value="\n".join(f"<#{channel_id}> • {error[:80]}" for channel_id, error in job.failed_channels[:10]),
+                        inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="admin_roles", description="[ADMIN] Corriger les rôles d'ancienneté de tous les membres")
+@app_commands.guild_only()
+@app_commands.describe(action="Démarrer (ou reprendre) la correction, voir sa progression ou l'interrompre")
+@app_commands.choices(action=[
+    app_commands.Choice(name="▶️ Démarrer / reprendre", value="demarrer"),
+    app_commands.Choice(name="📊 Progression", value="progression"),
+    app_commands.Choice(name="⏹️ Interrompre", value="interrompre")
+])
+@metrics.timed("/admin_roles")
+async def admin_roles(interaction: discord.Interaction, action: str):
+    """Réconciliation reprenable des rôles d'ancienneté du serveur"""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Vous n'avez pas les permissions pour utiliser cette commande!", ephemeral=True)
+        return
+
+    job, task = role_sweep_jobs.get(interaction.guild_id, (None, None))
+    running = task is not None and not task.done()
+
+    if action == "demarrer":
+        if running:
+            await interaction.response.send_message("⏳ Une correction des rôles est déjà en cours sur ce serveur.", ephemeral=True)
+            return
+        start_role_sweep(interaction.guild)
+        await interaction.response.send_message(
+            "▶️ Correction des rôles d'ancienneté lancée. Une correction interrompue reprend au dernier membre "
+            "vérifié. Suivez-la avec `/admin_roles progression`.", ephemeral=True)
+        return
+
+    if job is None:
+        await interaction.response.send_message("ℹ️ Aucune correction des rôles depuis le démarrage du bot.", ephemeral=True)
+        return
+
+    if action == "interrompre":
+        if running:
+            task.cancel()
+        await interaction.response.send_message(
+            "⏹️ Correction interrompue. La progression est sauvegardée : relancez-la pour reprendre.", ephemeral=True)
+        return
+
+    if running:
+        state = "⏳ En cours"
+    elif task.cancelled():
+        state = "⏹️ Interrompue"
+    elif task.exception() is not None:
+        state = f"⚠️ Arrêtée : {task.exception()}"
+    elif job.failed:
+        state = "⚠️ Terminée avec des erreurs (relancez pour corriger les membres restants)"
+    else:
+        state = "✅ Terminée"
+    end = job.finished_at or datetime.now().timestamp()
+    embed = discord.Embed(title="🎭 Correction des rôles d'ancienneté", description=state, color=0x00d4ff)
+    embed.add_field(name="👥 Membres", value=f"**{job.checked}/{job.members_total}** vérifiés", inline=True)
+    embed.add_field(name="🔧 Corrections", value=f"**{job.changed}** planifiées • **{job.failed}** en échec", inline=True)
+    embed.add_field(name="⏱️ Durée", value=f"**{int(end - job.started_at)}** s", inline=True)
+    if job.resumed:
+        embed.set_footer(text="Reprise d'une correction interrompue")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def main():
+    """Lance le bot puis écrit les XP en attente et ferme la connexion à la base"""
+    discord.utils.setup_logging()
+
+    # SIGTERM (arrêt d'un service) ferme le bot proprement, comme Ctrl+C
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    except (NotImplementedError, AttributeError):
+        pass  # Windows : pas de gestionnaire de signaux dans la boucle
+
+    try:
+        async with bot:
+            await bot.start(TOKEN)
+    finally:
+        announcer.stop()
+        if startup_sweep is not None:
+            startup_sweep.cancel()
+        for _, task in role_sweep_jobs.values():
+            task.cancel()
+        await scheduler.stop()
+        if maintenance is not None:
+            await maintenance.stop()
+        if repo.is_open:
+            await xp_buffer.stop()
+            await repo.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
 if __name__ == "__main__":
     # Vérification du token
     if TOKEN == "VOTRE_TOKEN_ICI":
@@ -942,4 +1553,7 @@ if __name__ == "__main__":
         print("4. Copiez le token et remplacez 'VOTRE_TOKEN_ICI' dans le code")
     else:
         print("🚀 Démarrage du bot...")
-        bot.run(TOKEN)
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,93 @@
+"""Index en mémoire des noms de personnages, pour l'autocomplétion.
+
+Pour chaque membre (guild_id, user_id), les noms de ses personnages sont
+gardés triés par forme normalisée (casefold) : une suggestion est une
+recherche dichotomique du préfixe tapé, sans requête SQL. La liste d'un membre
+est chargée depuis la base à sa première frappe, tenue à jour lors des
+créations et suppressions, et les membres inactifs sont évincés (LRU) au-delà
+de `max_users`.
+"""
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+# Limite imposée par Discord sur le nombre de suggestions
+MAX_SUGGESTIONS = 25
+
+
+class CharacterNameIndex:
+    """Noms de personnages par membre, triés pour la recherche par préfixe"""
+
+    def __init__(self, repo, max_users=10000):
+        self.repo = repo
+        self.max_users = max_users
+        self._names = OrderedDict()
+        # Chargements en cours : True si une création/suppression est survenue entre-temps
+        self._loading = {}
+
+    async def suggest(self, guild_id, user_id, prefix, limit=MAX_SUGGESTIONS):
+        """Noms du membre commençant par `prefix` (sans tenir compte de la casse)"""
+        names = await self._get(guild_id, user_id)
+        folded = prefix.casefold()
+        start = bisect_left(names, (folded, ''))
+        suggestions = []
+        for key, name in names[start:]:
+            if not key.startswith(folded) or len(suggestions) >= limit:
+                break
+            suggestions.append(name)
+        return suggestions
+
+    def add(self, guild_id, user_id, name):
+        """Enregistre un personnage créé (sans effet si le membre n'est pas chargé)"""
+        key = (guild_id, user_id)
+        names = self._names.get(key)
+        if names is not None:
+            insort(names, (name.casefold(), name))
+        elif key in self._loading:
+            self._loading[key] = True
+
+    def remove(self, guild_id, user_id, name):
+        """Retire un personnage supprimé"""
+        key = (guild_id, user_id)
+        names = self._names.get(key)
+        if names is not None:
+            entry = (name.casefold(), name)
+            index = bisect_left(names, entry)
+            if index < len(names) and names[index] == entry:
+                del names[index]
+        elif key in self._loading:
+            self._loading[key] = True
+
+    def forget(self, guild_id, user_id):
+        """Oublie un membre (il sera rechargé à sa prochaine frappe)"""
+        key = (guild_id, user_id)
+        self._names.pop(key, None)
+        if key in self._loading:
+            self._loading[key] = True
+
+    async def _get(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        names = self._names.get(key)
+        if names is not None:
+            self._names.move_to_end(key)
+            return names
+
+        if key in self._loading:
+            # Chargement déjà en cours pour ce membre : simple lecture, sans mise en cache
+            return await self._load(guild_id, user_id)
+
+        self._loading[key] = False
+        try:
+            names = await self._load(guild_id, user_id)
+            # Une écriture pendant la lecture peut la rendre périmée : on ne la garde pas
+            stale = self._loading[key]
+        finally:
+            del self._loading[key]
+        if not stale:
+            self._names[key] = names
+            if len(self._names) > self.max_users:
+                self._names.popitem(last=False)
+        return names
+
+    async def _load(self, guild_id, user_id):
+        return sorted((name.casefold(), name) for name in await self.repo.list_character_names(guild_id, user_id))
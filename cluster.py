@@ -0,0 +1,117 @@
+"""Lancement du bot sur plusieurs processus (un groupe de shards par processus).
+
+Un seul processus Python plafonne à un cœur pour le décodage de la gateway et
+les gestionnaires. Ce lanceur répartit les shards entre `SHARD_PROCESSES`
+processus, chacun exécutant le bot complet sur ses shards (les serveurs d'un
+shard n'appartiennent qu'à un processus : caches et XP en mémoire restent
+cohérents). Toutes les écritures passent par un processus d'écriture unique
+(db_writer.py) ; chaque processus lit la base directement.
+
+    SHARD_PROCESSES=4 SHARD_COUNT=16 python cluster.py
+
+SHARD_COUNT vaut "auto" ou un nombre ; "auto" (ou vide) demande à Discord le
+nombre de shards recommandé. Seul le processus du shard 0 synchronise les
+commandes slash ; si METRICS_PORT est défini, le processus n utilise le port
+METRICS_PORT + n.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+
+import discord
+
+from database import Database
+from db_writer import WriterChannel, attach, serve
+from migrations import run_migrations
+
+TOKEN = os.environ.get('DISCORD_TOKEN')
+DB_PATH = os.environ.get('BOT_DATABASE_PATH', 'bot_database.db')
+SHARD_PROCESSES = int(os.environ.get('SHARD_PROCESSES', str(os.cpu_count() or 1)))
+SHARD_COUNT = os.environ.get('SHARD_COUNT', 'auto')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+LEGACY_GUILD_ID = int(os.environ.get('LEGACY_GUILD_ID', '0'))
+
+
+async def recommended_shard_count():
+    """Nombre de shards conseillé par Discord pour ce bot"""
+    client = discord.Client(intents=discord.Intents.none())
+    try:
+        await client.login(TOKEN)
+        shards, _, _ = await client.http.get_bot_gateway()
+    finally:
+        await client.close()
+    return shards
+
+
+async def migrate():
+    """Le schéma est mis à jour une fois, avant le démarrage des processus"""
+    db = Database(DB_PATH)
+    await db.connect()
+    try:
+        await run_migrations(db, legacy_guild_id=LEGACY_GUILD_ID)
+    finally:
+        await db.close()
+
+
+def run_worker(worker_id, shard_ids, shard_count, requests, replies):
+    """Processus de shards : le bot complet, avec les écritures confiées à l'écrivain"""
+    os.environ['SHARD_COUNT'] = str(shard_count)
+    os.environ['SHARD_IDS'] = ','.join(map(str, shard_ids))
+    if METRICS_PORT:
+        os.environ['METRICS_PORT'] = str(METRICS_PORT + worker_id)
+    attach(WriterChannel(requests, replies, worker_id))
+
+    import bot_discord_roleplay_complet as bot_module
+    try:
+        asyncio.run(bot_module.main())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    if not TOKEN:
+        sys.exit("❌ DISCORD_TOKEN n'est pas défini")
+    if os.environ.get('STORAGE_BACKEND', 'sqlite') != 'sqlite':
+        sys.exit("❌ cluster.py nécessite STORAGE_BACKEND=sqlite (les processus partagent la base)")
+
+    asyncio.run(migrate())
+    shard_count = int(SHARD_COUNT) if SHARD_COUNT not in ('', 'auto') else asyncio.run(recommended_shard_count())
+    processes = max(1, min(SHARD_PROCESSES, shard_count))
+    groups = [list(range(shard_count))[index::processes] for index in range(processes)]
+
+    context = multiprocessing.get_context('spawn')
+    requests = context.Queue()
+    replies = [context.Queue() for _ in groups]
+    writer = context.Process(target=serve, args=(DB_PATH, requests, replies), name="db-writer")
+    writer.start()
+
+    workers = [context.Process(target=run_worker, args=(index, shard_ids, shard_count, requests, replies[index]),
+                               name=f"shards-{index}")
+               for index, shard_ids in enumerate(groups)]
+    print(f"🚀 {shard_count} shard(s) répartis sur {len(workers)} processus")
+    for worker in workers:
+        worker.start()
+
+    # SIGTERM (arrêt du service) est relayé aux shards, qui s'arrêtent proprement
+    signal.signal(signal.SIGTERM, lambda *_: [worker.terminate() for worker in workers if worker.is_alive()])
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Les processus de shards reçoivent aussi Ctrl+C et écrivent leurs XP avant de s'arrêter
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        requests.put(None)
+        writer.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Limiteur d'XP en mémoire : au plus un gain d'XP par membre et par fenêtre.
+
+Le dernier gain de chaque (serveur, membre) est gardé dans un dictionnaire
+ordonné par ancienneté. Un message reçu pendant la fenêtre ne coûte qu'une
+recherche dans ce dictionnaire et n'atteint jamais la base de données. La
+taille est bornée : les entrées expirées sont purgées en tête, et au-delà de
+`max_size` les plus anciennes sont évincées (au pire, un membre évincé gagne
+de l'XP un peu plus tôt que prévu).
+"""
+
+import time
+from collections import OrderedDict
+
+
+class XPCooldown:
+    """Fenêtre de temps minimale entre deux gains d'XP d'un même membre"""
+
+    def __init__(self, seconds, max_size=50000, clock=time.monotonic):
+        self.seconds = seconds
+        self.max_size = max_size
+        self._clock = clock
+        self._last = OrderedDict()
+
+    def try_acquire(self, key):
+        """Retourne True (et démarre une fenêtre) si le membre peut gagner de l'XP"""
+        if self.seconds <= 0:
+            return True
+
+        now = self._clock()
+        last = self._last.get(key)
+        if last is not None and now - last < self.seconds:
+            return False
+
+        self._last[key] = now
+        self._last.move_to_end(key)
+        self._prune(now)
+        return True
+
+    def reset(self, key):
+        """Oublie la fenêtre d'un membre (remise à zéro)"""
+        self._last.pop(key, None)
+
+    def _prune(self, now):
+        # Les entrées sont triées par dernier gain : on purge depuis la tête
+        while self._last:
+            key, last = next(iter(self._last.items()))
+            if now - last < self.seconds and len(self._last) <= self.max_size:
+                break
+            del self._last[key]
@@ -0,0 +1,323 @@
+"""Export et import en masse des niveaux et des personnages.
+
+Export en flux (JSONL ou CSV) : les lignes sont lues par paquets sur le
+curseur SQLite et écrites au fil de l'eau, la mémoire reste constante quelle
+que soit la taille des tables. Import par paquets de `--chunk` lignes, chacun
+écrit par un seul `executemany` dans sa propre transaction.
+
+L'import de classements d'autres bots (MEE6 et exports similaires : JSON,
+JSONL ou CSV) convertit l'XP totale de chaque membre en niveau et XP
+restante selon la courbe d'ancienneté du bot.
+
+Exemples :
+    python data_io.py export user_levels --format csv --output niveaux.csv
+    python data_io.py export characters --output personnages.jsonl --guild 123456789
+    python data_io.py import user_levels niveaux.csv
+    python data_io.py import-leaderboard mee6.json --guild 123456789
+
+Arrêtez le bot avant un import : les XP qu'il garde en mémoire écraseraient
+les valeurs importées lors de sa prochaine écriture.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from database import Database
+from migrations import run_migrations
+from repository import STATS, USER_COLUMNS
+from thresholds import LEVEL_THRESHOLDS
+
+TABLES = {
+    'user_levels': {
+        'columns': USER_COLUMNS,
+        'key': ('guild_id', 'user_id'),
+    },
+    'characters': {
+        'columns': ('guild_id', 'user_id', 'character_name', 'specialty', *STATS, 'reputation',
+                    *(f"{stat}_exp" for stat in STATS), 'created_at'),
+        'key': ('guild_id', 'character_name'),
+    },
+}
+
+# Noms de champs acceptés dans les classements d'autres bots (le premier présent l'emporte)
+LEADERBOARD_FIELDS = {
+    'user_id': ('user_id', 'id', 'userId', 'userID', 'member_id'),
+    'username': ('username', 'name', 'display_name', 'tag'),
+    'xp': ('xp', 'total_xp', 'totalXp', 'exp', 'experience'),
+    'messages': ('message_count', 'messages', 'total_messages', 'messageCount'),
+}
+
+
+def detect_format(path, requested):
+    if requested:
+        return requested
+    extension = os.path.splitext(path)[1].lower()
+    return {'.csv': 'csv', '.json': 'json'}.get(extension, 'jsonl')
+
+
+def open_output(path):
+    if path in (None, '-'):
+        return sys.stdout
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    return open(path, encoding='utf-8', newline='')
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+async def _migrate(path):
+    db = Database(path)
+    await db.connect()
+    try:
+        await run_migrations(db)
+    finally:
+        await db.close()
+
+
+def connect(path):
+    """Connexion synchrone après application des migrations (même schéma que le bot)"""
+    asyncio.run(_migrate(path))
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Index du classement et clés primaires mis à jour en mémoire pendant les gros imports
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+# --- Export ---
+
+def export_table(conn, table, fmt, output, guild_id=None, batch_size=5000):
+    """Écrit toutes les lignes de `table` dans `output` ; retourne le nombre de lignes"""
+    columns = TABLES[table]['columns']
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    params = ()
+    if guild_id is not None:
+        sql += " WHERE guild_id = ?"
+        params = (guild_id,)
+
+    cursor = conn.execute(sql, params)
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(columns)
+    while rows := cursor.fetchmany(batch_size):
+        if fmt == 'csv':
+            writer.writerows(rows)
+        else:
+            output.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+        count += len(rows)
+    return count
+
+
+# --- Import ---
+
+class deferred_indexes:
+    """Supprime les index secondaires d'une table pendant un gros import puis les reconstruit.
+
+    Construire un index en une fois (tri) coûte bien moins cher que de le
+    maintenir ligne par ligne ; les index sont recréés à l'identique depuis
+    sqlite_master, même si l'import échoue.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        self.definitions = []
+
+    def __enter__(self):
+        self.definitions = self.conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (self.table,)).fetchall()
+        for name, _ in self.definitions:
+            self.conn.execute(f"DROP INDEX {name}")
+        return self
+
+    def __exit__(self, *exc_info):
+        for _, sql in self.definitions:
+            self.conn.execute(sql)
+        return False
+
+
+def read_records(source, fmt):
+    """Itère sur les enregistrements (dictionnaires) d'un fichier JSONL, CSV ou JSON"""
+    if fmt == 'csv':
+        for record in csv.DictReader(source):
+            # Une cellule vide correspond à NULL
+            yield {key: (None if value == '' else value) for key, value in record.items()}
+    elif fmt == 'json':
+        # Un document JSON n'est pas lisible en flux : réservé aux exports de taille raisonnable
+        data = json.load(source)
+        if isinstance(data, dict):
+            data = next((data[key] for key in ('players', 'leaderboard', 'users', 'members', 'data')
+                         if isinstance(data.get(key), list)), [])
+        yield from data
+    else:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_rows(conn, table, columns, rows, replace=False, chunk_size=50000):
+    """Insère `rows` (tuples dans l'ordre de `columns`) par paquets ; retourne le nombre de lignes lues"""
+    key = TABLES[table]['key']
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in key)
+    if replace and updates:
+        conflict = f"ON CONFLICT({', '.join(key)}) DO UPDATE SET {updates}"
+    else:
+        conflict = f"ON CONFLICT({', '.join(key)}) DO NOTHING"
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+           f"{conflict}")
+
+    count = 0
+    for chunk in chunks(rows, chunk_size):
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(sql, chunk)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        count += len(chunk)
+    return count
+
+
+def import_table(conn, table, records, replace=False, chunk_size=50000):
+    """Importe des enregistrements exportés par ce module ; retourne le nombre de lignes lues.
+
+    Seules les colonnes présentes dans le premier enregistrement sont écrites,
+    les autres gardent leur valeur par défaut.
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return 0
+    columns = tuple(column for column in TABLES[table]['columns'] if column in first)
+    missing = [column for column in TABLES[table]['key'] if column not in columns]
+    if missing:
+        raise SystemExit(f"❌ Colonne(s) obligatoire(s) absente(s) : {', '.join(missing)}")
+
+    def rows():
+        yield tuple(first[column] for column in columns)
+        for record in records:
+            yield tuple(record.get(column) for column in columns)
+
+    return import_rows(conn, table, columns, rows(), replace, chunk_size)
+
+
+def _resolve_fields(record):
+    """Nom réel de chaque champ connu dans ce classement (d'après un enregistrement)"""
+    return {name: next((candidate for candidate in candidates if candidate in record), None)
+            for name, candidates in LEADERBOARD_FIELDS.items()}
+
+
+def leaderboard_rows(records, guild_id, xp_scale=1.0):
+    """Classement d'un autre bot → lignes de user_levels (niveau recalculé depuis l'XP totale)"""
+    fields = None
+    for record in records:
+        if fields is None:
+            # Les champs sont cherchés une fois : toutes les lignes d'un export ont la même forme
+            fields = _resolve_fields(record)
+            if fields['user_id'] is None:
+                raise SystemExit(f"❌ Identifiant de membre introuvable (champs acceptés : "
+                                 f"{', '.join(LEADERBOARD_FIELDS['user_id'])})")
+            user_key, name_key, xp_key, messages_key = (fields['user_id'], fields['username'],
+                                                        fields['xp'], fields['messages'])
+        user_id = record.get(user_key)
+        if user_id in (None, ''):
+            continue
+        total = int(float(record.get(xp_key) or 0) * xp_scale)
+        level, exp = LEVEL_THRESHOLDS.level_for_total(max(total, 0))
+        yield (guild_id, int(user_id), record.get(name_key), level, exp,
+               int(record.get(messages_key) or 0), 0)
+
+
+# --- Ligne de commande ---
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export et import en masse des données du bot")
+    parser.add_argument('--db', default=os.environ.get('BOT_DATABASE_PATH', 'bot_database.db'),
+                        help="base SQLite du bot")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="exporter une table en JSONL ou CSV")
+    export.add_argument('table', choices=TABLES)
+    export.add_argument('--output', default='-', help="fichier de sortie (- = sortie standard)")
+    export.add_argument('--format', choices=('jsonl', 'csv'), help="par défaut : d'après l'extension")
+    export.add_argument('--guild', type=int, help="n'exporter qu'un serveur")
+
+    load = commands.add_parser('import', help="importer un export JSONL ou CSV de ce bot")
+    load.add_argument('table', choices=TABLES)
+    load.add_argument('input', help="fichier à importer (- = entrée standard)")
+    load.add_argument('--format', choices=('jsonl', 'csv'))
+    load.add_argument('--replace', action='store_true',
+                      help="remplacer les lignes existantes (par défaut : elles sont conservées)")
+    load.add_argument('--chunk', type=int, default=50000, help="lignes par transaction")
+    load.add_argument('--rebuild-indexes', action='store_true',
+                      help="reconstruire les index après l'import (plus rapide pour des millions de lignes)")
+
+    leaderboard = commands.add_parser('import-leaderboard',
+                                      help="importer le classement d'un autre bot (MEE6...)")
+    leaderboard.add_argument('input', help="fichier JSON, JSONL ou CSV (- = entrée standard)")
+    leaderboard.add_argument('--guild', type=int, required=True, help="serveur auquel rattacher les membres")
+    leaderboard.add_argument('--format', choices=('json', 'jsonl', 'csv'))
+    leaderboard.add_argument('--xp-scale', type=float, default=1.0,
+                             help="facteur appliqué à l'XP importée avant conversion en niveau")
+    leaderboard.add_argument('--replace', action='store_true',
+                             help="écraser les profils existants (par défaut : ils sont conservés)")
+    leaderboard.add_argument('--chunk', type=int, default=50000, help="lignes par transaction")
+    leaderboard.add_argument('--rebuild-indexes', action='store_true',
+                             help="reconstruire les index après l'import (plus rapide pour des millions de lignes)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conn = connect(args.db)
+    start = time.perf_counter()
+    try:
+        if args.command == 'export':
+            fmt = detect_format(args.output, args.format)
+            output = open_output(args.output)
+            try:
+                count = export_table(conn, args.table, fmt, output, args.guild)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            action = "exportées"
+        else:
+            table = 'user_levels' if args.command == 'import-leaderboard' else args.table
+            with open_input(args.input) as source, \
+                    (deferred_indexes(conn, table) if args.rebuild_indexes else nullcontext()):
+                records = read_records(source, detect_format(args.input, args.format))
+                if args.command == 'import':
+                    count = import_table(conn, table, records, args.replace, args.chunk)
+                else:
+                    count = import_rows(conn, table, USER_COLUMNS,
+                                        leaderboard_rows(records, args.guild, args.xp_scale),
+                                        args.replace, args.chunk)
+            action = "importées"
+    finally:
+        conn.close()
+    print(f"✅ {count} ligne(s) {action} en {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Couche d'accès asynchrone à la base de données SQLite du bot.
+
+Une seule connexion aiosqlite est ouverte au démarrage et partagée par tous
+les gestionnaires d'événements et de commandes. Les requêtes s'exécutent dans
+le thread dédié d'aiosqlite : aucune entrée/sortie disque ne bloque la boucle
+d'événements (et donc le heartbeat de la gateway Discord).
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+
+class Database:
+    """Connexion SQLite unique et partagée, en mode WAL."""
+
+    def __init__(self, path, on_query=None):
+        self.path = path
+        # Rappel optionnel on_query(type, durée en secondes) après chaque requête
+        self.on_query = on_query
+        self._conn = None
+        # Une seule connexion : les écritures sont sérialisées pour qu'un
+        # commit ne valide jamais la transaction à moitié faite d'un autre
+        # gestionnaire.
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self._conn is not None
+
+    async def connect(self):
+        """Ouvre la connexion (sans effet si elle est déjà ouverte)"""
+        if self._conn is not None:
+            return
+        # cached_statements : les requêtes paramétrées sont préparées une
+        # seule fois puis réutilisées depuis le cache de sqlite3.
+        self._conn = await aiosqlite.connect(self.path, cached_statements=256)
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    async def close(self):
+        """Ferme la connexion partagée"""
+        if self._conn is None:
+            return
+        await self._conn.close()
+        self._conn = None
+
+    def _observe(self, kind, start):
+        if self.on_query is not None:
+            self.on_query(kind, time.perf_counter() - start)
+
+    async def fetchone(self, sql, params=()):
+        start = time.perf_counter()
+        async with self._conn.execute(sql, params) as cursor:
+            row = await cursor.fetchone()
+        self._observe('read', start)
+        return row
+
+    async def fetchall(self, sql, params=()):
+        start = time.perf_counter()
+        async with self._conn.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        self._observe('read', start)
+        return rows
+
+    async def execute(self, sql, params=()):
+        """Exécute une écriture et la valide ; retourne le curseur"""
+        async with self._write_lock:
+            start = time.perf_counter()
+            try:
+                cursor = await self._conn.execute(sql, params)
+            except BaseException:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+            self._observe('write', start)
+            return cursor
+
+    async def executemany(self, sql, seq_of_params):
+        """Exécute une écriture par lot dans une seule transaction"""
+        async with self._write_lock:
+            start = time.perf_counter()
+            try:
+                cursor = await self._conn.executemany(sql, seq_of_params)
+            except BaseException:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+            self._observe('batch', start)
+            return cursor
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Regroupe plusieurs écritures dans une seule transaction.
+
+        Le bloc reçoit la connexion aiosqlite ; la transaction est validée en
+        sortie normale et annulée si une exception est levée.
+        """
+        async with self._write_lock:
+            start = time.perf_counter()
+            # BEGIN explicite : sqlite3 n'ouvre pas de transaction avant un CREATE/DROP
+            if not self._conn.in_transaction:
+                await self._conn.execute("BEGIN")
+            try:
+                yield self._conn
+            except BaseException:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+            self._observe('transaction', start)
@@ -0,0 +1,255 @@
+"""Processus d'écriture unique pour le mode multi-processus (cluster.py).
+
+SQLite n'accepte qu'un écrivain à la fois : plutôt que de laisser les
+processus de shards se disputer le verrou de la base, toutes leurs écritures
+sont envoyées par une file IPC à un processus dédié. Celui-ci regroupe les
+demandes en attente dans une seule transaction (un SAVEPOINT par demande :
+l'échec de l'une n'annule pas les autres), puis répond à chaque processus
+après le COMMIT.
+
+Côté shards, RemoteWriteDatabase garde l'interface de Database : les lectures
+passent par une connexion locale en lecture seule (instantanés WAL, sans
+attendre l'écrivain) et chaque écriture attend l'accusé de réception du
+processus d'écriture. Une lecture faite après cet accusé voit donc toujours
+l'écriture.
+
+Le processus d'écriture ignore SIGINT et SIGTERM (adressés à tout le groupe
+de processus lors d'un arrêt) : il ne s'arrête que sur demande de cluster.py,
+une fois que les shards ont écrit leurs dernières XP, ou si cluster.py a
+disparu (tué par SIGKILL). Une erreur SQLite (base verrouillée par un import
+ou par le client sqlite3...) est renvoyée aux demandes concernées sans
+arrêter le processus. Il exécute aussi
+l'entretien de la base (maintenance.py), pour rester le seul écrivain.
+"""
+
+import asyncio
+import itertools
+import os
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from database import Database
+
+# Demandes regroupées au plus dans une même transaction
+MAX_BATCH = 256
+
+# Délai maximal d'attente d'un accusé de réception (processus d'écriture arrêté ou bloqué)
+WRITE_TIMEOUT = 60.0
+
+# Secondes entre deux vérifications que cluster.py tourne toujours (file des demandes vide)
+PARENT_CHECK_INTERVAL = 1.0
+
+# Canal du processus courant vers l'écrivain (None hors mode multi-processus)
+_channel = None
+
+
+class WriterChannel:
+    """Files IPC d'un processus de shards : demandes partagées, réponses propres au processus"""
+
+    def __init__(self, requests, replies, worker_id):
+        self.requests = requests
+        self.replies = replies
+        self.worker_id = worker_id
+
+
+def attach(channel):
+    """Déclare le canal d'écriture du processus, avant l'import du bot"""
+    global _channel
+    _channel = channel
+
+
+def writer_channel():
+    return _channel
+
+
+# --- Processus d'écriture ---
+
+def serve(path, requests, replies, max_batch=MAX_BATCH):
+    """Boucle du processus d'écriture ; s'arrête en recevant None"""
+    # Ctrl+C ou l'arrêt du service atteignent tout le groupe de processus : l'écrivain attend
+    # que les shards aient tout écrit (cluster.py envoie None après leur arrêt)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Échantillonnage d'ANALYZE lors de l'entretien
+    conn.execute("PRAGMA analysis_limit = 1000")
+    parent = os.getppid()
+
+    batches = 0
+    written = 0
+    running = True
+    while running:
+        try:
+            batch = [requests.get(timeout=PARENT_CHECK_INTERVAL)]
+        except queue.Empty:
+            # Processus rattaché à init : cluster.py a été tué sans pouvoir demander l'arrêt
+            if os.getppid() != parent:
+                print("⚠️ cluster.py a disparu : arrêt du processus d'écriture")
+                break
+            continue
+        while len(batch) < max_batch:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        if None in batch:
+            running = False
+            batch = [request for request in batch if request is not None]
+        # Scripts (entretien) : exécutés hors de la transaction du lot, qu'executescript validerait
+        scripts = [request for request in batch if isinstance(request[2], str)]
+        batch = [request for request in batch if not isinstance(request[2], str)]
+        if not batch and not scripts:
+            continue
+
+        results = _apply(conn, batch) if batch else []
+        for (worker_id, request_id, _), error in zip(batch, results):
+            replies[worker_id].put((request_id, error))
+        for worker_id, request_id, script in scripts:
+            replies[worker_id].put((request_id, _run_script(conn, script)))
+        batches += 1
+        written += len(batch) + len(scripts)
+
+    conn.close()
+    print(f"💾 Processus d'écriture arrêté ({written} écriture(s) en {batches} transaction(s))")
+
+
+def _apply(conn, batch):
+    """Exécute les demandes dans une transaction ; retourne l'erreur de chacune (ou None)"""
+    results = []
+    try:
+        # Base verrouillée par un autre programme au-delà du délai d'attente : le lot échoue
+        conn.execute("BEGIN IMMEDIATE")
+        for _, _, statements in batch:
+            conn.execute("SAVEPOINT request")
+            try:
+                for sql, params, many in statements:
+                    if many:
+                        conn.executemany(sql, params)
+                    else:
+                        conn.execute(sql, params)
+            except Exception as e:
+                conn.execute("ROLLBACK TO request")
+                results.append((type(e).__name__, str(e)))
+            else:
+                results.append(None)
+            conn.execute("RELEASE request")
+        conn.execute("COMMIT")
+    except Exception as e:
+        # Échec du BEGIN, d'un ROLLBACK TO ou du COMMIT (disque plein...) : aucune demande du lot n'est écrite
+        if conn.in_transaction:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+        results = [(type(e).__name__, str(e))] * len(batch)
+    return results
+
+
+def _run_script(conn, script):
+    """Exécute un script SQL en autocommit ; retourne son erreur (ou None)"""
+    try:
+        conn.executescript(script)
+    except Exception as e:
+        return (type(e).__name__, str(e))
+    return None
+
+
+# --- Processus de shards ---
+
+class RemoteWriteDatabase(Database):
+    """Database dont les écritures sont exécutées par le processus d'écriture"""
+
+    def __init__(self, path, channel, on_query=None, timeout=WRITE_TIMEOUT):
+        super().__init__(path, on_query=on_query)
+        self.channel = channel
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._pending = {}
+        self._loop = None
+        self._reader = None
+
+    async def connect(self):
+        if self._conn is not None:
+            return
+        await super().connect()
+        # Connexion locale réservée aux lectures
+        await self._conn.execute("PRAGMA query_only = ON")
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(target=self._read_replies, name="db-writer-replies", daemon=True)
+        self._reader.start()
+
+    async def close(self):
+        if self._reader is not None:
+            self.channel.replies.put(None)
+            await asyncio.to_thread(self._reader.join)
+            self._reader = None
+        await super().close()
+
+    def _read_replies(self):
+        while (reply := self.channel.replies.get()) is not None:
+            self._loop.call_soon_threadsafe(self._resolve, *reply)
+
+    def _resolve(self, request_id, error):
+        future = self._pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            name, message = error
+            future.set_exception(getattr(sqlite3, name, sqlite3.DatabaseError)(message))
+
+    async def _submit(self, kind, statements):
+        start = time.perf_counter()
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        self.channel.requests.put((self.channel.worker_id, request_id, statements))
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            raise sqlite3.OperationalError(
+                f"le processus d'écriture n'a pas répondu en {self.timeout:.0f} s") from None
+        self._observe(kind, start)
+
+    async def execute(self, sql, params=()):
+        """Envoie une écriture et attend qu'elle soit validée (pas de curseur en retour)"""
+        await self._submit('write', [(sql, tuple(params), False)])
+
+    async def executemany(self, sql, seq_of_params):
+        await self._submit('batch', [(sql, [tuple(params) for params in seq_of_params], True)])
+
+    async def executescript(self, script):
+        """Script exécuté hors transaction par l'écrivain (pragmas d'entretien)"""
+        await self._submit('script', script)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Les écritures du bloc sont envoyées ensemble en sortie et appliquées atomiquement.
+
+        Le bloc ne peut qu'écrire : une lecture n'y verrait pas encore ses écritures.
+        """
+        batch = _StatementBatch()
+        yield batch
+        if batch.statements:
+            await self._submit('transaction', batch.statements)
+
+
+class _StatementBatch:
+    """Remplace la connexion aiosqlite dans RemoteWriteDatabase.transaction()"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, sql, params=()):
+        self.statements.append((sql, tuple(params), False))
+
+    async def executemany(self, sql, seq_of_params):
+        self.statements.append((sql, [tuple(params) for params in seq_of_params], True))
@@ -0,0 +1,59 @@
+"""Cache par serveur du classement déjà mis en forme.
+
+Le rendu du top N est gardé en mémoire pendant `ttl` secondes. Il n'est
+invalidé avant l'échéance que lorsqu'une montée de niveau touche réellement le
+classement affiché : un membre déjà présent dans le top N, ou un membre dont le
+nouveau score atteint celui du dernier du top N.
+"""
+
+import time
+
+
+class _CachedBoard:
+    __slots__ = ('rendered', 'members', 'floor', 'full', 'expires_at')
+
+    def __init__(self, rendered, members, floor, full, expires_at):
+        self.rendered = rendered
+        self.members = members
+        self.floor = floor
+        self.full = full
+        self.expires_at = expires_at
+
+
+class LeaderboardCache:
+    """Rendus du classement par serveur, avec durée de vie et invalidation ciblée"""
+
+    def __init__(self, size=15, ttl=60.0, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self._clock = clock
+        self._boards = {}
+
+    def get(self, guild_id):
+        """Retourne le rendu en cache d'un serveur, ou None s'il est absent ou expiré"""
+        board = self._boards.get(guild_id)
+        if board is None:
+            return None
+        if self._clock() >= board.expires_at:
+            del self._boards[guild_id]
+            return None
+        return board.rendered
+
+    def store(self, guild_id, rendered, entries):
+        """Met en cache un rendu ; `entries` liste les (user_id, level, exp) affichés"""
+        members = {user_id for user_id, _, _ in entries}
+        floor = min(((level, exp) for _, level, exp in entries), default=(0, 0))
+        self._boards[guild_id] = _CachedBoard(rendered, members, floor, len(entries) >= self.size,
+                                              self._clock() + self.ttl)
+
+    def on_level_change(self, guild_id, user_id, level, exp):
+        """Invalide le rendu si cette montée de niveau modifie le top N affiché"""
+        board = self._boards.get(guild_id)
+        if board is None:
+            return
+        if user_id in board.members or not board.full or (level, exp) >= board.floor:
+            del self._boards[guild_id]
+
+    def invalidate(self, guild_id):
+        """Oublie le rendu d'un serveur"""
+        self._boards.pop(guild_id, None)
@@ -0,0 +1,260 @@
+"""Sauvegardes à chaud et entretien périodique de la base SQLite.
+
+Tout le travail se fait dans un thread, sur une connexion SQLite distincte de
+celle du bot : la boucle d'événements n'est jamais bloquée et, en mode WAL,
+les lectures de la sauvegarde ne bloquent pas les écritures du bot.
+
+- Sauvegarde : API de sauvegarde en ligne de SQLite, par pas de
+  `backup_pages` pages (le verrou de lecture est relâché entre deux pas), vers
+  un fichier temporaire renommé une fois complet. Seules les `keep`
+  sauvegardes les plus récentes sont conservées.
+- Entretien : statistiques du planificateur (`PRAGMA optimize`) et
+  restitution au système des pages libérées par les suppressions
+  (`/admin_reset_user`, `/supprimer_personnage`) par `PRAGMA
+  incremental_vacuum`, par petites transactions pour ne retenir le verrou
+  d'écriture que brièvement. Une base créée avant l'auto_vacuum incrémental
+  doit d'abord être convertie une fois, bot arrêté (réécriture complète) :
+  `python maintenance.py vacuum`. D'ici là, cette étape est sautée.
+
+En mode multi-processus (cluster.py), l'entretien écrit dans la base : il est
+alors confié au processus d'écriture via `db` (RemoteWriteDatabase) pour que
+celui-ci reste le seul écrivain. Les sauvegardes ne font que lire la base et
+restent sur leur connexion séparée.
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import sqlite3
+import sys
+import time
+
+# Pages rendues par transaction d'incremental_vacuum
+VACUUM_STEP_PAGES = 1000
+
+
+class DatabaseMaintenance:
+    """Tâche périodique de sauvegarde et d'entretien d'une base SQLite"""
+
+    def __init__(self, path, backup_dir, keep=7, backup_interval=86400.0, maintenance_interval=21600.0,
+                 backup_pages=1024, min_free_pages=1000, db=None):
+        self.path = path
+        # Base dont les écritures passent par le processus d'écriture (None : connexion propre)
+        self.db = db
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.backup_interval = backup_interval
+        self.maintenance_interval = maintenance_interval
+        self.backup_pages = backup_pages
+        # En dessous de ce nombre de pages libres, l'incremental_vacuum est inutile
+        self.min_free_pages = min_free_pages
+        self._task = None
+        self.last_backup = None
+        self.last_maintenance = None
+        # auto_vacuum incrémental pas encore activé : conversion manuelle en attente
+        self.vacuum_pending = False
+
+    def start(self):
+        """Démarre la tâche périodique (sans effet si déjà lancée)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _backups(self):
+        """Sauvegardes existantes, de la plus ancienne à la plus récente"""
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        return sorted(glob.glob(os.path.join(self.backup_dir, f"{name}-*.db")))
+
+    async def _loop(self):
+        # Reprise du calendrier après un redémarrage : d'après la dernière sauvegarde existante
+        backups = self._backups() if self.backup_dir else []
+        next_backup = os.path.getmtime(backups[-1]) + self.backup_interval if backups else time.time()
+        next_maintenance = time.time() + self.maintenance_interval
+
+        while True:
+            now = time.time()
+            if self.backup_dir and now >= next_backup:
+                try:
+                    await self.backup()
+                except Exception as e:
+                    print(f"❌ Erreur lors de la sauvegarde de la base: {e}")
+                next_backup = now + self.backup_interval
+            if now >= next_maintenance:
+                try:
+                    await self.maintain()
+                except Exception as e:
+                    print(f"❌ Erreur lors de l'entretien de la base: {e}")
+                next_maintenance = now + self.maintenance_interval
+
+            due = min(next_backup, next_maintenance) if self.backup_dir else next_maintenance
+            await asyncio.sleep(max(due - time.time(), 1.0))
+
+    # --- Sauvegarde ---
+
+    async def backup(self):
+        """Écrit une sauvegarde cohérente de la base ; retourne son chemin"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        target = os.path.join(self.backup_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.db")
+        start = time.perf_counter()
+        await asyncio.to_thread(self._backup_to, target)
+        self.last_backup = time.time()
+        size = os.path.getsize(target) / 1024 / 1024
+        print(f"💾 Sauvegarde {target} ({size:.1f} Mo) en {time.perf_counter() - start:.1f} s")
+
+        for old in self._backups()[:-max(self.keep, 1)]:
+            os.remove(old)
+        return target
+
+    def _backup_to(self, target):
+        temporary = f"{target}.tmp"
+        source = sqlite3.connect(self.path, timeout=30)
+        try:
+            destination = sqlite3.connect(temporary)
+            try:
+                try:
+                    source.backup(destination, pages=self.backup_pages, progress=_RestartLimit())
+                except _TooManyRestarts:
+                    # Chaque écriture du bot relance la copie par pas depuis le début : sous forte
+                    # activité, copie en un seul pas (instantané WAL, sans bloquer les écritures)
+                    source.backup(destination)
+                # La copie est autonome : pas de fichier -wal à côté
+                destination.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                destination.close()
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        finally:
+            source.close()
+        os.replace(temporary, target)
+
+    # --- Entretien ---
+
+    async def maintain(self):
+        """Met à jour les statistiques et rend les pages libres ; retourne le nombre de pages rendues"""
+        start = time.perf_counter()
+        if self.db is None:
+            freed = await asyncio.to_thread(self._maintain)
+        else:
+            freed = await self._maintain_remote()
+        self.last_maintenance = time.time()
+        print(f"🧹 Entretien de la base : {freed} page(s) rendue(s) en {time.perf_counter() - start:.1f} s")
+        if self.vacuum_pending:
+            print("⚠️ Pages libres non rendues : auto_vacuum incrémental en attente de conversion "
+                  "(bot arrêté : python maintenance.py vacuum)")
+        return freed
+
+    def _maintain(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA analysis_limit = 1000")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+                # PRAGMA optimize ne réanalyse que des tables déjà analysées une première fois
+                conn.execute("ANALYZE")
+            else:
+                conn.executescript("PRAGMA optimize = 0x10002;")
+
+            self.vacuum_pending = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+            if self.vacuum_pending:
+                return 0
+
+            freed = 0
+            while conn.execute("PRAGMA freelist_count").fetchone()[0] >= self.min_free_pages:
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # executescript exécute le pragma jusqu'au bout (execute ne rend qu'une page par appel)
+                conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+                after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if after >= before:
+                    break
+                freed += before - after
+                # Laisse passer les écritures du bot entre deux lots
+                time.sleep(0.05)
+            return freed
+        finally:
+            conn.close()
+
+    async def _maintain_remote(self):
+        """Même entretien que _maintain, chaque écriture exécutée par le processus d'écriture"""
+        if await self.db.fetchone("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'") is None:
+            await self.db.execute("ANALYZE")
+        else:
+            await self.db.executescript("PRAGMA optimize = 0x10002;")
+
+        self.vacuum_pending = (await self.db.fetchone("PRAGMA auto_vacuum"))[0] != 2
+        if self.vacuum_pending:
+            return 0
+
+        freed = 0
+        while (before := (await self.db.fetchone("PRAGMA freelist_count"))[0]) >= self.min_free_pages:
+            await self.db.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+            after = (await self.db.fetchone("PRAGMA freelist_count"))[0]
+            if after >= before:
+                break
+            freed += before - after
+            await asyncio.sleep(0.05)
+        return freed
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class _RestartLimit:
+    """Rappel de progression de Connection.backup : abandonne après `limit` redémarrages"""
+
+    def __init__(self, limit=3):
+        self.limit = limit
+        self.restarts = 0
+        self.remaining = None
+
+    def __call__(self, status, remaining, total):
+        if self.remaining is not None and remaining > self.remaining:
+            self.restarts += 1
+            if self.restarts > self.limit:
+                raise _TooManyRestarts()
+        self.remaining = remaining
+
+
+def enable_incremental_vacuum(path):
+    """Active l'auto_vacuum incrémental d'une base existante (VACUUM : réécriture complète, bot arrêté)"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+# --- Ligne de commande ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Entretien ponctuel de la base du bot (bot arrêté)")
+    parser.add_argument('--db', default=os.environ.get('BOT_DATABASE_PATH', 'bot_database.db'),
+                        help="base SQLite du bot")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('vacuum', help="activer l'auto_vacuum incrémental (réécrit toute la base une fois)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if enable_incremental_vacuum(args.db):
+        print(f"✅ auto_vacuum incrémental activé en {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    else:
+        print("✅ auto_vacuum incrémental déjà activé", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
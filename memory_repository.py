@@ -0,0 +1,339 @@
+"""Stockage entièrement en mémoire, avec instantanés sur disque.
+
+MemoryRepository implémente la même interface que Repository (mêmes
+méthodes, mêmes enregistrements) sans SQLite : utile pour mesurer le coût des
+gestionnaires sans entrées/sorties disque et pour des instances éphémères.
+Les enregistrements retournés sont des copies, comme des lignes lues en base :
+les modifier ne change rien tant qu'ils ne sont pas réécrits.
+
+Si `snapshot_path` est défini, les données y sont rechargées à l'ouverture et
+écrites (JSON, remplacement atomique du fichier) à la fermeture et toutes les
+`snapshot_interval` secondes. Un arrêt brutal perd au plus l'activité depuis
+le dernier instantané.
+"""
+
+import asyncio
+import json
+import os
+import string
+import time
+
+from repository import (STATS, USER_COLUMNS, BackfillCheckpoint, CharacterRecord, RoleSweepProgress, UserRecord,
+                        _check_stat, ranking_key)
+
+SNAPSHOT_VERSION = 1
+
+CHARACTER_COLUMNS = CharacterRecord.__slots__
+
+# Valeurs par défaut des colonnes de `characters` (schéma SQLite)
+CHARACTER_DEFAULTS = {**{stat: 1 for stat in STATS}, 'reputation': 500, **{f"{stat}_exp": 0 for stat in STATS}}
+
+# COLLATE NOCASE de SQLite ne replie que les lettres ASCII
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _nocase(name):
+    return name.translate(_NOCASE)
+
+
+def _copy(record):
+    return type(record).from_row(record.__slots__, [getattr(record, name) for name in record.__slots__])
+
+
+class MemoryRepository:
+    """Tables du bot dans des dictionnaires, indexées comme en base"""
+
+    def __init__(self, snapshot_path=None, snapshot_interval=300.0):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._open = False
+        self._task = None
+        self._reset()
+
+    def _reset(self):
+        # guild_id -> user_id -> UserRecord
+        self._users = {}
+        # id -> CharacterRecord complet
+        self._characters = {}
+        # (guild_id, user_id) -> ids des personnages, du plus ancien au plus récent
+        self._owned = {}
+        # guild_id -> nom sans casse -> ids
+        self._names = {}
+        self._next_id = 1
+        self._state = {}
+        # guild_id -> channel_id -> BackfillCheckpoint
+        self._backfill = {}
+        # guild_id -> RoleSweepProgress
+        self._role_sweeps = {}
+
+    # --- Cycle de vie ---
+
+    @property
+    def is_open(self):
+        return self._open
+
+    async def open(self, **context):
+        """Recharge le dernier instantané et démarre les instantanés périodiques"""
+        if self._open:
+            return
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            self._load(await asyncio.to_thread(_read_json, self.snapshot_path))
+        self._open = True
+        if self.snapshot_path and self.snapshot_interval > 0:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def close(self):
+        """Arrête les instantanés périodiques et écrit un dernier instantané"""
+        if not self._open:
+            return
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.snapshot_path:
+            await self.snapshot()
+        self._open = False
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                print(f"❌ Erreur lors de l'instantané des données: {e}")
+
+    async def snapshot(self, path=None):
+        """Écrit toutes les tables dans `path` (par défaut snapshot_path)"""
+        # Copie construite dans la boucle (aucune modification concurrente), écriture dans un thread
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'next_id': self._next_id,
+            'user_levels': [[getattr(user, column) for column in USER_COLUMNS]
+                            for users in self._users.values() for user in users.values()],
+            'characters': [[getattr(character, column) for column in CHARACTER_COLUMNS]
+                           for character in self._characters.values()],
+            'bot_state': dict(self._state),
+            'backfill_channels': [[guild_id, *(getattr(checkpoint, column) for column in BackfillCheckpoint.__slots__)]
+                                  for guild_id, checkpoints in self._backfill.items()
+                                  for checkpoint in checkpoints.values()],
+            'role_sweeps': [[guild_id, *(getattr(progress, column) for column in RoleSweepProgress.__slots__)]
+                            for guild_id, progress in self._role_sweeps.items()],
+        }
+        await asyncio.to_thread(_write_json, path or self.snapshot_path, data)
+
+    def _load(self, data):
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Instantané de version inconnue : {data.get('version')}")
+        self._reset()
+        for row in data['user_levels']:
+            user = UserRecord(*row)
+            self._users.setdefault(user.guild_id, {})[user.user_id] = user
+        for row in data['characters']:
+            self._index_character(CharacterRecord.from_row(CHARACTER_COLUMNS, row))
+        self._next_id = max(data['next_id'], self._next_id)
+        self._state = dict(data['bot_state'])
+        for guild_id, *row in data['backfill_channels']:
+            checkpoint = BackfillCheckpoint.from_row(BackfillCheckpoint.__slots__, row)
+            self._backfill.setdefault(guild_id, {})[checkpoint.channel_id] = checkpoint
+        for guild_id, *row in data.get('role_sweeps', ()):
+            self._role_sweeps[guild_id] = RoleSweepProgress.from_row(RoleSweepProgress.__slots__, row)
+
+    # --- Niveaux d'ancienneté ---
+
+    async def get_user(self, guild_id, user_id):
+        user = self._users.get(guild_id, {}).get(user_id)
+        return None if user is None else _copy(user)
+
+    async def upsert_users(self, users):
+        for user in users:
+            self._users.setdefault(user.guild_id, {})[user.user_id] = _copy(user)
+
+    async def get_users(self, guild_id, user_ids):
+        users = self._users.get(guild_id, {})
+        return [_copy(users[user_id]) for user_id in user_ids if user_id in users]
+
+    async def ranking_rows(self, guild_id):
+        """(user_id, level, exp) de tout le serveur, dans l'ordre du classement"""
+        users = sorted(self._users.get(guild_id, {}).values(), key=ranking_key)
+        return [(user.user_id, user.level, user.exp) for user in users]
+
+    async def guild_levels(self, guild_id):
+        """Niveau de chaque membre du serveur ayant un profil : {user_id: niveau}"""
+        return {user_id: user.level for user_id, user in self._users.get(guild_id, {}).items()}
+
+    async def has_legacy_rows(self):
+        """Indique s'il reste des données d'avant le partitionnement (guild_id = 0)"""
+        return bool(self._users.get(0)) or any(guild_id == 0 for guild_id, _ in self._owned)
+
+    async def adopt_legacy_rows(self, guild_id):
+        # Comme UPDATE OR IGNORE : une ligne en conflit reste rattachée au serveur 0
+        legacy = self._users.get(0, {})
+        target = self._users.setdefault(guild_id, {})
+        for user_id in [user_id for user_id in legacy if user_id not in target]:
+            user = legacy.pop(user_id)
+            user.guild_id = guild_id
+            target[user_id] = user
+        taken = {character.character_name for character in self._characters.values()
+                 if character.guild_id == guild_id}
+        for character in [character for character in self._characters.values() if character.guild_id == 0]:
+            if character.character_name not in taken:
+                self._unindex_character(character)
+                character.guild_id = guild_id
+                self._index_character(character)
+
+    async def reset_user(self, guild_id, user_id):
+        """Supprime le profil et les personnages d'un membre sur un serveur"""
+        self._users.get(guild_id, {}).pop(user_id, None)
+        for character_id in list(self._owned.get((guild_id, user_id), ())):
+            self._unindex_character(self._characters[character_id])
+
+    # --- Personnages ---
+
+    def _index_character(self, character):
+        self._characters[character.id] = character
+        self._owned.setdefault((character.guild_id, character.user_id), []).append(character.id)
+        self._names.setdefault(character.guild_id, {}).setdefault(
+            _nocase(character.character_name), []).append(character.id)
+        self._next_id = max(self._next_id, character.id + 1)
+
+    def _unindex_character(self, character):
+        del self._characters[character.id]
+        owner = (character.guild_id, character.user_id)
+        self._owned[owner].remove(character.id)
+        if not self._owned[owner]:
+            del self._owned[owner]
+        names = self._names[character.guild_id]
+        key = _nocase(character.character_name)
+        names[key].remove(character.id)
+        if not names[key]:
+            del names[key]
+
+    def _owned_characters(self, guild_id, user_id):
+        return [self._characters[character_id] for character_id in self._owned.get((guild_id, user_id), ())]
+
+    def _find(self, guild_id, user_id, name):
+        for character_id in self._names.get(guild_id, {}).get(_nocase(name), ()):
+            character = self._characters[character_id]
+            if character.user_id == user_id:
+                return character
+        return None
+
+    async def count_characters(self, guild_id, user_id):
+        return len(self._owned.get((guild_id, user_id), ()))
+
+    async def character_name_taken(self, guild_id, name):
+        return _nocase(name) in self._names.get(guild_id, {})
+
+    async def create_character(self, guild_id, user_id, name, specialty, stats):
+        """Crée un personnage ; `stats` contient les six niveaux et la réputation"""
+        if any(self._characters[character_id].character_name == name
+               for character_id in self._names.get(guild_id, {}).get(_nocase(name), ())):
+            # Même contrainte que UNIQUE (guild_id, character_name)
+            raise ValueError(f"Personnage déjà existant : {name}")
+        values = {**CHARACTER_DEFAULTS, **stats, 'id': self._next_id, 'guild_id': guild_id, 'user_id': user_id,
+                  'character_name': name, 'specialty': specialty,
+                  'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())}
+        self._index_character(CharacterRecord.from_row(CHARACTER_COLUMNS, [values[column] for column in CHARACTER_COLUMNS]))
+
+    async def list_characters(self, guild_id, user_id):
+        """Personnages d'un membre, du plus ancien au plus récent"""
+        return [_copy(character) for character in self._owned_characters(guild_id, user_id)]
+
+    async def get_character(self, guild_id, user_id, name):
+        character = self._find(guild_id, user_id, name)
+        return None if character is None else _copy(character)
+
+    async def list_character_names(self, guild_id, user_id):
+        return [character.character_name for character in self._owned_characters(guild_id, user_id)]
+
+    async def get_characters(self, guild_id, user_id):
+        return [_copy(character) for character in self._owned_characters(guild_id, user_id)]
+
+    async def get_character_summary(self, guild_id, user_id, name):
+        return await self.get_character(guild_id, user_id, name)
+
+    async def get_character_by_id(self, character_id, user_id):
+        """Identité d'un personnage, seulement s'il appartient toujours au membre"""
+        character = self._characters.get(character_id)
+        return _copy(character) if character is not None and character.user_id == user_id else None
+
+    async def get_character_stat(self, guild_id, user_id, name, stat):
+        _check_stat(stat)
+        return await self.get_character(guild_id, user_id, name)
+
+    async def update_stat(self, character_id, stat, level, exp):
+        _check_stat(stat)
+        character = self._characters.get(character_id)
+        if character is not None:
+            setattr(character, stat, level)
+            setattr(character, f"{stat}_exp", exp)
+
+    async def update_stats(self, characters, stats):
+        for stat in stats:
+            _check_stat(stat)
+        for updated in characters:
+            character = self._characters.get(updated.id)
+            if character is None:
+                continue
+            for stat in stats:
+                setattr(character, stat, updated.stat_level(stat))
+                setattr(character, f"{stat}_exp", updated.stat_exp(stat))
+
+    async def delete_character(self, character_id):
+        character = self._characters.get(character_id)
+        if character is not None:
+            self._unindex_character(character)
+
+    # --- État interne ---
+
+    async def get_state(self, key):
+        return self._state.get(key)
+
+    async def set_state(self, key, value):
+        self._state[key] = value
+
+    # --- Import de l'historique ---
+
+    async def backfill_checkpoints(self, guild_id):
+        return [_copy(checkpoint) for checkpoint in self._backfill.get(guild_id, {}).values()]
+
+    async def add_backfill_channels(self, guild_id, before_id, channel_ids):
+        checkpoints = self._backfill.setdefault(guild_id, {})
+        for channel_id in channel_ids:
+            if channel_id not in checkpoints:
+                checkpoints[channel_id] = BackfillCheckpoint.from_row(
+                    BackfillCheckpoint.__slots__, (channel_id, before_id, 0, 0, 0))
+
+    async def save_backfill_batch(self, users, guild_id, channel_id, last_message_id, messages, done):
+        await self.upsert_users(users)
+        checkpoint = self._backfill.get(guild_id, {}).get(channel_id)
+        if checkpoint is not None:
+            checkpoint.last_message_id = last_message_id
+            checkpoint.messages += messages
+            checkpoint.done = int(done)
+
+    # --- Réconciliation des rôles ---
+
+    async def get_role_sweep(self, guild_id):
+        progress = self._role_sweeps.get(guild_id)
+        return None if progress is None else _copy(progress)
+
+    async def save_role_sweep(self, guild_id, progress):
+        self._role_sweeps[guild_id] = _copy(progress)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def _write_json(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump(data, output, ensure_ascii=False, separators=(',', ':'))
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary, path)
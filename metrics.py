@@ -0,0 +1,165 @@
+"""Instrumentation du bot : latences, requêtes SQL, montées de niveau, appels REST.
+
+Les mesures sont gardées en mémoire et exposées au format texte de Prometheus
+sur un port HTTP local (voir `start_http_server`), ainsi que résumées par la
+commande /admin_stats.
+"""
+
+import functools
+import time
+from bisect import bisect_left
+from collections import deque
+
+from aiohttp import web
+
+# Bornes des histogrammes de latence, en secondes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (compatible Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Estimation d'un quantile (borne supérieure du seau concerné)"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Registre des mesures du bot"""
+
+    def __init__(self):
+        self.handler_latency = {}
+        self.handler_errors = {}
+        self.sql_latency = {}
+        self.rest_requests = {}
+        self.level_ups = 0
+        self._recent_level_ups = deque(maxlen=100000)
+        self.started_at = time.time()
+
+    # --- Enregistrement ---
+
+    def observe_handler(self, handler, seconds):
+        histogram = self.handler_latency.get(handler)
+        if histogram is None:
+            histogram = self.handler_latency[handler] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_sql(self, kind, seconds):
+        histogram = self.sql_latency.get(kind)
+        if histogram is None:
+            histogram = self.sql_latency[kind] = Histogram()
+        histogram.observe(seconds)
+
+    def count_level_ups(self, levels=1):
+        self.level_ups += levels
+        now = time.monotonic()
+        for _ in range(levels):
+            self._recent_level_ups.append(now)
+
+    def level_ups_last_minute(self):
+        cutoff = time.monotonic() - 60
+        while self._recent_level_ups and self._recent_level_ups[0] < cutoff:
+            self._recent_level_ups.popleft()
+        return len(self._recent_level_ups)
+
+    def count_rest(self, method, route):
+        key = (method, route)
+        self.rest_requests[key] = self.rest_requests.get(key, 0) + 1
+
+    def timed(self, handler):
+        """Décorateur : mesure la durée d'un gestionnaire d'événement ou de commande"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    self.handler_errors[handler] = self.handler_errors.get(handler, 0) + 1
+                    raise
+                finally:
+                    self.observe_handler(handler, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def instrument_http(self, http):
+        """Compte chaque requête REST envoyée par le client HTTP de discord.py"""
+        request = http.request
+
+        async def counted_request(route, **kwargs):
+            self.count_rest(route.method, route.path)
+            return await request(route, **kwargs)
+
+        http.request = counted_request
+
+    # --- Export ---
+
+    def render_prometheus(self):
+        """Retourne toutes les mesures au format texte de Prometheus"""
+        lines = []
+        self._render_histograms(lines, 'bot_handler_latency_seconds',
+                                "Durée des gestionnaires d'événements et de commandes", 'handler',
+                                self.handler_latency)
+        lines.append("# HELP bot_handler_errors_total Exceptions levées par les gestionnaires")
+        lines.append("# TYPE bot_handler_errors_total counter")
+        for handler, count in sorted(self.handler_errors.items()):
+            lines.append(f'bot_handler_errors_total{{handler="{handler}"}} {count}')
+        self._render_histograms(lines, 'bot_sql_query_seconds', "Durée des requêtes SQL", 'kind',
+                                self.sql_latency)
+        lines.append("# HELP bot_level_ups_total Montées de niveau d'ancienneté")
+        lines.append("# TYPE bot_level_ups_total counter")
+        lines.append(f"bot_level_ups_total {self.level_ups}")
+        lines.append("# HELP bot_discord_rest_requests_total Requêtes REST envoyées à Discord")
+        lines.append("# TYPE bot_discord_rest_requests_total counter")
+        for (method, route), count in sorted(self.rest_requests.items()):
+            lines.append(f'bot_discord_rest_requests_total{{method="{method}",route="{route}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, label, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+
+    async def start_http_server(self, port, host='127.0.0.1'):
+        """Expose /metrics sur un port local ; retourne le runner aiohttp"""
+        async def handle(request):
+            return web.Response(text=self.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+metrics = Metrics()
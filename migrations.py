@@ -0,0 +1,213 @@
+"""Migrations versionnées du schéma, pilotées par `PRAGMA user_version`.
+
+Chaque migration est appliquée une seule fois, dans l'ordre, dans sa propre
+transaction qui enregistre aussi le nouveau numéro de version : une base est
+toujours soit avant, soit après une migration, jamais entre les deux. Pour
+faire évoluer le schéma, ajouter une fonction à la fin de MIGRATIONS sans
+jamais modifier les précédentes.
+
+Exception : une migration marquée `outside_transaction` (VACUUM...) reçoit la
+Database au lieu de la connexion et doit pouvoir être rejouée sans dommage si
+le bot s'arrête avant l'enregistrement de sa version.
+"""
+
+USER_LEVELS_SCHEMA = """CREATE TABLE IF NOT EXISTS {table} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        level INTEGER DEFAULT 1,
+        exp INTEGER DEFAULT 0,
+        total_messages INTEGER DEFAULT 0,
+        last_message_time REAL DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )"""
+
+CHARACTERS_SCHEMA = """CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        character_name TEXT,
+        specialty TEXT,
+        chant INTEGER DEFAULT 1,
+        danse INTEGER DEFAULT 1,
+        eloquence INTEGER DEFAULT 1,
+        acting INTEGER DEFAULT 1,
+        fitness INTEGER DEFAULT 1,
+        esthetique INTEGER DEFAULT 1,
+        reputation INTEGER DEFAULT 500,
+        chant_exp INTEGER DEFAULT 0,
+        danse_exp INTEGER DEFAULT 0,
+        eloquence_exp INTEGER DEFAULT 0,
+        acting_exp INTEGER DEFAULT 0,
+        fitness_exp INTEGER DEFAULT 0,
+        esthetique_exp INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        guild_id INTEGER NOT NULL,
+        UNIQUE (guild_id, character_name),
+        FOREIGN KEY (guild_id, user_id) REFERENCES user_levels (guild_id, user_id)
+    )"""
+
+CHARACTER_COLUMNS = """user_id, character_name, specialty, chant, danse, eloquence, acting, fitness, esthetique,
+        reputation, chant_exp, danse_exp, eloquence_exp, acting_exp, fitness_exp, esthetique_exp, created_at"""
+
+
+async def _create_base_tables(conn, context):
+    """Schéma d'origine (un profil par membre, tous serveurs confondus)"""
+    await conn.execute("""CREATE TABLE IF NOT EXISTS user_levels (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        level INTEGER DEFAULT 1,
+        exp INTEGER DEFAULT 0,
+        total_messages INTEGER DEFAULT 0,
+        last_message_time REAL DEFAULT 0
+    )""")
+    await conn.execute("""CREATE TABLE IF NOT EXISTS characters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        character_name TEXT UNIQUE,
+        specialty TEXT,
+        chant INTEGER DEFAULT 1,
+        danse INTEGER DEFAULT 1,
+        eloquence INTEGER DEFAULT 1,
+        acting INTEGER DEFAULT 1,
+        fitness INTEGER DEFAULT 1,
+        esthetique INTEGER DEFAULT 1,
+        reputation INTEGER DEFAULT 500,
+        chant_exp INTEGER DEFAULT 0,
+        danse_exp INTEGER DEFAULT 0,
+        eloquence_exp INTEGER DEFAULT 0,
+        acting_exp INTEGER DEFAULT 0,
+        fitness_exp INTEGER DEFAULT 0,
+        esthetique_exp INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES user_levels (user_id)
+    )""")
+
+
+async def _partition_by_guild(conn, context):
+    """Ajoute guild_id aux deux tables (clé primaire et unicité par serveur).
+
+    Les lignes existantes sont rattachées à `legacy_guild_id` (0 par défaut,
+    puis adoptées par le serveur du bot au démarrage s'il n'en a qu'un).
+    """
+    async with conn.execute("PRAGMA table_info(user_levels)") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+
+    if 'guild_id' not in columns:
+        legacy_guild_id = context.get('legacy_guild_id', 0)
+
+        # Reconstruction complète : la clé primaire et la contrainte UNIQUE changent
+        await conn.execute(USER_LEVELS_SCHEMA.format(table='user_levels_new'))
+        await conn.execute("""INSERT INTO user_levels_new
+                              (guild_id, user_id, username, level, exp, total_messages, last_message_time)
+                              SELECT ?, user_id, username, level, exp, total_messages, last_message_time
+                              FROM user_levels""", (legacy_guild_id,))
+        await conn.execute("DROP TABLE user_levels")
+        await conn.execute("ALTER TABLE user_levels_new RENAME TO user_levels")
+
+        await conn.execute(CHARACTERS_SCHEMA.format(table='characters_new'))
+        await conn.execute(f"""INSERT INTO characters_new (id, {CHARACTER_COLUMNS}, guild_id)
+                               SELECT id, {CHARACTER_COLUMNS}, ? FROM characters""", (legacy_guild_id,))
+        await conn.execute("DROP TABLE characters")
+        await conn.execute("ALTER TABLE characters_new RENAME TO characters")
+
+    # Index du classement : top N et rang lus dans l'ordre de l'index, sans tri
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_user_levels_rank ON user_levels (guild_id, level, exp)")
+
+
+async def _index_characters(conn, context):
+    """Index des personnages : liste par membre et recherche par nom sans casse"""
+    # /mes_personnages, /creer_personnage (COUNT), admin_reset_user : recherche par membre, tri par date
+    await conn.execute("""CREATE INDEX IF NOT EXISTS idx_characters_owner
+                          ON characters (guild_id, user_id, created_at)""")
+    # /stats_personnage, /entrainer, /supprimer_personnage : recherche par nom, insensible à la casse
+    await conn.execute("""CREATE INDEX IF NOT EXISTS idx_characters_name_nocase
+                          ON characters (guild_id, character_name COLLATE NOCASE)""")
+
+
+async def _create_bot_state(conn, context):
+    """Petite table clé/valeur pour l'état interne du bot (empreinte des commandes...)"""
+    await conn.execute("""CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+
+
+async def _create_backfill_checkpoints(conn, context):
+    """Progression de l'import de l'historique des salons (une ligne par salon)"""
+    # before_id : instantané commun à tous les salons d'un serveur ; les messages
+    # plus récents sont comptés en direct par on_message et ne sont jamais relus
+    await conn.execute("""CREATE TABLE IF NOT EXISTS backfill_channels (
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        before_id INTEGER NOT NULL,
+        last_message_id INTEGER NOT NULL DEFAULT 0,
+        messages INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, channel_id)
+    )""")
+
+
+async def _enable_incremental_vacuum(db, context):
+    """Pages libérées rendues au système par PRAGMA incremental_vacuum (voir maintenance.py)"""
+    # auto_vacuum ne change qu'au VACUUM suivant, qui réécrit toute la base : seulement si elle est
+    # encore vide (instantané). Sinon la conversion attend `python maintenance.py vacuum`, bot arrêté
+    if (await db.fetchone("PRAGMA auto_vacuum"))[0] != 2:
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if (await db.fetchone("SELECT 1 FROM user_levels LIMIT 1") is None
+                and await db.fetchone("SELECT 1 FROM characters LIMIT 1") is None):
+            await db.execute("VACUUM")
+
+_enable_incremental_vacuum.outside_transaction = True
+
+
+async def _create_role_sweeps(conn, context):
+    """Progression de la réconciliation des rôles d'ancienneté (une ligne par serveur)"""
+    # Les membres sont parcourus par identifiant croissant : last_user_id suffit pour reprendre
+    await conn.execute("""CREATE TABLE IF NOT EXISTS role_sweeps (
+        guild_id INTEGER PRIMARY KEY,
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        checked INTEGER NOT NULL DEFAULT 0,
+        changed INTEGER NOT NULL DEFAULT 0,
+        started_at REAL NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0
+    )""")
+
+
+async def _rank_index_with_user_id(conn, context):
+    """Index du classement départagé par identifiant : rang et voisins des ex æquo lus dans l'index"""
+    await conn.execute("DROP INDEX IF EXISTS idx_user_levels_rank")
+    await conn.execute("CREATE INDEX idx_user_levels_rank ON user_levels (guild_id, level, exp, user_id DESC)")
+
+
+# (version, description, migration) — ne jamais réordonner ni modifier une entrée publiée
+MIGRATIONS = [
+    (1, "tables de base", _create_base_tables),
+    (2, "partitionnement des données par serveur", _partition_by_guild),
+    (3, "index des personnages", _index_characters),
+    (4, "état interne du bot", _create_bot_state),
+    (5, "reprise de l'import de l'historique", _create_backfill_checkpoints),
+    (6, "auto_vacuum incrémental", _enable_incremental_vacuum),
+    (7, "reprise de la réconciliation des rôles", _create_role_sweeps),
+    (8, "départage des ex æquo dans l'index du classement", _rank_index_with_user_id),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def run_migrations(db, **context):
+    """Applique les migrations manquantes ; retourne la version finale du schéma"""
+    current = (await db.fetchone("PRAGMA user_version"))[0]
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"🔧 Migration {version} : {description}...")
+        if getattr(migration, 'outside_transaction', False):
+            await migration(db, context)
+            await db.execute(f"PRAGMA user_version = {version}")
+            current = version
+            continue
+        async with db.transaction() as conn:
+            await migration(conn, context)
+            await conn.execute(f"PRAGMA user_version = {version}")
+        current = version
+    return current
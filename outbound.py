@@ -0,0 +1,248 @@
+"""Ordonnanceur des appels sortants vers Discord, par priorité et par route.
+
+Les réponses aux interactions doivent partir en moins de 3 secondes ; les
+annonces de montée de niveau et surtout les modifications de rôles peuvent
+attendre. Les tâches secondaires passent donc par cet ordonnanceur :
+
+- trois classes de priorité : une tâche n'est prise que si aucune tâche plus
+  prioritaire n'est prête, et aucune tâche ne démarre tant qu'une interaction
+  reçue attend encore sa réponse (dans la limite de `max_hold` secondes) : les
+  réponses aux interactions ne passent pas par la file, elles partent
+  directement et ce sont les autres appels qui leur cèdent la place ;
+- une file par route (salon, serveur...) avec au plus un appel en cours par
+  route : une route limitée par Discord (appels lents, `discord.RateLimited`)
+  est mise en pause sans bloquer les autres ;
+- déduplication : une tâche soumise avec la même clé qu'une tâche encore en
+  attente la remplace (seule la dernière modification de rôles d'un membre
+  est envoyée).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+import discord
+
+# Classes de priorité (la plus petite valeur passe en premier)
+ANNOUNCEMENT = 0
+ROLE_EDIT = 1
+SWEEP = 2  # corrections en masse (réconciliation des rôles), après tout le reste
+
+# Délai de réponse imposé par Discord à une interaction
+INTERACTION_DEADLINE = 3.0
+
+
+class _Job:
+    __slots__ = ('priority', 'route', 'key', 'factory', 'future')
+
+    def __init__(self, priority, route, key, factory, future):
+        self.priority = priority
+        self.route = route
+        self.key = key
+        self.factory = factory
+        self.future = future
+
+
+class OutboundScheduler:
+    """File d'appels sortants secondaires, servie par `workers` tâches"""
+
+    def __init__(self, workers=4, max_hold=2.5, slow_call=1.0, clock=time.monotonic):
+        self.workers = workers
+        self.max_hold = max_hold
+        # Un appel plus long que `slow_call` secondes a attendu une limite de Discord
+        self.slow_call = slow_call
+        self._clock = clock
+        # Une file de routes par priorité ; chaque route garde ses tâches dans l'ordre
+        self._queues = [OrderedDict() for _ in (ANNOUNCEMENT, ROLE_EDIT, SWEEP)]
+        self._by_key = {}
+        self._busy_routes = set()
+        self._blocked_until = {}
+        self._interactions = deque()
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self.superseded = 0
+
+    # --- Soumission ---
+
+    def submit(self, priority, route, factory, key=None):
+        """Planifie `factory()` (coroutine) ; retourne un futur résolu avec son résultat.
+
+        Si `key` correspond à une tâche encore en attente, celle-ci est
+        remplacée et son futur est résolu par la nouvelle tâche (qui garde la
+        plus haute des deux priorités).
+        """
+        loop = asyncio.get_running_loop()
+        if key is not None:
+            pending = self._by_key.get(key)
+            if pending is not None:
+                pending.factory = factory
+                if priority < pending.priority:
+                    self._unqueue(pending)
+                    pending.priority = priority
+                    self._queues[priority].setdefault(pending.route, deque()).append(pending)
+                self.superseded += 1
+                return pending.future
+
+        job = _Job(priority, route, key, factory, loop.create_future())
+        self._queues[priority].setdefault(route, deque()).append(job)
+        if key is not None:
+            self._by_key[key] = job
+        self._wakeup.set()
+        return job.future
+
+    async def run(self, priority, route, factory, key=None):
+        """Comme submit(), en attendant le résultat"""
+        return await self.submit(priority, route, factory, key)
+
+    def cancel(self, key):
+        """Annule la tâche en attente de clé `key` (sans effet sur une tâche déjà lancée)"""
+        job = self._by_key.pop(key, None)
+        if job is None:
+            return
+        self._unqueue(job)
+        job.future.cancel()
+
+    def _unqueue(self, job):
+        routes = self._queues[job.priority]
+        jobs = routes.get(job.route)
+        if jobs is not None:
+            jobs.remove(job)
+            if not jobs:
+                del routes[job.route]
+
+    def track_interaction(self, interaction):
+        """Signale une interaction reçue : rien ne part avant sa réponse (ou son échéance)"""
+        # Élagué ici aussi : sur un bot calme, aucune tâche ne le ferait (autocomplétion à chaque frappe)
+        self._prune_interactions()
+        self._interactions.append((self._clock() + INTERACTION_DEADLINE, interaction))
+
+    def pending(self):
+        return sum(len(jobs) for routes in self._queues for jobs in routes.values())
+
+    # --- Exécution ---
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Arrête les tâches de service ; les tâches en attente sont abandonnées"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for routes in self._queues:
+            for jobs in routes.values():
+                for job in jobs:
+                    job.future.cancel()
+            routes.clear()
+        self._by_key.clear()
+
+    async def drain(self):
+        """Attend que toutes les tâches soumises soient terminées"""
+        while self.pending() or self._busy_routes:
+            await asyncio.sleep(0.01)
+
+    def _prune_interactions(self):
+        now = self._clock()
+        while self._interactions:
+            deadline, interaction = self._interactions[0]
+            if deadline > now and not interaction.response.is_done():
+                break
+            self._interactions.popleft()
+
+    def _interaction_waiting(self):
+        self._prune_interactions()
+        # Les interactions suivantes sont plus récentes : on regarde si l'une attend encore
+        return any(not interaction.response.is_done() for _, interaction in self._interactions)
+
+    def _next_job(self):
+        now = self._clock()
+        for routes in self._queues:
+            for route, jobs in routes.items():
+                if route in self._busy_routes or self._blocked_until.get(route, 0) > now:
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    routes.move_to_end(route)  # Tourniquet entre les routes d'une même priorité
+                else:
+                    del routes[route]
+                if job.key is not None:
+                    del self._by_key[job.key]
+                # La route reste occupée pendant l'éventuelle attente d'une interaction
+                self._busy_routes.add(route)
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                wait = self._next_unblock()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Priorité absolue aux réponses d'interaction en attente
+            hold_until = self._clock() + self.max_hold
+            while self._interaction_waiting() and self._clock() < hold_until:
+                await asyncio.sleep(0.02)
+
+            await self._execute(job)
+
+    def _next_unblock(self):
+        now = self._clock()
+        delays = [until - now for until in self._blocked_until.values() if until > now]
+        return min(delays) if delays else None
+
+    async def _execute(self, job):
+        start = self._clock()
+        try:
+            result = await job.factory()
+        except discord.RateLimited as e:
+            # Limite trop longue pour être attendue par le client HTTP : la route est mise en pause
+            self._blocked_until[job.route] = self._clock() + e.retry_after
+            self._requeue(job)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+            self._pace(job.route, start)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+            self._pace(job.route, start)
+        finally:
+            self._busy_routes.discard(job.route)
+            self._wakeup.set()
+
+    def _pace(self, route, start):
+        elapsed = self._clock() - start
+        if elapsed > self.slow_call:
+            # Route probablement limitée : on laisse passer les autres un moment
+            self._blocked_until[route] = self._clock() + elapsed
+        else:
+            self._blocked_until.pop(route, None)
+
+    def _requeue(self, job):
+        newer = self._by_key.get(job.key) if job.key is not None else None
+        if newer is not None:
+            # Remplacée entre-temps : la nouvelle tâche donnera aussi le résultat de l'ancienne
+            newer.future.add_done_callback(lambda future: _copy_result(future, job.future))
+            return
+        self._queues[job.priority].setdefault(job.route, deque()).appendleft(job)
+        if job.key is not None:
+            self._by_key[job.key] = job
+
+
+def _copy_result(source, target):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,257 @@
+"""Classement en mémoire par serveur : rang exact et voisins en O(log n).
+
+Le classement d'un serveur est chargé depuis la base à la première demande
+(une lecture de l'index du classement), puis tenu à jour par l'accumulateur
+d'XP à chaque modification d'une entrée : il reflète donc aussi les XP encore
+en attente d'écriture, sans écriture ni requête à chaque `/rang`.
+
+Les clés `ranking_key` (niveau, XP, identifiant) sont gardées dans une liste
+triée découpée en blocs d'au plus `2 * BLOCK_SIZE` clés ; un arbre de Fenwick
+compte les clés par bloc. Le rang d'un membre est une recherche dichotomique
+parmi les blocs, une somme dans l'arbre et une recherche dans son bloc ; une
+mise à jour ne déplace que les clés d'un bloc. Les serveurs les moins
+récemment consultés sont oubliés (LRU) au-delà de `max_members` clés.
+"""
+
+import asyncio
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from repository import ranking_key
+
+BLOCK_SIZE = 512
+
+
+class _SortedKeys:
+    """Liste triée par blocs, avec le nombre de clés par bloc dans un arbre de Fenwick"""
+
+    def __init__(self, keys):
+        self._blocks = [keys[start:start + BLOCK_SIZE] for start in range(0, len(keys), BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(keys)
+        self._build()
+
+    def __len__(self):
+        return self._len
+
+    def _build(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, block_index, delta):
+        i = block_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_before(self, block_index):
+        total = 0
+        i = block_index
+        while i:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index):
+        """(bloc, position dans le bloc) de la clé de rang `index` (à partir de 0)"""
+        block_index = 0
+        step = 1 << (len(self._blocks).bit_length() - 1) if self._blocks else 0
+        while step:
+            following = block_index + step
+            if following < len(self._tree) and self._tree[following] <= index:
+                block_index = following
+                index -= self._tree[following]
+            step >>= 1
+        return block_index, index
+
+    def add(self, key):
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._build()
+            return
+        i = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            # Bloc trop long : coupé en deux, l'arbre est reconstruit (rare)
+            self._blocks[i:i + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._maxes[i:i + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+            self._build()
+        else:
+            self._grow(i, 1)
+
+    def remove(self, key):
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect_left(block, key)]
+        self._len -= 1
+        if block:
+            self._maxes[i] = block[-1]
+            self._grow(i, -1)
+        else:
+            del self._blocks[i], self._maxes[i]
+            self._build()
+
+    def index(self, key):
+        """Nombre de clés strictement inférieures à `key`"""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return self._len
+        return self._count_before(i) + bisect_left(self._blocks[i], key)
+
+    def slice(self, start, stop):
+        """Clés de rang `start` (inclus) à `stop` (exclu)"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        block_index, offset = self._locate(start)
+        keys = []
+        while len(keys) < stop - start:
+            keys.extend(self._blocks[block_index][offset:offset + stop - start - len(keys)])
+            block_index, offset = block_index + 1, 0
+        return keys
+
+
+class _GuildRanking:
+    __slots__ = ('keys', 'by_user')
+
+    def __init__(self, keys, by_user):
+        self.keys = keys
+        self.by_user = by_user
+
+
+class _Loading:
+    __slots__ = ('task', 'changes', 'stale')
+
+    def __init__(self):
+        self.task = None
+        self.changes = {}
+        self.stale = False
+
+
+class RankIndex:
+    """Classements triés des serveurs consultés, chargés à la demande"""
+
+    def __init__(self, repo, cached, max_members=1_000_000):
+        self.repo = repo
+        # cached(guild_id) : entrées en mémoire du serveur, jamais plus anciennes que la base
+        self.cached = cached
+        self.max_members = max_members
+        self._guilds = OrderedDict()
+        self._members = 0
+        # Chargements en cours : guild_id -> _Loading (modifications survenues pendant la lecture)
+        self._loading = {}
+
+    async def top(self, guild_id, limit):
+        """Premiers du classement : [(user_id, level, exp)]"""
+        ranking = await self._get(guild_id)
+        return [_unpack(key) for key in ranking.keys.slice(0, limit)]
+
+    async def around(self, guild_id, user_id, radius):
+        """Rang d'un membre (à partir de 1) et classement de part et d'autre.
+
+        Retourne (rang, [(rang, user_id, level, exp), ...]) pour les rangs
+        `rang - radius` à `rang + radius`, ou None si le membre n'est pas classé.
+        """
+        ranking = await self._get(guild_id)
+        key = ranking.by_user.get(user_id)
+        if key is None:
+            return None
+        index = ranking.keys.index(key)
+        start = max(index - radius, 0)
+        window = ranking.keys.slice(start, index + radius + 1)
+        return index + 1, [(start + offset + 1, *_unpack(key)) for offset, key in enumerate(window)]
+
+    def update(self, entry):
+        """Reporte le niveau et l'XP d'une entrée (sans effet si son serveur n'est pas chargé)"""
+        key = ranking_key(entry)
+        loading = self._loading.get(entry.guild_id)
+        if loading is not None:
+            loading.changes[entry.user_id] = key
+        ranking = self._guilds.get(entry.guild_id)
+        if ranking is None:
+            return
+        previous = ranking.by_user.get(entry.user_id)
+        if previous == key:
+            return
+        if previous is None:
+            self._members += 1
+        else:
+            ranking.keys.remove(previous)
+        ranking.keys.add(key)
+        ranking.by_user[entry.user_id] = key
+
+    def discard(self, guild_id, user_id):
+        """Retire un membre supprimé du classement"""
+        loading = self._loading.get(guild_id)
+        if loading is not None:
+            loading.changes[user_id] = None
+        ranking = self._guilds.get(guild_id)
+        if ranking is None:
+            return
+        previous = ranking.by_user.pop(user_id, None)
+        if previous is not None:
+            ranking.keys.remove(previous)
+            self._members -= 1
+
+    def invalidate(self, guild_id):
+        """Oublie le classement d'un serveur (rechargé à la prochaine demande)"""
+        ranking = self._guilds.pop(guild_id, None)
+        if ranking is not None:
+            self._members -= len(ranking.by_user)
+        loading = self._loading.get(guild_id)
+        if loading is not None:
+            loading.stale = True
+
+    async def _get(self, guild_id):
+        ranking = self._guilds.get(guild_id)
+        if ranking is not None:
+            self._guilds.move_to_end(guild_id)
+            return ranking
+
+        loading = self._loading.get(guild_id)
+        if loading is None:
+            loading = self._loading[guild_id] = _Loading()
+            loading.task = asyncio.ensure_future(self._load(guild_id))
+        # Lecture partagée entre les demandes simultanées ; un échec est remonté à chacune
+        return await asyncio.shield(loading.task)
+
+    async def _load(self, guild_id):
+        # Relevées avant la lecture : une écriture d'XP en cours n'est peut-être pas encore visible
+        cached = [(entry.user_id, ranking_key(entry)) for entry in self.cached(guild_id)]
+        try:
+            rows = await self.repo.ranking_rows(guild_id)
+        finally:
+            loading = self._loading.pop(guild_id)
+        if loading.stale:
+            # Serveur invalidé pendant la lecture : les lignes lues sont peut-être périmées
+            return await self._get(guild_id)
+
+        by_user = {user_id: (-level, -exp, user_id) for user_id, level, exp in rows}
+        # XP en mémoire (plus récentes que la base), puis modifications survenues pendant la lecture
+        by_user.update(cached)
+        for user_id, key in loading.changes.items():
+            if key is None:
+                by_user.pop(user_id, None)
+            else:
+                by_user[user_id] = key
+
+        ranking = self._guilds[guild_id] = _GuildRanking(_SortedKeys(sorted(by_user.values())), by_user)
+        self._members += len(by_user)
+        while self._members > self.max_members and len(self._guilds) > 1:
+            _, evicted = self._guilds.popitem(last=False)
+            self._members -= len(evicted.by_user)
+        return ranking
+
+
+def _unpack(key):
+    negative_level, negative_exp, user_id = key
+    return user_id, -negative_level, -negative_exp
@@ -0,0 +1,321 @@
+"""Accès typé aux tables `user_levels`, `characters` et `bot_state`.
+
+Toutes les requêtes SQL du bot passent par ce module. Chaque requête ne
+sélectionne que les colonnes dont l'appelant a besoin et les lignes sont
+décodées en enregistrements compacts (`__slots__`) lus par nom : plus aucun
+`SELECT *` ni indice de tuple codé en dur dans les gestionnaires.
+
+Les méthodes publiques de Repository forment l'interface de stockage du bot :
+MemoryRepository (memory_repository.py) l'implémente entièrement en mémoire,
+et le bot choisit l'une ou l'autre selon STORAGE_BACKEND.
+"""
+
+from migrations import run_migrations
+
+# Statistiques entraînables d'un personnage (colonnes `<stat>` et `<stat>_exp`)
+STATS = ('chant', 'danse', 'eloquence', 'acting', 'fitness', 'esthetique')
+
+USER_COLUMNS = ('guild_id', 'user_id', 'username', 'level', 'exp', 'total_messages', 'last_message_time')
+
+
+class _Record:
+    """Base des enregistrements : seules les colonnes sélectionnées sont définies"""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, columns, row):
+        record = cls.__new__(cls)
+        for column, value in zip(columns, row):
+            setattr(record, column, value)
+        return record
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if hasattr(self, name))
+        return f"{type(self).__name__}({fields})"
+
+
+class UserRecord(_Record):
+    """Profil d'ancienneté d'un membre sur un serveur"""
+
+    __slots__ = USER_COLUMNS
+
+    def __init__(self, guild_id, user_id, username, level=1, exp=0, total_messages=0, last_message_time=0):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.username = username
+        self.level = level
+        self.exp = exp
+        self.total_messages = total_messages
+        self.last_message_time = last_message_time
+
+
+class CharacterRecord(_Record):
+    """Personnage de jeu de rôle (éventuellement partiel selon la requête)"""
+
+    __slots__ = ('id', 'guild_id', 'user_id', 'character_name', 'specialty', *STATS, 'reputation',
+                 *(f"{stat}_exp" for stat in STATS), 'created_at')
+
+    def stat_level(self, stat):
+        return getattr(self, stat)
+
+    def stat_exp(self, stat):
+        return getattr(self, f"{stat}_exp")
+
+    @property
+    def total_level(self):
+        """Somme des niveaux des six statistiques (hors réputation)"""
+        return sum(getattr(self, stat) for stat in STATS)
+
+
+class BackfillCheckpoint(_Record):
+    """Progression de l'import de l'historique d'un salon"""
+
+    __slots__ = ('channel_id', 'before_id', 'last_message_id', 'messages', 'done')
+
+
+class RoleSweepProgress(_Record):
+    """Progression de la réconciliation des rôles d'ancienneté d'un serveur"""
+
+    __slots__ = ('last_user_id', 'checked', 'changed', 'started_at', 'done')
+
+
+UPSERT_USERS_SQL = """INSERT INTO user_levels (guild_id, user_id, username, level, exp, total_messages, last_message_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        username = excluded.username, level = excluded.level, exp = excluded.exp,
+        total_messages = excluded.total_messages,
+        last_message_time = excluded.last_message_time"""
+
+
+def _user_params(users):
+    return [(user.guild_id, user.user_id, user.username, user.level, user.exp,
+             user.total_messages, user.last_message_time) for user in users]
+
+
+def _check_stat(stat):
+    # Les noms de colonnes ne peuvent pas être paramétrés : liste blanche stricte
+    if stat not in STATS:
+        raise ValueError(f"Statistique inconnue : {stat}")
+
+
+def ranking_key(user):
+    """Clé du classement (niveau, XP puis identifiant) : la plus petite est la première"""
+    return (-user.level, -user.exp, user.user_id)
+
+
+class Repository:
+    """Requêtes du bot sur la base partagée"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def is_open(self):
+        return self.db.is_open
+
+    async def open(self, **context):
+        """Ouvre la connexion et applique les migrations manquantes"""
+        await self.db.connect()
+        # Tables et index : migrations versionnées (PRAGMA user_version)
+        await run_migrations(self.db, **context)
+
+    async def close(self):
+        await self.db.close()
+
+    async def _fetch_one(self, cls, columns, sql, params):
+        row = await self.db.fetchone(sql.format(columns=", ".join(columns)), params)
+        return None if row is None else cls.from_row(columns, row)
+
+    async def _fetch_all(self, cls, columns, sql, params):
+        rows = await self.db.fetchall(sql.format(columns=", ".join(columns)), params)
+        return [cls.from_row(columns, row) for row in rows]
+
+    # --- Niveaux d'ancienneté ---
+
+    async def get_user(self, guild_id, user_id):
+        row = await self.db.fetchone(
+            f"SELECT {', '.join(USER_COLUMNS)} FROM user_levels WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id))
+        return None if row is None else UserRecord(*row)
+
+    async def upsert_users(self, users):
+        """Écrit un lot de profils dans une seule transaction"""
+        await self.db.executemany(UPSERT_USERS_SQL, _user_params(users))
+
+    async def get_users(self, guild_id, user_ids):
+        """Nom et nombre de messages de quelques membres, en une requête"""
+        user_ids = tuple(user_ids)
+        return await self._fetch_all(
+            UserRecord, ('user_id', 'username', 'total_messages'),
+            f"""SELECT {{columns}} FROM user_levels
+                WHERE guild_id = ? AND user_id IN ({', '.join('?' * len(user_ids))})""", (guild_id, *user_ids))
+
+    async def ranking_rows(self, guild_id):
+        """(user_id, level, exp) de tout le serveur, dans l'ordre du classement (lecture de l'index seul)"""
+        return await self.db.fetchall(
+            """SELECT user_id, level, exp FROM user_levels WHERE guild_id = ?
+               ORDER BY level DESC, exp DESC, user_id""", (guild_id,))
+
+    async def guild_levels(self, guild_id):
+        """Niveau de chaque membre du serveur ayant un profil, en une requête : {user_id: niveau}"""
+        rows = await self.db.fetchall("SELECT user_id, level FROM user_levels WHERE guild_id = ?", (guild_id,))
+        return dict(rows)
+
+    async def has_legacy_rows(self):
+        """Indique s'il reste des données d'avant le partitionnement (guild_id = 0)"""
+        return bool(await self.db.fetchone("SELECT 1 FROM user_levels WHERE guild_id = 0 LIMIT 1")
+                    or await self.db.fetchone("SELECT 1 FROM characters WHERE guild_id = 0 LIMIT 1"))
+
+    async def adopt_legacy_rows(self, guild_id):
+        async with self.db.transaction() as conn:
+            await conn.execute("UPDATE OR IGNORE user_levels SET guild_id = ? WHERE guild_id = 0", (guild_id,))
+            await conn.execute("UPDATE OR IGNORE characters SET guild_id = ? WHERE guild_id = 0", (guild_id,))
+
+    async def reset_user(self, guild_id, user_id):
+        """Supprime le profil et les personnages d'un membre sur un serveur"""
+        async with self.db.transaction() as conn:
+            await conn.execute("DELETE FROM user_levels WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+            await conn.execute("DELETE FROM characters WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+
+    # --- Personnages ---
+
+    async def count_characters(self, guild_id, user_id):
+        row = await self.db.fetchone("SELECT COUNT(*) FROM characters WHERE guild_id = ? AND user_id = ?",
+                                     (guild_id, user_id))
+        return row[0]
+
+    async def character_name_taken(self, guild_id, name):
+        return await self.db.fetchone(
+            "SELECT 1 FROM characters WHERE guild_id = ? AND character_name = ? COLLATE NOCASE",
+            (guild_id, name)) is not None
+
+    async def create_character(self, guild_id, user_id, name, specialty, stats):
+        """Crée un personnage ; `stats` contient les six niveaux et la réputation"""
+        await self.db.execute(
+            """INSERT INTO characters
+               (guild_id, user_id, character_name, specialty, chant, danse, eloquence, acting, fitness, esthetique, reputation)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (guild_id, user_id, name, specialty, stats['chant'], stats['danse'], stats['eloquence'],
+             stats['acting'], stats['fitness'], stats['esthetique'], stats['reputation']))
+
+    async def list_characters(self, guild_id, user_id):
+        """Personnages d'un membre, du plus ancien au plus récent (sans les XP)"""
+        return await self._fetch_all(
+            CharacterRecord, ('character_name', 'specialty', *STATS, 'reputation'),
+            """SELECT {columns} FROM characters WHERE guild_id = ? AND user_id = ?
+               ORDER BY created_at""", (guild_id, user_id))
+
+    async def get_character(self, guild_id, user_id, name):
+        """Fiche complète d'un personnage appartenant au membre"""
+        return await self._fetch_one(
+            CharacterRecord, ('id', 'character_name', 'specialty', *STATS, 'reputation',
+                              *(f"{stat}_exp" for stat in STATS)),
+            """SELECT {columns} FROM characters
+               WHERE guild_id = ? AND character_name = ? COLLATE NOCASE AND user_id = ?""",
+            (guild_id, name, user_id))
+
+    async def list_character_names(self, guild_id, user_id):
+        rows = await self.db.fetchall("SELECT character_name FROM characters WHERE guild_id = ? AND user_id = ?",
+                                      (guild_id, user_id))
+        return [name for name, in rows]
+
+    async def get_characters(self, guild_id, user_id):
+        """Fiches complètes de tous les personnages du membre, du plus ancien au plus récent"""
+        return await self._fetch_all(
+            CharacterRecord, ('id', 'character_name', 'specialty', *STATS, 'reputation',
+                              *(f"{stat}_exp" for stat in STATS)),
+            """SELECT {columns} FROM characters WHERE guild_id = ? AND user_id = ?
+               ORDER BY created_at""", (guild_id, user_id))
+
+    async def get_character_summary(self, guild_id, user_id, name):
+        """Identité et niveaux d'un personnage (sans les XP)"""
+        return await self._fetch_one(
+            CharacterRecord, ('id', 'character_name', 'specialty', *STATS),
+            """SELECT {columns} FROM characters
+               WHERE guild_id = ? AND character_name = ? COLLATE NOCASE AND user_id = ?""",
+            (guild_id, name, user_id))
+
+    async def get_character_by_id(self, character_id, user_id):
+        """Identité d'un personnage, seulement s'il appartient toujours au membre"""
+        return await self._fetch_one(
+            CharacterRecord, ('id', 'guild_id', 'user_id', 'character_name'),
+            "SELECT {columns} FROM characters WHERE id = ? AND user_id = ?", (character_id, user_id))
+
+    async def get_character_stat(self, guild_id, user_id, name, stat):
+        """Identité d'un personnage et niveau/XP d'une seule statistique"""
+        _check_stat(stat)
+        return await self._fetch_one(
+            CharacterRecord, ('id', 'character_name', 'specialty', stat, f"{stat}_exp"),
+            """SELECT {columns} FROM characters
+               WHERE guild_id = ? AND character_name = ? COLLATE NOCASE AND user_id = ?""",
+            (guild_id, name, user_id))
+
+    async def update_stat(self, character_id, stat, level, exp):
+        _check_stat(stat)
+        await self.db.execute(f"UPDATE characters SET {stat} = ?, {stat}_exp = ? WHERE id = ?",
+                              (level, exp, character_id))
+
+    async def update_stats(self, characters, stats):
+        """Écrit niveau et XP de `stats` pour chaque personnage, en une seule transaction"""
+        for stat in stats:
+            _check_stat(stat)
+        assignments = ", ".join(f"{stat} = ?, {stat}_exp = ?" for stat in stats)
+        await self.db.executemany(
+            f"UPDATE characters SET {assignments} WHERE id = ?",
+            [(*(value for stat in stats for value in (character.stat_level(stat), character.stat_exp(stat))),
+              character.id) for character in characters])
+
+    async def delete_character(self, character_id):
+        await self.db.execute("DELETE FROM characters WHERE id = ?", (character_id,))
+
+    # --- État interne ---
+
+    async def get_state(self, key):
+        row = await self.db.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+        return None if row is None else row[0]
+
+    async def set_state(self, key, value):
+        await self.db.execute(
+            "INSERT INTO bot_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value))
+
+    # --- Import de l'historique ---
+
+    async def backfill_checkpoints(self, guild_id):
+        return await self._fetch_all(
+            BackfillCheckpoint, BackfillCheckpoint.__slots__,
+            "SELECT {columns} FROM backfill_channels WHERE guild_id = ?", (guild_id,))
+
+    async def add_backfill_channels(self, guild_id, before_id, channel_ids):
+        """Inscrit les salons à parcourir (les salons déjà inscrits gardent leur progression)"""
+        await self.db.executemany(
+            "INSERT OR IGNORE INTO backfill_channels (guild_id, channel_id, before_id) VALUES (?, ?, ?)",
+            [(guild_id, channel_id, before_id) for channel_id in channel_ids])
+
+    async def save_backfill_batch(self, users, guild_id, channel_id, last_message_id, messages, done):
+        """Écrit les profils mis à jour et avance le point de reprise du salon, atomiquement"""
+        async with self.db.transaction() as conn:
+            if users:
+                await conn.executemany(UPSERT_USERS_SQL, _user_params(users))
+            await conn.execute(
+                """UPDATE backfill_channels SET last_message_id = ?, messages = messages + ?, done = ?
+                   WHERE guild_id = ? AND channel_id = ?""",
+                (last_message_id, messages, int(done), guild_id, channel_id))
+
+    # --- Réconciliation des rôles ---
+
+    async def get_role_sweep(self, guild_id):
+        return await self._fetch_one(
+            RoleSweepProgress, RoleSweepProgress.__slots__,
+            "SELECT {columns} FROM role_sweeps WHERE guild_id = ?", (guild_id,))
+
+    async def save_role_sweep(self, guild_id, progress):
+        await self.db.execute(
+            """INSERT INTO role_sweeps (guild_id, last_user_id, checked, changed, started_at, done)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(guild_id) DO UPDATE SET
+                   last_user_id = excluded.last_user_id, checked = excluded.checked, changed = excluded.changed,
+                   started_at = excluded.started_at, done = excluded.done""",
+            (guild_id, progress.last_user_id, progress.checked, progress.changed, progress.started_at,
+             int(progress.done)))
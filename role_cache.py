@@ -0,0 +1,35 @@
+"""Cache par serveur des rôles d'ancienneté.
+
+Les rôles de chaque palier sont résolus une seule fois par serveur (un seul
+parcours de `guild.roles`) puis gardés sous forme d'identifiants. Le cache
+d'un serveur est invalidé dès qu'un de ses rôles est créé, modifié ou
+supprimé.
+"""
+
+
+class SeniorityRoleCache:
+    """Associe chaque palier d'ancienneté à l'identifiant de son rôle"""
+
+    def __init__(self, tier_names):
+        # tier_names : {palier: (nom accepté, ...)}
+        self._names = {}
+        for tier, names in tier_names.items():
+            for name in names:
+                self._names[name] = tier
+        self._guilds = {}
+
+    def tier_roles(self, guild):
+        """Retourne {palier: identifiant du rôle} pour un serveur"""
+        role_ids = self._guilds.get(guild.id)
+        if role_ids is None:
+            role_ids = {}
+            for role in guild.roles:
+                tier = self._names.get(role.name)
+                if tier is not None and tier not in role_ids:
+                    role_ids[tier] = role.id
+            self._guilds[guild.id] = role_ids
+        return role_ids
+
+    def invalidate(self, guild_id):
+        """Oublie les rôles d'un serveur (ils seront relus au prochain accès)"""
+        self._guilds.pop(guild_id, None)
@@ -0,0 +1,105 @@
+"""Réconciliation en masse des rôles d'ancienneté d'un serveur.
+
+Les rôles ne sont corrigés qu'à la montée de niveau d'un membre : après une
+coupure, une remise à zéro ou un renommage de rôles, des membres gardent un
+palier faux. Ce parcours charge les niveaux de tout le serveur en une requête,
+les compare aux rôles des membres en cache et ne planifie que les
+modifications nécessaires, via l'ordonnanceur des appels sortants (priorité la
+plus basse, au plus `concurrency` modifications en attente à la fois : les
+changements de rôles des montées de niveau en direct passent entre deux).
+
+Les membres sont parcourus par identifiant croissant et la progression est
+enregistrée tous les `batch_size` membres : un parcours interrompu reprend
+au dernier membre validé.
+"""
+
+import asyncio
+import time
+
+from outbound import SWEEP
+from repository import RoleSweepProgress
+
+
+class RoleReconciliation:
+    """Parcours reprenable des membres d'un serveur"""
+
+    def __init__(self, guild, repo, xp_buffer, scheduler, needs_update, update, concurrency=5, batch_size=500):
+        self.guild = guild
+        self.repo = repo
+        self.xp_buffer = xp_buffer
+        self.scheduler = scheduler
+        # needs_update(membre, niveau ou None) : le membre a-t-il un mauvais palier ?
+        self.needs_update = needs_update
+        # update(membre) : coroutine qui relit le niveau du membre et corrige ses rôles ; retourne False
+        # en cas d'échec (comme les mises à jour en direct, qui peuvent la remplacer dans la file)
+        self.update = update
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+        self.members_total = 0
+        self.checked = 0
+        self.changed = 0
+        self.failed = 0
+        self.resumed = False
+        self.started_at = time.time()
+        self.finished_at = None
+
+    async def run(self):
+        self.started_at = time.time()
+        if not self.guild.me.guild_permissions.manage_roles:
+            self.finished_at = self.started_at
+            raise RuntimeError("le bot n'a pas la permission de gérer les rôles")
+
+        progress = await self.repo.get_role_sweep(self.guild.id)
+        if progress is not None and not progress.done:
+            self.resumed = True
+            self.checked, self.changed = progress.checked, progress.changed
+        else:
+            progress = RoleSweepProgress.from_row(RoleSweepProgress.__slots__, (0, 0, 0, self.started_at, 0))
+            await self.repo.save_role_sweep(self.guild.id, progress)
+
+        if not self.guild.chunked:
+            await self.guild.chunk()
+        # Les XP en attente d'écriture font partie des niveaux à comparer
+        await self.xp_buffer.flush()
+        levels = await self.repo.guild_levels(self.guild.id)
+
+        members = sorted((member for member in self.guild.members
+                          if not member.bot and member.id > progress.last_user_id), key=lambda member: member.id)
+        self.members_total = self.checked + len(members)
+
+        try:
+            for start in range(0, len(members), self.batch_size):
+                batch = members[start:start + self.batch_size]
+                await self._reconcile(batch, levels)
+                progress.last_user_id = batch[-1].id
+                progress.checked, progress.changed = self.checked, self.changed
+                await self.repo.save_role_sweep(self.guild.id, progress)
+            progress.done = 1
+            await self.repo.save_role_sweep(self.guild.id, progress)
+        finally:
+            self.finished_at = time.time()
+
+    async def _reconcile(self, batch, levels):
+        pending = set()
+        for member in batch:
+            self.checked += 1
+            if not self.needs_update(member, levels.get(member.id)):
+                continue
+            self.changed += 1
+            while len(pending) >= self.concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                self._count_failures(done)
+            # Même clé que les mises à jour en direct : une seule modification en attente par membre
+            pending.add(self.scheduler.submit(SWEEP, ('guild-members', self.guild.id),
+                                              lambda member=member: self.update(member),
+                                              key=('roles', self.guild.id, member.id)))
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            self._count_failures(done)
+
+    def _count_failures(self, done):
+        # Un futur partagé avec une mise à jour en direct porte le résultat de celle-ci
+        for future in done:
+            if not future.cancelled() and (future.exception() is not None or future.result() is False):
+                self.failed += 1
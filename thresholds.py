@@ -0,0 +1,57 @@
+"""Tables de seuils d'XP précalculées pour les niveaux et les statistiques.
+
+Chaque table garde l'XP nécessaire pour passer chaque niveau et l'XP cumulée
+depuis le niveau 1. Elles s'agrandissent paresseusement à la demande : la
+lecture d'un seuil est en O(1) et la conversion « XP totale → (niveau, reste) »
+se fait par dichotomie (bisect) en O(log n), si bien qu'un gain qui fait
+franchir plusieurs niveaux se résout en une seule étape.
+"""
+
+from bisect import bisect_right
+
+
+class ThresholdTable:
+    """Seuils d'une courbe de progression p(1)=first, p(n)=step(p(n-1), n)"""
+
+    def __init__(self, first, step):
+        self._step = step
+        # Index = niveau ; l'indice 0 n'est qu'un bouche-trou
+        self._per_level = [0, first]
+        # _cumulative[n] = XP totale dépensée pour passer du niveau 1 au niveau n
+        self._cumulative = [0, 0]
+
+    def _grow(self):
+        level = len(self._per_level)
+        needed = self._step(self._per_level[-1], level)
+        self._per_level.append(needed)
+        self._cumulative.append(self._cumulative[-1] + needed)
+
+    def required(self, level):
+        """XP nécessaire pour atteindre `level` depuis le niveau précédent"""
+        while level >= len(self._per_level):
+            self._grow()
+        return self._per_level[level]
+
+    def total_for(self, level, exp=0):
+        """XP totale correspondant à `level` avec `exp` XP dans ce niveau"""
+        while level >= len(self._cumulative):
+            self._grow()
+        return self._cumulative[level] + exp
+
+    def level_for_total(self, total):
+        """Convertit une XP totale en (niveau, XP restante dans ce niveau)"""
+        while self._cumulative[-1] <= total:
+            self._grow()
+        level = bisect_right(self._cumulative, total) - 1
+        return level, total - self._cumulative[level]
+
+    def resolve(self, level, exp):
+        """Applique toutes les montées de niveau pour `exp` XP au niveau `level`"""
+        return self.level_for_total(self.total_for(level, exp))
+
+
+# Ancienneté : p(1)=200, p(n+1)=p(n)×1.4 (arrondi à chaque étape)
+LEVEL_THRESHOLDS = ThresholdTable(200, lambda previous, level: int(previous * 1.4))
+
+# Statistiques de personnage : e(1)=5000, e(n+1)=e(n)+(120×(n+1))
+STAT_THRESHOLDS = ThresholdTable(5000, lambda previous, level: previous + 120 * level)
@@ -0,0 +1,31 @@
+"""Paliers d'ancienneté et rôles Discord associés.
+
+Module sans effet de bord : le simulateur de progression
+(benchmarks/simulate_progression.py) l'importe sans charger le bot.
+"""
+
+# Paliers d'ancienneté : (niveau minimum, palier, nom décoré du rôle)
+SENIORITY_TIERS = [
+    (1, "newcomer", "๑📧﹕newcomer﹗‧₊˚﹒ᶻz"),
+    (10, "rising", "๑🫙﹕rising ﹗‧₊˚﹒ᶻz"),
+    (20, "yapper", "๑🧴﹕yapper﹗‧₊˚﹒ᶻz"),
+    (30, "go outside touch some grass", "๑🌿﹕go outisde touch some grass﹗‧₊˚﹒ᶻz"),
+]
+
+
+def get_seniority_tier(level):
+    """Retourne le palier d'ancienneté (nom court) basé sur le niveau"""
+    tier = SENIORITY_TIERS[0][1]
+    for min_level, name, _ in SENIORITY_TIERS:
+        if level >= min_level:
+            tier = name
+    return tier
+
+
+def get_seniority_role(level):
+    """Retourne le rôle d'ancienneté basé sur le niveau"""
+    role_name = SENIORITY_TIERS[0][2]
+    for min_level, _, decorated in SENIORITY_TIERS:
+        if level >= min_level:
+            role_name = decorated
+    return role_name
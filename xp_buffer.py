@@ -0,0 +1,169 @@
+"""Accumulateur d'XP en mémoire avec écriture différée (write-behind).
+
+Chaque message met à jour l'entrée en mémoire du couple (serveur, membre) ;
+les montées de niveau sont calculées immédiatement par l'appelant, mais les
+lignes modifiées ne sont écrites dans `user_levels` que par lots, dans une
+seule transaction `executemany`, toutes les `flush_interval` secondes ou dès
+que `max_dirty` utilisateurs sont en attente.
+
+Bornes en cas de panne : un arrêt propre (fermeture du bot, SIGINT, SIGTERM)
+vide toujours le tampon. En cas d'arrêt brutal (SIGKILL, coupure de courant),
+on perd au plus les messages reçus depuis la dernière écriture, c'est-à-dire
+au plus `flush_interval` secondes d'activité et jamais plus de `max_dirty`
+utilisateurs ; les lignes déjà écrites restent cohérentes (chaque lot est
+atomique).
+
+L'accumulateur tient aussi à jour le classement en mémoire des serveurs
+consultés (`ranking`, voir ranking.py) à chaque entrée créée ou modifiée.
+"""
+
+import asyncio
+from collections import OrderedDict
+
+from ranking import RankIndex
+from repository import UserRecord
+
+
+class XPAccumulator:
+    """Cache des profils (UserRecord) et file des lignes à écrire"""
+
+    def __init__(self, repo, flush_interval=10.0, max_dirty=500, max_cached=20000, max_ranked=1_000_000):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_cached = max_cached
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        # Classement par serveur : base + entrées en mémoire (jamais plus anciennes que la base)
+        self.ranking = RankIndex(repo, self.cached, max_members=max_ranked)
+
+    def start(self):
+        """Démarre la tâche d'écriture périodique (sans effet si déjà lancée)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Arrête la tâche périodique et écrit tout ce qui reste en attente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Erreur lors de l'écriture des XP: {e}")
+
+    async def get(self, guild_id, user_id):
+        """Retourne l'entrée d'un membre sur un serveur (cache puis base), ou None"""
+        key = (guild_id, user_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        loaded = await self.repo.get_user(guild_id, user_id)
+        if loaded is None:
+            return None
+        # Un autre gestionnaire a pu charger l'entrée pendant la requête
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = loaded
+            self._remember(entry)
+        return entry
+
+    @property
+    def write_lock(self):
+        """Verrou des écritures par lots : tant qu'il est tenu, aucune XP n'est écrite (non réentrant)"""
+        return self._flush_lock
+
+    def peek(self, guild_id, user_id):
+        """Entrée d'un membre si elle est déjà en mémoire, sans lecture en base ni écriture"""
+        return self._entries.get((guild_id, user_id))
+
+    async def get_or_create(self, guild_id, user_id, username, current_time):
+        """Retourne l'entrée d'un membre en la créant s'il est inconnu"""
+        entry = await self.get(guild_id, user_id)
+        if entry is None:
+            key = (guild_id, user_id)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = UserRecord(guild_id, user_id, username, last_message_time=current_time)
+                self._remember(entry)
+                self._dirty.add(key)
+                self.ranking.update(entry)
+        return entry
+
+    async def mark_dirty(self, entry):
+        """Signale une entrée modifiée ; déclenche une écriture si le lot est plein"""
+        self.mark_dirty_later(entry)
+        if len(self._dirty) >= self.max_dirty:
+            await self.flush()
+
+    def mark_dirty_later(self, entry):
+        """Signale une entrée modifiée sans jamais écrire : elle part avec la prochaine écriture périodique"""
+        self._dirty.add((entry.guild_id, entry.user_id))
+        self.ranking.update(entry)
+
+    def mark_saved(self, entry):
+        """Signale une entrée modifiée que l'appelant vient d'écrire lui-même en base (sous write_lock)"""
+        self.ranking.update(entry)
+
+    def cached(self, guild_id):
+        """Entrées en mémoire d'un serveur (y compris celles en attente ou en cours d'écriture)"""
+        return [entry for key, entry in self._entries.items() if key[0] == guild_id]
+
+    def forget(self, guild_id, user_id):
+        """Oublie un membre (après suppression en base) sans rien écrire"""
+        self._entries.pop((guild_id, user_id), None)
+        self._dirty.discard((guild_id, user_id))
+        self.ranking.discard(guild_id, user_id)
+
+    async def get_many(self, guild_id, user_ids):
+        """Profils de plusieurs membres (cache, puis une requête pour les autres) : {user_id: profil}
+
+        Les profils lus en base ne sont pas mis en cache.
+        """
+        users = {user_id: self._entries[(guild_id, user_id)] for user_id in user_ids
+                 if (guild_id, user_id) in self._entries}
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            users.update((user.user_id, user) for user in await self.repo.get_users(guild_id, missing))
+        return users
+
+    def _remember(self, entry):
+        self._entries[(entry.guild_id, entry.user_id)] = entry
+        if len(self._entries) > self.max_cached:
+            self._evict()
+
+    def _evict(self):
+        # Seules les entrées déjà écrites peuvent être évincées
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_cached:
+                break
+            if key not in self._dirty:
+                del self._entries[key]
+
+    async def flush(self):
+        """Écrit toutes les entrées modifiées dans une seule transaction"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            entries = [self._entries[key] for key in dirty if key in self._entries]
+            try:
+                await self.repo.upsert_users(entries)
+            except Exception:
+                # Rien n'a été écrit : les entrées restent à écrire au prochain lot
+                self._dirty |= {key for key in dirty if key in self._entries}
+                raise
+            return len(entries)